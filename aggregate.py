@@ -0,0 +1,146 @@
+"""
+通用聚合模块
+按请求指定的分组维度、度量及聚合方式、漏斗比率、排序和Top N，一次分组完成汇总
+"""
+import pandas as pd
+
+from data_cube import CUBE_DIMENSIONS
+from funnel import RATIO_DEFINITIONS, add_ratios, ratio_source_columns
+
+# 支持的聚合方式
+AGGREGATIONS = ['sum', 'mean', 'min', 'max', 'count', 'nunique']
+
+# 单次请求的面板数上限
+MAX_PANELS = 20
+
+
+class AggregateError(ValueError):
+    """聚合参数错误（返回400）"""
+
+
+def _split(value):
+    """逗号分隔字符串或列表 -> 去空白的列表"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def measure_alias(column, func):
+    """度量输出列名：求和保持原列名（便于计算比率），其他聚合加后缀"""
+    return column if func == 'sum' else f'{column}_{func}'
+
+
+def parse_spec(raw):
+    """
+    解析聚合参数
+
+    Args:
+        raw: 请求参数或JSON对象，字段：
+            group_by: 分组维度，如 '代理商来源,出价方式'
+            measures: 度量，'列名:聚合方式'，聚合方式默认 sum，如 '花费,曝光量:sum,计划id:nunique'
+            ratios: 漏斗比率，如 '准入通过率,注册成本'
+            sort: 排序列，'-' 前缀表示降序，如 '-花费'
+            top: 只保留排序后的前N行
+
+    Returns:
+        {'group_by': [...], 'measures': [(列, 聚合方式), ...], 'ratios': [...], 'sort': [(列, 升序), ...], 'top': int|None}
+    """
+    measures = []
+    for item in _split(raw.get('measures')):
+        column, _, func = item.partition(':')
+        func = func.strip().lower() or 'sum'
+        if func not in AGGREGATIONS:
+            raise AggregateError(f'不支持的聚合方式：{func}')
+        if (column.strip(), func) not in measures:
+            measures.append((column.strip(), func))
+
+    ratios = _split(raw.get('ratios'))
+    for name in ratios:
+        if name not in RATIO_DEFINITIONS:
+            raise AggregateError(f'未知的比率指标：{name}')
+    if not measures and not ratios:
+        raise AggregateError('请至少指定一个度量或比率指标')
+
+    group_by = _split(raw.get('group_by'))
+    sort = [(item[1:], False) if item.startswith('-') else (item, True) for item in _split(raw.get('sort'))]
+    outputs = set(group_by) | {measure_alias(col, func) for col, func in measures} | set(ratios)
+    for column, _ in sort:
+        if column not in outputs:
+            raise AggregateError(f'排序列不在结果中：{column}')
+
+    top = raw.get('top')
+    try:
+        top = int(top) if top not in (None, '') else None
+    except (TypeError, ValueError):
+        raise AggregateError('top 参数无效')
+    if top is not None and top <= 0:
+        raise AggregateError('top 参数无效')
+
+    return {'group_by': group_by, 'measures': measures, 'ratios': ratios, 'sort': sort, 'top': top}
+
+
+def canonical_spec(spec):
+    """规范化聚合参数，作为缓存键的一部分"""
+    return (tuple(spec['group_by']), tuple(spec['measures']), tuple(spec['ratios']),
+            tuple(spec['sort']), spec['top'])
+
+
+def plan_source(spec):
+    """
+    选择数据源：分组维度都在立方体中、度量都是可加的求和时使用预聚合立方体，否则使用明细
+    比率由分子分母合计相除，可在立方体上计算
+
+    Returns:
+        'cube' 或 'detail'
+    """
+    cube_ok = all(col in CUBE_DIMENSIONS for col in spec['group_by']) and all(
+        func == 'sum' and '率' not in col and '成本' not in col
+        for col, func in spec['measures']
+    )
+    return 'cube' if cube_ok else 'detail'
+
+
+def run_aggregate(df, spec):
+    """
+    执行聚合：度量与比率所需的分子分母列在同一次分组中汇总
+
+    Args:
+        df: 筛选后的立方体或明细
+        spec: parse_spec 的结果
+
+    Returns:
+        DataFrame：分组列 + 度量列 + 比率列
+    """
+    group_by, measures, ratios = spec['group_by'], spec['measures'], spec['ratios']
+    for col in group_by:
+        if col not in df.columns:
+            raise AggregateError(f'未知的分组维度：{col}')
+
+    named = {}
+    for col, func in measures:
+        if col not in df.columns:
+            raise AggregateError(f'未知的度量列：{col}')
+        if func in ('sum', 'mean', 'min', 'max') and not pd.api.types.is_numeric_dtype(df[col]):
+            raise AggregateError(f'{col} 不是数值列，不能使用 {func}')
+        named[measure_alias(col, func)] = (col, func)
+    # 比率的分子分母按列求和，未作为度量请求的在结果中去掉
+    hidden = [col for col in ratio_source_columns(df.columns, ratios) if col not in named]
+    for col in hidden:
+        named[col] = (col, 'sum')
+
+    if group_by:
+        result = df.groupby(group_by, observed=True).agg(**named).reset_index()
+    else:
+        result = pd.DataFrame({alias: [df[col].agg(func)] for alias, (col, func) in named.items()})
+
+    if ratios:
+        result = add_ratios(result, ratios).drop(columns=hidden)
+
+    if spec['sort']:
+        result = result.sort_values([col for col, _ in spec['sort']],
+                                    ascending=[asc for _, asc in spec['sort']])
+    if spec['top'] is not None:
+        result = result.head(spec['top'])
+    return result.reset_index(drop=True)
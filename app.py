@@ -2,23 +2,65 @@
 Flask主程序
 提供文件上传、数据处理和数据看板功能
 """
-from flask import Flask, render_template, request, jsonify, send_file, session
+from flask import Flask, render_template, request, jsonify, send_file, session, stream_with_context
 import os
+import io
 import json
+import multiprocessing
 import tempfile
+import time
+import uuid
+from collections import OrderedDict
 from werkzeug.utils import secure_filename
-from data_processor import process_all_data
+from data_processor import (process_all_data, iter_processed_chunks, upsert_dataset, concat_with_categories,
+                            DIMENSION_COLUMNS)
+from data_store import (DatasetStore, CACHE_FILE_EXT, write_dataset, read_dataset, split_partitions,
+                        write_partitioned_dataset, read_manifest,
+                        select_partitions, partition_file, ChunkedDatasetWriter, read_dataset_head, NULL_PARTITION,
+                        empty_dataset_frame)
+from data_cube import build_cube, merge_cubes
+from filter_index import FilterIndex
+from result_cache import ResultCache, canonical_filters, make_etag
+from upload_jobs import JobManager
+from dataset_registry import DatasetRegistry, content_hash, clean_upload_folder
+from json_provider import DataJSONProvider, frame_to_records, frame_to_columns
+from aggregate import AggregateError, MAX_PANELS, parse_spec, canonical_spec, plan_source, run_aggregate
+from funnel import PASS_RATES, COST_RATIOS, AVERAGE_RATIOS, add_ratios, funnel_ratios
+from compression import COMPRESSIBLE_MIMETYPES, choose_encoding, compress_bytes, iter_compressed
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
 app = Flask(__name__)
+app.json = DataJSONProvider(app)
 app.secret_key = 'ads_data_analysis_secret_key_2025'  # 用于session管理
 
 # 使用系统临时目录来存储文件，解决PyInstaller打包后的路径问题
 temp_base = tempfile.gettempdir()
 app.config['UPLOAD_FOLDER'] = os.path.join(temp_base, 'huawei_dashboard_uploads')
 app.config['CACHE_FOLDER'] = os.path.join(temp_base, 'huawei_dashboard_cache')
+app.config['JOB_STATE_FOLDER'] = os.path.join(temp_base, 'huawei_dashboard_jobs')  # 上传任务状态文件目录，多进程部署时各工作进程共用
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 限制上传文件大小为50MB
+app.config['DATASET_CACHE_MAX_BYTES'] = 1024 * 1024 * 1024  # 内存中缓存的数据集总大小上限为1GB
+app.config['DATASET_SHARED_MEMORY'] = os.name != 'nt'  # 零拷贝读取缓存文件，多个工作进程共用页缓存（Windows 下映射中的文件无法删除，不启用）
+app.config['RESULT_CACHE_MAX_ENTRIES'] = 256  # 统计结果缓存的最大条数
+app.config['INGEST_WORKERS'] = 3  # 并行读取上传文件的进程数，1为顺序读取
+app.config['INGEST_CHUNKED_MIN_BYTES'] = 20 * 1024 * 1024  # 代理商文件合计超过该大小时分块处理（完整上传），None为不分块
+app.config['INGEST_CHUNK_ROWS'] = 100000  # 分块处理时每块的行数，决定处理时的内存占用
+app.config['INGEST_CHUNK_ENGINE'] = 'openpyxl'  # 分块处理的Excel解析引擎：openpyxl 逐行解析；calamine 更快，但会把整个工作表读入内存
+app.config['DATASET_PARTITION'] = 'month'  # 缓存数据集按时间分区的粒度：'month' 或 'day'
+app.config['DATA_STREAM_CHUNK_ROWS'] = 5000  # /api/data 每次序列化的行数
+app.config['UPLOAD_JOB_WORKERS'] = 2  # 同时处理的上传任务数
+app.config['UPLOAD_JOB_HISTORY'] = 50  # 保留最近多少个上传任务的状态
+app.config['CACHE_MAX_BYTES'] = 5 * 1024 * 1024 * 1024  # 缓存目录磁盘配额，超出时按最近使用清理数据集
+app.config['UPLOAD_MAX_BYTES'] = 1024 * 1024 * 1024  # 上传目录磁盘配额
+app.config['UPLOAD_MAX_AGE'] = 24 * 3600  # 上传目录中超过该时间（秒）的遗留文件会被清理
+app.config['COMPRESS_MIN_BYTES'] = 1024  # 小于该大小的响应不压缩（流式响应总是压缩）
+app.config['COMPRESS_GZIP_LEVEL'] = 6  # gzip 压缩级别 1-9
+app.config['COMPRESS_BR_QUALITY'] = 5  # brotli 压缩级别 0-11
+app.config['SERVE_WORKERS'] = multiprocessing.cpu_count()  # serve.py 多进程部署时的工作进程数
+app.config['SERVE_THREADS'] = 4  # serve.py 每个工作进程处理请求的线程数
+app.config['SERVE_TIMEOUT'] = 300  # serve.py 单个请求的超时时间（秒），导出大数据集需要较长时间
 
 # 确保目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -27,30 +69,109 @@ os.makedirs(app.config['CACHE_FOLDER'], exist_ok=True)
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
 
+# 已解析数据集的进程级缓存，键为 '<数据集路径>#<分区键>'
+dataset_store = DatasetStore(app.config['DATASET_CACHE_MAX_BYTES'])
 
-def df_to_json_records(df):
+# 统计接口结果缓存，键为 (缓存文件, 文件版本, 接口, 规范化筛选条件)
+result_cache = ResultCache(app.config['RESULT_CACHE_MAX_ENTRIES'])
+
+# 后台上传任务，上传请求保存文件后立即返回任务ID
+upload_jobs = JobManager(app.config['UPLOAD_JOB_WORKERS'], app.config['UPLOAD_JOB_HISTORY'],
+                         app.config['JOB_STATE_FOLDER'])
+
+# 已处理数据集登记表（按上传文件内容哈希去重），session 中只保存数据集ID
+dataset_registry = DatasetRegistry(app.config['CACHE_FOLDER'])
+
+# 静态资源压缩结果缓存，键为 (文件路径, ETag, 压缩格式)
+static_cache = ResultCache(64)
+
+
+def iter_json_records(selected, offset=0, limit=None, chunk_rows=5000, lines=False):
     """
-    将DataFrame安全转换为JSON记录，自动处理 NaN/NaT
-    返回Python对象列表，可直接用于 jsonify
+    按块把命中的行序列化为JSON文本，直接由DataFrame生成，不经过Python对象
+
+    Args:
+        selected: select_dataset_rows 的结果 [(分区DataFrame, 命中行位置或None)]
+        offset: 跳过的行数
+        limit: 最多输出的行数，为None时输出全部
+        chunk_rows: 每块的行数
+        lines: True 时每行一条记录（NDJSON），否则输出JSON数组元素（以逗号分隔，不含方括号）
+
+    Yields:
+        JSON文本块
     """
-    if df is None:
-        return []
-    return json.loads(df.to_json(orient='records', force_ascii=False, date_format='iso'))
+    remaining = limit
+    first = True
+    for df, positions in selected:
+        row_count = len(df) if positions is None else len(positions)
+        if offset >= row_count:
+            offset -= row_count
+            continue
+        start, offset = offset, 0
+        end = row_count if remaining is None else min(row_count, start + remaining)
+        for chunk_start in range(start, end, chunk_rows):
+            chunk_end = min(chunk_start + chunk_rows, end)
+            if positions is None:
+                chunk = df.iloc[chunk_start:chunk_end]
+            else:
+                chunk = df.take(positions[chunk_start:chunk_end])
+            text = chunk.to_json(orient='records', force_ascii=False, date_format='iso', lines=lines)
+            if lines:
+                yield text if text.endswith('\n') else text + '\n'
+            else:
+                yield ('' if first else ',') + text[1:-1]
+            first = False
+        if remaining is not None:
+            remaining -= end - start
+            if remaining <= 0:
+                return
+
+
+class FilterError(ValueError):
+    """筛选参数错误（返回400）"""
+
+
+# 筛选日期参数接受的写法，统一转换为 YYYY-MM-DD
+FILTER_DATE_FORMATS = ['%Y-%m-%d', '%Y%m%d', '%Y/%m/%d']
 
 
 def parse_multi_value(raw_value):
     """
     将多选参数转换为列表，支持逗号分隔
+    JSON请求中的列表元素可以是字符串或数字（转为字符串）
     """
     if not raw_value:
         return []
     if isinstance(raw_value, list):
-        values = raw_value
+        if not all(isinstance(item, (str, int, float)) and not isinstance(item, bool) for item in raw_value):
+            raise FilterError('多选参数的取值需为字符串或数字')
+        values = [str(item).strip() for item in raw_value]
     else:
         values = [item.strip() for item in str(raw_value).split(',')]
     return [v for v in values if v and v.lower() != 'all']
 
 
+def parse_date_param(raw_value, name):
+    """
+    日期筛选参数转为 YYYY-MM-DD 字符串（JSON请求中可为 20250101 这样的数字），为空时返回None
+
+    Raises:
+        FilterError: 无法识别的日期
+    """
+    if raw_value is None or raw_value == '':
+        return None
+    if isinstance(raw_value, (str, int)) and not isinstance(raw_value, bool):
+        text = str(raw_value).strip()
+        if not text:
+            return None
+        for date_format in FILTER_DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+    raise FilterError(f'{name} 需为日期（YYYY-MM-DD）：{raw_value!r}')
+
+
 def pick_column(df, candidates):
     """
     返回第一个存在的列名
@@ -61,11 +182,373 @@ def pick_column(df, candidates):
     return None
 
 
+# 筛选选项：(返回字段, 维度列)
+OPTION_FIELDS = [
+    ('agents', '代理商来源'),
+    ('bidding_methods', '出价方式'),
+    ('targetings', '定向'),
+    ('resources', '资源位'),
+    ('materials', '素材样式'),
+    ('benefits', '利益点'),
+    ('dates', '时间'),
+]
+
+# 统计接口中按维度分组的漏斗指标：(返回字段, 维度列)
+FUNNEL_GROUPS = [
+    ('agent_funnel', '代理商来源'),
+    ('bidding_funnel', '出价方式'),
+    ('targeting_funnel', '定向'),
+]
+
+# 筛选参数 -> 维度列（均支持逗号分隔多选）
+FILTER_PARAMS = [
+    ('agent', '代理商来源'),
+    ('bidding_method', '出价方式'),
+    ('targeting', '定向'),
+    ('resource', '资源位'),
+    ('material', '素材样式'),
+    ('benefit', '利益点'),
+]
+FILTER_COLUMNS = [col for _, col in FILTER_PARAMS]
+
+
+def cube_file_for(cache_file):
+    """数据集对应的预聚合立方体路径（分区目录，旧版数据集为单个缓存文件）"""
+    if cache_file.endswith(CACHE_FILE_EXT):
+        return cache_file[:-len(CACHE_FILE_EXT)] + '.cube' + CACHE_FILE_EXT
+    return cache_file + '.cube'
+
+
+def partition_key(path, key):
+    """数据集（或立方体）分区在内存缓存中的键"""
+    return f'{path}#{key}'
+
+
+def filter_index_key(key):
+    """数据集（或立方体）分区对应筛选索引在缓存中的键"""
+    return f'{key}#filter_index'
+
+
+def session_dataset():
+    """当前session打开的数据集信息，数据不存在（未上传或已被清理）时返回None"""
+    dataset = dataset_registry.get(session.get('dataset_id'))
+    if dataset is not None:
+        dataset_registry.touch(dataset['id'])
+    return dataset
+
+
+def session_cache_file():
+    """当前session对应的数据集缓存路径，数据不存在时返回None"""
+    dataset = session_dataset()
+    return dataset['cache_file'] if dataset else None
+
+
+def cleanup_storage(keep=()):
+    """
+    按磁盘配额清理缓存目录（最近最少使用的数据集、未登记的遗留文件）和上传目录
+
+    Args:
+        keep: 不清理的数据集ID
+    """
+    removed = dataset_registry.enforce_quota(app.config['CACHE_MAX_BYTES'], keep)
+    for cache_file in removed:
+        invalidate_dataset(cache_file)
+    orphans = dataset_registry.remove_orphans()
+    uploads = clean_upload_folder(app.config['UPLOAD_FOLDER'], app.config['UPLOAD_MAX_BYTES'],
+                                  app.config['UPLOAD_MAX_AGE'], keep=dataset_registry.pending_files())
+    jobs = upload_jobs.remove_expired(app.config['UPLOAD_MAX_AGE'])
+    if removed or orphans or uploads or jobs:
+        print(f"磁盘清理：数据集 {len(removed)} 个，遗留缓存 {orphans} 个，上传文件 {uploads} 个，任务状态 {jobs} 个")
+
+
+def load_partition(path, entry):
+    """获取数据集（或立方体）的一个分区，优先使用内存缓存，未命中时从缓存文件加载"""
+    def _read(_):
+        print(f"从缓存文件加载数据: {os.path.basename(partition_file(path, entry))}")
+        return read_dataset(partition_file(path, entry), shared=app.config['DATASET_SHARED_MEMORY'])
+    return dataset_store.get(partition_key(path, entry['key']), _read)
+
+
+def load_filter_index(key, df):
+    """获取数据集（或立方体）分区的筛选索引，首次使用时构建"""
+    return dataset_store.get(filter_index_key(key), lambda _: FilterIndex(df, FILTER_COLUMNS))
+
+
+def query_dataset(path, filters=None):
+    """
+    按筛选条件查询数据集（或立方体）
+    先按日期范围裁剪分区，只加载涉及的分区，再用各分区的筛选索引取出命中的行
+
+    Args:
+        path: 数据集路径
+        filters: parse_filters 的结果，为None时返回全部数据
+
+    Returns:
+        DataFrame（分区按日期顺序拼接）
+    """
+    manifest = read_manifest(path)
+    if filters is None:
+        filters = {'date_from': None, 'date_to': None, 'dimensions': {}}
+    entries = select_partitions(manifest, filters['date_from'], filters['date_to'])
+    if not entries:
+        if not manifest['partitions']:
+            return empty_dataset_frame(manifest['columns'])
+        # 日期范围内没有数据：返回与数据集列类型一致的空表
+        return load_partition(path, manifest['partitions'][0]).head(0)
+    frames = []
+    for entry in entries:
+        df = load_partition(path, entry)
+        frames.append(filter_dataset(df, filters, load_filter_index(partition_key(path, entry['key']), df)))
+    return frames[0] if len(frames) == 1 else concat_with_categories(frames)
+
+
+def select_dataset_rows(path, filters):
+    """
+    按筛选条件定位数据集中命中的行，不复制数据（用于分块输出）
+
+    Returns:
+        [(分区DataFrame, 命中行位置数组或None（表示全部行）)]，分区按日期顺序排列
+    """
+    selected = []
+    manifest = read_manifest(path)
+    for entry in select_partitions(manifest, filters['date_from'], filters['date_to']):
+        df = load_partition(path, entry)
+        index = load_filter_index(partition_key(path, entry['key']), df)
+        selected.append((df, index.select(filters['date_from'], filters['date_to'], filters['dimensions'])))
+    return selected
+
+
+def load_dataset(cache_file):
+    """获取完整的明细数据集"""
+    return query_dataset(cache_file)
+
+
+def ensure_cube(cache_file):
+    """数据集对应的立方体路径，旧版数据集没有立方体时由明细数据构建"""
+    cube_file = cube_file_for(cache_file)
+    if not os.path.exists(cube_file):
+        tmp_file = cube_file + '.tmp'
+        write_dataset(build_cube(load_dataset(cache_file)), tmp_file)
+        os.replace(tmp_file, cube_file)
+    return cube_file
+
+
+def invalidate_dataset(cache_file):
+    """从内存缓存中移除数据集及其立方体的全部分区、筛选索引和统计结果"""
+    if not cache_file:
+        return
+    for path in [cache_file, cube_file_for(cache_file)]:
+        dataset_store.invalidate_prefix(path + '#')
+    result_cache.invalidate_dataset(cache_file)
+
+
+def parse_filters(args):
+    """
+    解析筛选参数
+
+    Args:
+        args: 请求参数（date_from, date_to, agent, bidding_method, targeting, resource, material, benefit）
+
+    Returns:
+        {'date_from': str|None, 'date_to': str|None, 'dimensions': {维度列: [取值, ...]}}
+        日期统一为 YYYY-MM-DD
+
+    Raises:
+        FilterError: 日期或多选参数格式错误
+    """
+    return {
+        'date_from': parse_date_param(args.get('date_from'), 'date_from'),
+        'date_to': parse_date_param(args.get('date_to'), 'date_to'),
+        'dimensions': {col: parse_multi_value(args.get(param)) for param, col in FILTER_PARAMS},
+    }
+
+
+def date_range_mask(series, date_from=None, date_to=None):
+    """
+    日期范围筛选条件（日期为YYYY-MM-DD字符串）
+    分类类型的日期列先在类别上比较，再按编码映射到每一行
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        dates = series.cat.categories
+        keep = np.ones(len(dates), dtype=bool)
+        if date_from:
+            keep &= dates >= date_from
+        if date_to:
+            keep &= dates <= date_to
+        return pd.Series(np.append(keep, False)[series.cat.codes], index=series.index)
+    mask = pd.Series(True, index=series.index)
+    if date_from:
+        mask &= series >= date_from
+    if date_to:
+        mask &= series <= date_to
+    return mask
+
+
+def filter_dataset(df, filters, index=None):
+    """
+    按筛选条件取出数据
+
+    Args:
+        df: 数据DataFrame
+        filters: parse_filters 的结果
+        index: df 对应的 FilterIndex，提供时用位图筛选，否则逐列比较
+
+    Returns:
+        筛选后的DataFrame
+    """
+    date_from, date_to, dimensions = filters['date_from'], filters['date_to'], filters['dimensions']
+    if index is not None:
+        positions = index.select(date_from, date_to, dimensions)
+        return df if positions is None else df.take(positions)
+
+    mask = pd.Series(True, index=df.index)
+    if (date_from or date_to) and '时间' in df.columns:
+        mask &= date_range_mask(df['时间'], date_from, date_to)
+    for col, values in dimensions.items():
+        if values and col in df.columns:
+            mask &= df[col].isin(values)
+    return df[mask]
+
+
+def shared_filters(filter_list):
+    """
+    多个筛选条件的公共部分，用于只筛选一次数据、再在结果上区分各面板
+
+    Returns:
+        (公共筛选条件, 各面板取值不同的维度列)
+        公共筛选条件的日期范围覆盖所有面板，维度只包含所有面板取值相同的列
+    """
+    date_froms = [f['date_from'] for f in filter_list]
+    date_tos = [f['date_to'] for f in filter_list]
+    shared = {
+        'date_from': None if None in date_froms else min(date_froms),
+        'date_to': None if None in date_tos else max(date_tos),
+        'dimensions': {},
+    }
+    varying = []
+    for col in dict.fromkeys(col for f in filter_list for col in f['dimensions']):
+        values = {tuple(sorted(set(f['dimensions'].get(col) or []))) for f in filter_list}
+        if len(values) == 1:
+            shared['dimensions'][col] = list(values.pop())
+        else:
+            varying.append(col)
+    return shared, varying
+
+
+def residual_filters(filters, shared, varying):
+    """在公共筛选结果上还需要应用的条件，无需再筛选时返回None"""
+    dimensions = {col: filters['dimensions'].get(col) or [] for col in varying}
+    if (filters['date_from'] == shared['date_from'] and filters['date_to'] == shared['date_to']
+            and not any(dimensions.values())):
+        return None
+    return {'date_from': filters['date_from'], 'date_to': filters['date_to'], 'dimensions': dimensions}
+
+
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def compression_level(encoding):
+    return app.config['COMPRESS_BR_QUALITY'] if encoding == 'br' else app.config['COMPRESS_GZIP_LEVEL']
+
+
+def negotiate_encoding(size=None):
+    """当前请求可用的压缩格式；size 小于压缩阈值时返回None"""
+    if size is not None and size < app.config['COMPRESS_MIN_BYTES']:
+        return None
+    return choose_encoding(request.accept_encodings)
+
+
+def set_content_encoding(response, encoding):
+    """标记响应已压缩；压缩后字节不同，ETag改为弱ETag"""
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def cached_json_response(cache_key, build_payload):
+    """
+    带结果缓存、ETag协商和压缩的JSON响应
+
+    Args:
+        cache_key: 结果缓存键，首元素为缓存文件路径（换数据集时按它清除）
+        build_payload: 缓存未命中时调用，返回结果字典（会加上 success）
+
+    缓存值为 {压缩格式: 响应内容}，'identity' 为未压缩内容；每种压缩格式只压缩一次。
+    ETag 标识数据集版本和请求参数，压缩与否内容等价，使用弱ETag；只有GET请求做ETag协商。
+    """
+    etag = make_etag(*cache_key)
+    conditional = request.method == 'GET'
+
+    # 浏览器已有相同数据集、相同参数的结果
+    if conditional and request.if_none_match.contains_weak(etag):
+        result_cache.record_not_modified()
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    variants = result_cache.get(cache_key)
+    if variants is None:
+        variants = {'identity': app.json.dumps_bytes({'success': True, **build_payload()})}
+        result_cache.put(cache_key, variants)
+
+    encoding = negotiate_encoding(len(variants['identity']))
+    if encoding is not None and encoding not in variants:
+        variants[encoding] = compress_bytes(variants['identity'], encoding, compression_level(encoding))
+
+    response = app.response_class(variants[encoding or 'identity'], mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    if conditional:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """
+    按 Accept-Encoding 压缩响应（JSON接口、静态资源）
+    已自行压缩的响应（如统计接口从缓存取出的压缩结果）带有 Content-Encoding，这里不再处理
+    """
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if request.endpoint == 'static':
+        # 静态文件按 (路径, ETag) 只压缩一次
+        response.direct_passthrough = False
+        body = response.get_data()
+        encoding = negotiate_encoding(len(body))
+        if encoding is None:
+            return response
+        key = (request.path, response.get_etag()[0], encoding)
+        compressed = static_cache.get(key)
+        if compressed is None:
+            compressed = compress_bytes(body, encoding, compression_level(encoding))
+            static_cache.put(key, compressed)
+        response.set_data(compressed)
+    elif response.is_streamed:
+        # 流式响应（/api/data）边生成边压缩
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+        response.response = iter_compressed(response.iter_encoded(), encoding, compression_level(encoding))
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        encoding = negotiate_encoding(len(body))
+        if encoding is None:
+            return response
+        response.set_data(compress_bytes(body, encoding, compression_level(encoding)))
+    set_content_encoding(response, encoding)
+    return response
+
+
 @app.route('/')
 def index():
     """首页：文件上传页面"""
@@ -87,7 +570,8 @@ def upload_files():
         wabang_file = request.files.get('wabang_file')
         backend_file = request.files.get('backend_file')
         
-        # 保存文件路径
+        # 保存文件路径（加随机后缀，同一秒内的多个上传互不覆盖）
+        upload_prefix = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
         kiwi_path = None
         wabang_path = None
         backend_path = None
@@ -95,69 +579,76 @@ def upload_files():
         # 处理奇异果文件
         if kiwi_file and kiwi_file.filename and allowed_file(kiwi_file.filename):
             filename = secure_filename(kiwi_file.filename)
-            kiwi_path = os.path.join(app.config['UPLOAD_FOLDER'], f"kiwi_{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}")
+            kiwi_path = os.path.join(app.config['UPLOAD_FOLDER'], f"kiwi_{upload_prefix}_{filename}")
             kiwi_file.save(kiwi_path)
         
         # 处理哇棒文件
         if wabang_file and wabang_file.filename and allowed_file(wabang_file.filename):
             filename = secure_filename(wabang_file.filename)
-            wabang_path = os.path.join(app.config['UPLOAD_FOLDER'], f"wabang_{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}")
+            wabang_path = os.path.join(app.config['UPLOAD_FOLDER'], f"wabang_{upload_prefix}_{filename}")
             wabang_file.save(wabang_path)
         
         # 处理后端文件
         if backend_file and backend_file.filename and allowed_file(backend_file.filename):
             filename = secure_filename(backend_file.filename)
-            backend_path = os.path.join(app.config['UPLOAD_FOLDER'], f"backend_{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}")
+            backend_path = os.path.join(app.config['UPLOAD_FOLDER'], f"backend_{upload_prefix}_{filename}")
             backend_file.save(backend_path)
         
         # 检查是否至少有一个代理商文件
         if not kiwi_path and not wabang_path:
+            remove_files(kiwi_path, wabang_path, backend_path)
             return jsonify({'success': False, 'message': '请至少上传一个代理商数据文件（奇异果或哇棒）'}), 400
         
         if not backend_path:
+            remove_files(kiwi_path, wabang_path, backend_path)
             return jsonify({'success': False, 'message': '请上传后端数据文件'}), 400
         
-        # 处理数据
-        print("开始处理数据...")
-        merged_df = process_all_data(
-            kiwi_file_path=kiwi_path,
-            wabang_file_path=wabang_path,
-            backend_file_path=backend_path
-        )
-        
-        if merged_df is None:
-            return jsonify({'success': False, 'message': '数据处理失败，请检查文件格式是否正确'}), 500
-        
-        # 保存处理后的数据到缓存
-        cache_file = os.path.join(app.config['CACHE_FOLDER'], f"merged_data_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx")
-        merged_df.to_excel(cache_file, index=False)
-        
-        # 将数据转换为JSON格式（用于前端展示）
-        # 只转换前1000行用于预览，完整数据通过API获取
-        df_preview = merged_df.head(1000)
-        data_json = df_to_json_records(df_preview)
-        
-        # 将缓存文件路径保存到session
-        session['data_cache_file'] = cache_file
-        
-        # 清理上传的临时文件
-        try:
-            if kiwi_path and os.path.exists(kiwi_path):
-                os.remove(kiwi_path)
-            if wabang_path and os.path.exists(wabang_path):
-                os.remove(wabang_path)
-            if backend_path and os.path.exists(backend_path):
-                os.remove(backend_path)
-        except:
-            pass
-        
+        # 追加模式：新数据按 (计划id, 时间) 更新到当前数据集
+        base_dataset = None
+        if request.form.get('mode') == 'append':
+            base_dataset = session_dataset()
+            if not base_dataset:
+                remove_files(kiwi_path, wabang_path, backend_path)
+                return jsonify({'success': False, 'message': '当前没有可追加的数据，请先完整上传一次'}), 400
+
+        # 按文件内容去重：相同文件（追加时还需相同的原数据集）直接打开已处理的数据集
+        upload_paths = [('kiwi', kiwi_path), ('wabang', wabang_path), ('backend', backend_path)]
+        digest = content_hash(upload_paths, base_dataset['hash'] if base_dataset else None)
+        dataset = dataset_registry.find(digest)
+        if dataset is not None:
+            remove_files(kiwi_path, wabang_path, backend_path)
+            session['dataset_id'] = dataset['id']
+            dataset_registry.touch(dataset['id'])
+            print(f"相同文件已处理过，直接使用数据集: {dataset['id']}")
+            return jsonify({
+                'success': True,
+                'message': f"相同文件已处理过，直接打开已有数据！共 {dataset['row_count']} 行数据",
+                'dataset_id': dataset['id'],
+                'row_count': dataset['row_count']
+            })
+
+        # 相同文件正在处理中：等待已有任务，不重复处理
+        pending = upload_jobs.get(dataset_registry.pending_job(digest))
+        if pending is not None and pending.status in ('queued', 'running'):
+            remove_files(kiwi_path, wabang_path, backend_path)
+            return jsonify({
+                'success': True,
+                'message': '相同文件正在处理中',
+                'job_id': pending.id,
+                'job': pending.to_dict()
+            }), 202
+
+        # 后台处理数据，立即返回任务ID，前端轮询 /api/jobs/<任务ID> 获取进度
+        file_names = {role: os.path.basename(path).split('_', 3)[-1] for role, path in upload_paths if path}
+        job = upload_jobs.submit(run_upload_job, kiwi_path, wabang_path, backend_path, base_dataset, digest, file_names)
+        dataset_registry.begin(digest, job.id, [kiwi_path, wabang_path, backend_path])
+        print(f"已创建上传任务: {job.id}")
         return jsonify({
             'success': True,
-            'message': f'数据处理成功！共 {len(merged_df)} 行数据',
-            'row_count': len(merged_df),
-            'preview_data': data_json[:100],  # 只返回前100行作为预览
-            'columns': list(merged_df.columns)
-        })
+            'message': '文件上传成功，正在后台处理数据',
+            'job_id': job.id,
+            'job': job.to_dict()
+        }), 202
     
     except Exception as e:
         print(f"处理文件时发生错误: {e}")
@@ -166,6 +657,254 @@ def upload_files():
         return jsonify({'success': False, 'message': f'处理失败：{str(e)}'}), 500
 
 
+def use_chunked_ingest(kiwi_path, wabang_path):
+    """代理商文件合计超过 INGEST_CHUNKED_MIN_BYTES 时分块处理"""
+    threshold = app.config['INGEST_CHUNKED_MIN_BYTES']
+    if threshold is None:
+        return False
+    size = sum(os.path.getsize(path) for path in (kiwi_path, wabang_path) if path and os.path.exists(path))
+    return size >= threshold
+
+
+def build_chunked_dataset(job, kiwi_path, wabang_path, backend_path, cache_file, granularity, timings):
+    """
+    分块处理上传的文件，写入分区数据集及立方体
+    每块处理完即暂存到数据集目录，立方体按分区分块聚合后再合并；
+    内存占用由 INGEST_CHUNK_ROWS 决定，与文件大小无关
+
+    Returns:
+        数据集清单，没有数据时返回None
+    """
+    chunk_rows = app.config['INGEST_CHUNK_ROWS']
+    print(f"开始分块处理数据（每块 {chunk_rows} 行）...")
+    writer = ChunkedDatasetWriter(cache_file, granularity=granularity,
+                                  categorical_columns=DIMENSION_COLUMNS, ordered_columns=['时间'])
+    cube_parts = {}  # 分区键 -> 各块的部分立方体
+    write_seconds = 0.0
+    try:
+        chunks = iter_processed_chunks(kiwi_path, wabang_path, backend_path, chunk_rows=chunk_rows,
+                                       engine=app.config['INGEST_CHUNK_ENGINE'], timings=timings,
+                                       progress=job.update_stage)
+        for chunk in chunks:
+            job.update_stage('cache_write', 'running')
+            step_start = time.perf_counter()
+            for key, part in writer.write(chunk).items():
+                parts = cube_parts.setdefault(key, [])
+                parts.append(build_cube(part))
+                # 部分立方体累计超过一块的行数时先合并，内存占用不随数据量增长
+                if len(parts) > 1 and sum(len(cube) for cube in parts) > chunk_rows:
+                    cube_parts[key] = [merge_cubes(parts)]
+            write_seconds += time.perf_counter() - step_start
+        if writer.rows == 0:
+            writer.abort()
+            return None
+
+        step_start = time.perf_counter()
+        manifest = writer.close()
+        # 立方体的维度列与数据集使用相同的分类编码
+        dtypes = writer.dtypes()
+        cube_partitions = OrderedDict()
+        for entry in manifest['partitions']:
+            cube = merge_cubes(cube_parts.pop(entry['key']))
+            for col in cube.columns:
+                if isinstance(dtypes.get(col), pd.CategoricalDtype):
+                    cube[col] = cube[col].astype(dtypes[col])
+            cube_partitions[entry['key']] = cube
+        write_partitioned_dataset(cube_partitions, cube_file_for(cache_file), granularity=granularity)
+        timings['cache_write'] = write_seconds + time.perf_counter() - step_start
+        print(f"分块处理完成，共 {manifest['rows']} 行数据")
+        return manifest
+    except Exception:
+        writer.abort()
+        raise
+
+
+def run_upload_job(job, kiwi_path, wabang_path, backend_path, base_dataset=None, digest=None, file_names=None):
+    """
+    后台处理上传的文件：读取合并数据、写入缓存文件、放入内存缓存，并按内容哈希登记数据集
+
+    base_dataset 不为空时为追加模式：只处理新上传的文件，再更新到该数据集中；
+    只重写新数据涉及的时间分区（及其立方体），其余分区沿用原文件
+
+    Returns:
+        (成功与否, 提示信息, 结果字典)
+    """
+    base_cache_file = base_dataset['cache_file'] if base_dataset else None
+    try:
+        granularity = app.config['DATASET_PARTITION']
+        cache_file = os.path.join(app.config['CACHE_FOLDER'], f"merged_data_{datetime.now().strftime('%Y%m%d%H%M%S')}_{job.id[:8]}")
+        timings = {}
+        chunked = base_dataset is None and use_chunked_ingest(kiwi_path, wabang_path)
+        if chunked:
+            # 大文件分块处理：数据直接分块写入缓存文件，不放入内存缓存
+            manifest = build_chunked_dataset(job, kiwi_path, wabang_path, backend_path, cache_file, granularity, timings)
+            if manifest is None:
+                return False, '没有可处理的数据行，请检查代理商文件是否为空', None
+            new_row_count = manifest['rows']
+            partitions, cube_partitions = {}, {}
+            step_start = time.perf_counter()
+        else:
+            # 处理数据（三个文件并行读取）
+            print("开始处理数据...")
+            merged_df = process_all_data(
+                kiwi_file_path=kiwi_path,
+                wabang_file_path=wabang_path,
+                backend_file_path=backend_path,
+                max_workers=app.config['INGEST_WORKERS'],
+                timings=timings,
+                progress=job.update_stage
+            )
+
+            if merged_df is None:
+                return False, '数据处理失败，请检查文件格式是否正确', None
+
+            new_row_count = len(merged_df)
+            linked, cube_linked = {}, {}
+            if base_cache_file:
+                job.update_stage('upsert', 'running')
+                step_start = time.perf_counter()
+                base_manifest = read_manifest(base_cache_file)
+                if base_manifest['column'] == '时间' and base_manifest['granularity'] == granularity:
+                    # 只更新新数据涉及的分区，其余分区直接沿用原文件
+                    base_entries = {entry['key']: entry for entry in base_manifest['partitions']}
+                    partitions = split_partitions(merged_df, granularity=granularity)
+                    for key, new_part in partitions.items():
+                        if key in base_entries:
+                            partitions[key], _ = upsert_dataset(load_partition(base_cache_file, base_entries[key]), new_part)
+                    linked = {key: entry for key, entry in base_entries.items() if key not in partitions}
+                    base_cube = read_manifest(cube_file_for(base_cache_file))
+                    cube_linked = {entry['key']: entry for entry in base_cube['partitions'] if entry['key'] in linked}
+                else:
+                    # 旧版未分区的数据集：整体更新后重新分区
+                    merged_df, _ = upsert_dataset(load_dataset(base_cache_file), merged_df)
+                    partitions = split_partitions(merged_df, granularity=granularity)
+                timings['upsert'] = time.perf_counter() - step_start
+                job.update_stage('upsert', 'done', timings['upsert'])
+            else:
+                partitions = split_partitions(merged_df, granularity=granularity)
+            if not partitions and not linked:
+                # 合并结果为空：写入一个空分区，保留列和类型
+                partitions = OrderedDict([(NULL_PARTITION, merged_df.head(0))])
+
+            # 按时间分区保存处理后的数据（列式格式，导出时再生成Excel）
+            job.update_stage('cache_write', 'running')
+            step_start = time.perf_counter()
+            manifest = write_partitioned_dataset(partitions, cache_file, granularity=granularity,
+                                                 linked=linked, linked_from=base_cache_file)
+
+            # 预聚合立方体按相同方式分区，只需聚合新写入的分区
+            cube_partitions = OrderedDict((key, build_cube(part)) for key, part in partitions.items())
+            write_partitioned_dataset(cube_partitions, cube_file_for(cache_file), granularity=granularity,
+                                      linked=cube_linked, linked_from=base_cache_file and cube_file_for(base_cache_file))
+
+        dataset = dataset_registry.register(
+            digest or content_hash([('kiwi', kiwi_path), ('wabang', wabang_path), ('backend', backend_path)]),
+            [cache_file, cube_file_for(cache_file)],
+            files=file_names or {},
+            mode='append' if base_dataset else 'full',
+            base_id=base_dataset['id'] if base_dataset else None,
+            row_count=manifest['rows'],
+        )
+        cache_file = dataset['cache_file']
+        invalidate_dataset(cache_file)
+        for key, part in partitions.items():
+            dataset_store.put(partition_key(cache_file, key), part)
+        for key, cube_part in cube_partitions.items():
+            dataset_store.put(partition_key(cube_file_for(cache_file), key), cube_part)
+        timings['cache_write'] = timings.get('cache_write', 0) + time.perf_counter() - step_start
+        job.update_stage('cache_write', 'done', timings['cache_write'])
+        
+        # 将数据转换为JSON格式（用于前端展示）
+        # 只返回前100行作为预览，完整数据通过API获取
+        first_partition = manifest['partitions'][0]
+        if chunked:
+            preview_df = read_dataset_head(partition_file(cache_file, first_partition), 100)
+        else:
+            preview_df = load_partition(cache_file, first_partition).head(100)
+        data_json = frame_to_records(preview_df)
+        
+        if base_cache_file:
+            message = f"数据追加成功！新增数据 {new_row_count} 行，共 {manifest['rows']} 行数据"
+        else:
+            message = f"数据处理成功！共 {manifest['rows']} 行数据"
+        # 后端数据的重复行键（已按键合并），提示上传者核对后端文件
+        duplicates = timings.pop('backend_duplicates', None)
+        if duplicates:
+            examples = '、'.join(' '.join(example) for example in duplicates['examples'])
+            message += (f"。注意：后端数据中有 {duplicates['rows']} 行的 (计划id, 时间) 与前面的行重复"
+                        f"（{duplicates['keys']} 个键），已按键合并（计数和金额求和），示例：{examples}")
+        cleanup_storage(keep={dataset['id']})
+        return True, message, {
+            'dataset_id': dataset['id'],
+            'row_count': manifest['rows'],
+            'preview_data': data_json,
+            'columns': manifest['columns'],
+            'backend_duplicates': duplicates,
+            'timings': timings
+        }
+    finally:
+        # 清理上传的临时文件
+        remove_files(kiwi_path, wabang_path, backend_path)
+        if digest:
+            dataset_registry.end(digest)
+
+
+def remove_files(*paths):
+    """删除上传的临时文件"""
+    for path in paths:
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """查询上传任务进度；任务完成后将其数据集设为当前会话的数据"""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在或已过期'}), 404
+
+    status = job.to_dict()
+    result = status['result']
+    if status['status'] == 'done' and result:
+        # 数据集可能被其他会话共用，切换时不从内存缓存中移除旧数据集（由LRU淘汰）
+        session['dataset_id'] = result['dataset_id']
+
+    return jsonify({
+        'success': status['status'] != 'failed',
+        'message': status['message'],
+        'job': status
+    })
+
+
+@app.route('/api/datasets', methods=['GET'])
+def list_datasets():
+    """已处理的数据集列表（最近使用的在前），用于重新打开历史数据"""
+    return jsonify({
+        'success': True,
+        'current': session.get('dataset_id'),
+        'datasets': dataset_registry.list()
+    })
+
+
+@app.route('/api/datasets/<dataset_id>/open', methods=['POST'])
+def open_dataset(dataset_id):
+    """将已处理的数据集设为当前会话的数据"""
+    dataset = dataset_registry.get(dataset_id)
+    if dataset is None:
+        return jsonify({'success': False, 'message': '数据集不存在或已被清理'}), 404
+    session['dataset_id'] = dataset['id']
+    dataset_registry.touch(dataset['id'])
+    return jsonify({
+        'success': True,
+        'message': f"已打开数据集，共 {dataset['row_count']} 行数据",
+        'dataset_id': dataset['id'],
+        'row_count': dataset['row_count']
+    })
+
+
 @app.route('/dashboard')
 def dashboard():
     """数据看板页面"""
@@ -174,52 +913,61 @@ def dashboard():
 
 @app.route('/api/data', methods=['GET'])
 def get_data():
-    """获取完整数据（支持筛选）"""
+    """
+    获取明细数据（支持筛选和分页），分块流式输出
+
+    参数：
+        筛选参数同 /api/statistics
+        limit: 每页行数，不传时返回全部命中的行
+        cursor: 上一页返回的 next_cursor
+        format: ndjson 时每行输出一条记录（也可通过 Accept: application/x-ndjson 指定），
+                总行数和下一页游标放在响应头 X-Row-Count、X-Next-Cursor 中
+    """
     try:
-        cache_file = session.get('data_cache_file')
-        if not cache_file or not os.path.exists(cache_file):
+        cache_file = session_cache_file()
+        if cache_file is None:
             return jsonify({'success': False, 'message': '数据不存在，请重新上传文件'}), 404
-        
-        # 读取数据
-        df = pd.read_excel(cache_file)
-        
-        # 获取筛选参数
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-        agent = request.args.get('agent')  # 代理商来源
-        bidding_method = request.args.get('bidding_method')  # 出价方式
-        targeting_multi = parse_multi_value(request.args.get('targeting'))  # 定向多选
-        resource = request.args.get('resource')  # 资源位
-        material = request.args.get('material')  # 素材样式
-        benefit = request.args.get('benefit')  # 利益点
-        
-        # 应用筛选
-        if date_from and '时间' in df.columns:
-            df = df[df['时间'] >= date_from]
-        if date_to and '时间' in df.columns:
-            df = df[df['时间'] <= date_to]
-        if agent and agent != 'all' and '代理商来源' in df.columns:
-            df = df[df['代理商来源'] == agent]
-        if bidding_method and bidding_method != 'all' and '出价方式' in df.columns:
-            df = df[df['出价方式'] == bidding_method]
-        if targeting_multi and '定向' in df.columns:
-            df = df[df['定向'].isin(targeting_multi)]
-        if resource and resource != 'all' and '资源位' in df.columns:
-            df = df[df['资源位'] == resource]
-        if material and material != 'all' and '素材样式' in df.columns:
-            df = df[df['素材样式'] == material]
-        if benefit and benefit != 'all' and '利益点' in df.columns:
-            df = df[df['利益点'] == benefit]
-        
-        # 转换为JSON
-        data_json = df_to_json_records(df)
-        
-        return jsonify({
-            'success': True,
-            'data': data_json,
-            'row_count': len(df)
-        })
+
+        # 游标由行偏移和数据集版本组成，数据集更新后旧游标失效
+        version = os.stat(cache_file).st_mtime_ns
+        try:
+            limit = int(request.args['limit']) if request.args.get('limit') else None
+            offset = 0
+            if request.args.get('cursor'):
+                cursor_offset, cursor_version = request.args['cursor'].split(':')
+                offset = int(cursor_offset)
+                if int(cursor_version) != version:
+                    return jsonify({'success': False, 'message': '数据已更新，请重新查询'}), 409
+            if (limit is not None and limit <= 0) or offset < 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({'success': False, 'message': 'limit 或 cursor 参数无效'}), 400
+
+        # 应用筛选（只加载日期范围涉及的分区，只计算命中的行位置）
+        selected = select_dataset_rows(cache_file, parse_filters(request.args))
+        row_count = sum(len(df) if positions is None else len(positions) for df, positions in selected)
+        next_offset = offset + limit if limit is not None else row_count
+        next_cursor = f'{next_offset}:{version}' if next_offset < row_count else None
+
+        records = iter_json_records(selected, offset, limit, app.config['DATA_STREAM_CHUNK_ROWS'],
+                                    lines=wants_ndjson())
+        if wants_ndjson():
+            response = app.response_class(stream_with_context(records), mimetype='application/x-ndjson')
+            response.headers['X-Row-Count'] = str(row_count)
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+            return response
+
+        def generate():
+            yield json.dumps({'success': True, 'row_count': row_count, 'next_cursor': next_cursor})[:-1]
+            yield ', "data": ['
+            yield from records
+            yield ']}'
+
+        return app.response_class(stream_with_context(generate()), mimetype='application/json')
     
+    except FilterError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"获取数据时发生错误: {e}")
         import traceback
@@ -227,214 +975,196 @@ def get_data():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/api/statistics', methods=['GET'])
-def get_statistics():
-    """获取统计数据（用于图表展示）"""
-    try:
-        cache_file = session.get('data_cache_file')
-        if not cache_file or not os.path.exists(cache_file):
-            return jsonify({'success': False, 'message': '数据不存在'}), 404
-        
-        # 读取数据
-        df = pd.read_excel(cache_file)
-        
-        # 获取筛选参数（同get_data）
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-        agent = request.args.get('agent')
-        bidding_method = request.args.get('bidding_method')
-        targeting_multi = parse_multi_value(request.args.get('targeting'))
-        resource = request.args.get('resource')
-        material = request.args.get('material')
-        benefit = request.args.get('benefit')
-        
-        # 应用筛选
-        if date_from:
-            df = df[df['时间'] >= date_from]
-        if date_to:
-            df = df[df['时间'] <= date_to]
-        if agent and agent != 'all':
-            df = df[df['代理商来源'] == agent]
-        if bidding_method and bidding_method != 'all':
-            df = df[df['出价方式'] == bidding_method]
-        if targeting_multi and '定向' in df.columns:
-            df = df[df['定向'].isin(targeting_multi)]
-        if resource and resource != 'all':
-            df = df[df['资源位'] == resource]
-        if material and material != 'all' and '素材样式' in df.columns:
-            df = df[df['素材样式'] == material]
-        if benefit and benefit != 'all' and '利益点' in df.columns:
-            df = df[df['利益点'] == benefit]
-        
-        def safe_division(num, denom):
-            if denom in [0, None]:
-                return 0
-            if pd.isna(denom) or pd.isna(num):
-                return 0
-            return float(num) / float(denom) if denom != 0 else 0
-
-        def safe_ratio(num, denom):
-            if denom in [0, None] or pd.isna(denom) or pd.isna(num):
-                return None
-            return float(num) / float(denom) if denom != 0 else None
-        
-        # 按日期汇总
-        agg_dict = {
+def wants_ndjson():
+    """请求是否要求 NDJSON 格式"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+
+def top_spend_spec(dimension, top=15):
+    """按维度汇总花费、取花费最高的前N项"""
+    return parse_spec({'group_by': dimension, 'measures': '花费', 'sort': '-花费', 'top': top})
+
+
+def build_statistics(df, columnar=False):
+    """
+    计算统计数据（用于图表展示）
+
+    Args:
+        df: 筛选后的数据（立方体或明细）
+        columnar: 明细表以列式数据 {列名: [值, ...]} 返回，否则为记录列表
+
+    Returns:
+        可直接序列化为JSON的统计结果字典
+    """
+    encode_frame = frame_to_columns if columnar else frame_to_records
+    
+    # 按日期汇总
+    agg_dict = {
+        '花费': 'sum',
+        '曝光量': 'sum',
+        '点击量': 'sum',
+        '下载量': 'sum',
+        '安装量': 'sum',
+    }
+    optional_fields = [
+        '注册人数', '进件人数', '进件成功人数',
+        '授信提交人数', '授信成功人数', '授信人数',
+        '支用申请人数', '支用成功人数', '支用人数',
+        '支用笔数', '支用金额', '结算花费', '授信金额'
+    ]
+    for field in optional_fields:
+        if field in df.columns:
+            agg_dict[field] = 'sum'
+    
+    daily_stats = df.groupby('时间', observed=True).agg(agg_dict).reset_index() if '时间' in df.columns else pd.DataFrame()
+    
+    for col in ['注册人数', '进件人数', '进件成功人数',
+                '授信提交人数', '授信成功人数',
+                '支用申请人数', '支用成功人数',
+                '授信金额', '支用金额', '结算花费']:
+        if col not in daily_stats.columns:
+            daily_stats[col] = 0
+    
+    # 按代理商汇总
+    agent_stats = pd.DataFrame()
+    if '代理商来源' in df.columns:
+        agent_stats = df.groupby('代理商来源', observed=True).agg({
             '花费': 'sum',
             '曝光量': 'sum',
             '点击量': 'sum',
             '下载量': 'sum',
             '安装量': 'sum',
-        }
-        optional_fields = [
-            '注册人数', '进件人数', '进件成功人数',
-            '授信提交人数', '授信成功人数', '授信人数',
-            '支用申请人数', '支用成功人数', '支用人数',
-            '支用笔数', '支用金额', '结算花费', '授信金额'
-        ]
-        for field in optional_fields:
-            if field in df.columns:
-                agg_dict[field] = 'sum'
-        
-        daily_stats = df.groupby('时间').agg(agg_dict).reset_index() if '时间' in df.columns else pd.DataFrame()
-        
-        for col in ['注册人数', '进件人数', '进件成功人数',
-                    '授信提交人数', '授信成功人数',
-                    '支用申请人数', '支用成功人数',
-                    '授信金额', '支用金额', '结算花费']:
-            if col not in daily_stats.columns:
-                daily_stats[col] = 0
-        
-        # 按代理商汇总
-        agent_stats = pd.DataFrame()
-        if '代理商来源' in df.columns:
-            agent_stats = df.groupby('代理商来源').agg({
-                '花费': 'sum',
-                '曝光量': 'sum',
-                '点击量': 'sum',
-                '下载量': 'sum',
-                '安装量': 'sum',
-            }).reset_index()
-        
-        # 按出价方式汇总
-        bidding_stats = df.groupby('出价方式').agg({
-            '花费': 'sum',
-            '曝光量': 'sum',
-            '点击量': 'sum',
-        }).reset_index() if '出价方式' in df.columns else pd.DataFrame()
-
-        # 代理商出价方式占比
-        agent_bidding_mix = []
-        if {'代理商来源', '出价方式', '花费'}.issubset(df.columns):
-            def classify_bidding(val):
-                if pd.isna(val):
-                    return 'OTHER'
-                text = str(val).upper()
-                if 'OCPC' in text:
-                    return 'OCPC'
-                if 'CPC' in text:
-                    return 'CPC'
-                return 'OTHER'
-            mix_df = df[['代理商来源', '出价方式', '花费']].copy()
-            mix_df['出价类别'] = mix_df['出价方式'].apply(classify_bidding)
-            mix_group = mix_df.groupby(['代理商来源', '出价类别'])['花费'].sum().reset_index()
-            mix_group = mix_group.rename(columns={'出价类别': '出价类别'})
-            agent_bidding_mix = df_to_json_records(mix_group)
-
-        # 定向/资源位分布
-        targeting_spend = []
-        if {'定向', '花费'}.issubset(df.columns):
-            targeting_df = df.groupby('定向')['花费'].sum().reset_index().sort_values('花费', ascending=False).head(15)
-            targeting_spend = df_to_json_records(targeting_df)
-
-        resource_spend = []
-        if {'资源位', '花费'}.issubset(df.columns):
-            resource_df = df.groupby('资源位')['花费'].sum().reset_index().sort_values('花费', ascending=False).head(15)
-            resource_spend = df_to_json_records(resource_df)
-        
-        # 计算总量
-        total_cost = df['花费'].sum() if '花费' in df.columns else 0
-        total_register = df['注册人数'].sum() if '注册人数' in df.columns else 0
-        total_entry = df['进件人数'].sum() if '进件人数' in df.columns else 0
-        total_entry_success = df['进件成功人数'].sum() if '进件成功人数' in df.columns else 0
-
-        credit_submit_col = pick_column(df, ['授信提交人数', '授信提交人数_后端'])
-        total_credit_submit = df[credit_submit_col].sum() if credit_submit_col else 0
-        credit_success_col = pick_column(df, ['授信成功人数', '授信人数'])
-        total_credit_success = df[credit_success_col].sum() if credit_success_col else 0
-        credit_amount_col = pick_column(df, ['授信金额', '授信金额_后端'])
-        total_credit_amount = df[credit_amount_col].sum() if credit_amount_col else 0
-
-        loan_apply_col = pick_column(df, ['支用申请人数', '支用申请人数_后端'])
-        total_loan_apply = df[loan_apply_col].sum() if loan_apply_col else 0
-        loan_success_col = pick_column(df, ['支用成功人数', '支用人数'])
-        total_loan_success = df[loan_success_col].sum() if loan_success_col else 0
-        disburse_people_col = pick_column(df, ['支用人数'])
-        total_disburse_people = df[disburse_people_col].sum() if disburse_people_col else total_loan_success
-        loan_orders_col = pick_column(df, ['支用笔数'])
-        total_loan_orders = df[loan_orders_col].sum() if loan_orders_col else 0
-        loan_amount_col = pick_column(df, ['支用金额', '支用金额_后端'])
-        total_loan_amount = df[loan_amount_col].sum() if loan_amount_col else 0
-
-        settlement_col = pick_column(df, ['结算花费'])
-        total_settlement = df[settlement_col].sum() if settlement_col else 0
-        total_downloads = df['下载量'].sum() if '下载量' in df.columns else 0
-
-        exec_rate_col = pick_column(df, ['平均执行利率', '平均执行利率_后端'])
-        weighted_exec_sum = 0
-        if exec_rate_col and loan_amount_col:
-            weighted_exec_sum = (df[exec_rate_col].fillna(0) * df[loan_amount_col].fillna(0)).sum()
-        
-        avg_credit_amount = safe_division(total_credit_amount, total_credit_success)
-        avg_loan_per_order = safe_division(total_loan_amount, total_loan_orders)
-        avg_exec_rate = safe_division(weighted_exec_sum, total_loan_amount)
-
-        cost_metrics = {
-            '注册成本': safe_division(total_cost, total_register),
-            '进件成本': safe_division(total_cost, total_entry),
-            '授信成本': safe_division(total_cost, total_credit_success),
-            '支用成本': safe_division(total_cost, total_loan_success),
-            '下载成本': safe_division(total_cost, total_downloads),
-        }
+        }).reset_index()
+    
+    # 按出价方式汇总
+    bidding_stats = df.groupby('出价方式', observed=True).agg({
+        '花费': 'sum',
+        '曝光量': 'sum',
+        '点击量': 'sum',
+    }).reset_index() if '出价方式' in df.columns else pd.DataFrame()
 
-        # 通过率趋势
-        rate_trend = []
-        if not daily_stats.empty:
-            for _, row in daily_stats.iterrows():
-                rate_trend.append({
-                    '时间': row.get('时间'),
-                    '准入通过率': safe_ratio(row.get('进件成功人数', 0), row.get('进件人数', 0)),
-                    '授信通过率': safe_ratio(row.get('授信成功人数', 0), row.get('授信提交人数', 0)),
-                    '支用通过率': safe_ratio(row.get('支用成功人数', 0), row.get('支用申请人数', 0)),
-                })
-        
-        return jsonify({
-            'success': True,
-            'daily_stats': df_to_json_records(daily_stats),
-            'agent_stats': df_to_json_records(agent_stats),
-            'bidding_stats': df_to_json_records(bidding_stats) if not bidding_stats.empty else [],
-            'agent_bidding_mix': agent_bidding_mix,
-            'targeting_spend': targeting_spend,
-            'resource_spend': resource_spend,
-            'rate_trend': rate_trend,
-            'cost_metrics': cost_metrics,
-            'total_spend': float(total_cost),
-            'total_settlement': float(total_settlement),
-            'total_register': int(total_register),
-            'total_entry': int(total_entry),
-            'total_entry_success': int(total_entry_success),
-            'total_credit': int(total_credit_success),
-            'total_credit_submit': int(total_credit_submit),
-            'total_loan': int(total_loan_success),
-            'total_disburse_people': int(total_disburse_people),
-            'total_loan_orders': int(total_loan_orders),
-            'total_loan_amount': float(total_loan_amount),
-            'total_credit_amount': float(total_credit_amount),
-            'avg_credit_amount': float(avg_credit_amount) if avg_credit_amount is not None else 0,
-            'avg_loan_per_order': float(avg_loan_per_order) if avg_loan_per_order is not None else 0,
-            'avg_exec_rate': float(avg_exec_rate) if avg_exec_rate is not None else 0,
-        })
+    # 代理商出价方式占比
+    agent_bidding_mix = encode_frame(None)
+    if {'代理商来源', '出价方式', '花费'}.issubset(df.columns):
+        # 分类类型的 .str 方法只在类别上计算
+        bidding_text = df['出价方式'].str.upper()
+        mix_df = df[['代理商来源', '花费']].copy()
+        mix_df['出价类别'] = np.select(
+            [bidding_text.str.contains('OCPC', regex=False, na=False),
+             bidding_text.str.contains('CPC', regex=False, na=False)],
+            ['OCPC', 'CPC'],
+            default='OTHER'
+        )
+        mix_group = mix_df.groupby(['代理商来源', '出价类别'], observed=True)['花费'].sum().reset_index()
+        mix_group = mix_group.rename(columns={'出价类别': '出价类别'})
+        agent_bidding_mix = encode_frame(mix_group)
+
+    # 定向/资源位分布
+    targeting_spend = encode_frame(None)
+    if {'定向', '花费'}.issubset(df.columns):
+        targeting_spend = encode_frame(run_aggregate(df, top_spend_spec('定向')))
+
+    resource_spend = encode_frame(None)
+    if {'资源位', '花费'}.issubset(df.columns):
+        resource_spend = encode_frame(run_aggregate(df, top_spend_spec('资源位')))
     
+    # 计算总量
+    total_cost = df['花费'].sum() if '花费' in df.columns else 0
+    total_register = df['注册人数'].sum() if '注册人数' in df.columns else 0
+    total_entry = df['进件人数'].sum() if '进件人数' in df.columns else 0
+    total_entry_success = df['进件成功人数'].sum() if '进件成功人数' in df.columns else 0
+
+    credit_submit_col = pick_column(df, ['授信提交人数', '授信提交人数_后端'])
+    total_credit_submit = df[credit_submit_col].sum() if credit_submit_col else 0
+    credit_success_col = pick_column(df, ['授信成功人数', '授信人数'])
+    total_credit_success = df[credit_success_col].sum() if credit_success_col else 0
+    credit_amount_col = pick_column(df, ['授信金额', '授信金额_后端'])
+    total_credit_amount = df[credit_amount_col].sum() if credit_amount_col else 0
+
+    loan_apply_col = pick_column(df, ['支用申请人数', '支用申请人数_后端'])
+    total_loan_apply = df[loan_apply_col].sum() if loan_apply_col else 0
+    loan_success_col = pick_column(df, ['支用成功人数', '支用人数'])
+    total_loan_success = df[loan_success_col].sum() if loan_success_col else 0
+    disburse_people_col = pick_column(df, ['支用人数'])
+    total_disburse_people = df[disburse_people_col].sum() if disburse_people_col else total_loan_success
+    loan_orders_col = pick_column(df, ['支用笔数'])
+    total_loan_orders = df[loan_orders_col].sum() if loan_orders_col else 0
+    loan_amount_col = pick_column(df, ['支用金额', '支用金额_后端'])
+    total_loan_amount = df[loan_amount_col].sum() if loan_amount_col else 0
+
+    settlement_col = pick_column(df, ['结算花费'])
+    total_settlement = df[settlement_col].sum() if settlement_col else 0
+
+    # 总体成本和均值指标（分母为0时为0）
+    overall = funnel_ratios(df, COST_RATIOS + AVERAGE_RATIOS).iloc[0]
+    cost_metrics = {name: float(overall[name]) for name in COST_RATIOS}
+
+    # 通过率趋势：在按日汇总结果上整列计算
+    rate_trend = encode_frame(None)
+    if not daily_stats.empty:
+        rate_trend = encode_frame(add_ratios(daily_stats, PASS_RATES)[['时间'] + PASS_RATES])
+
+    # 按代理商 / 出价方式 / 定向的通过率和成本
+    funnels = {}
+    for key, col in FUNNEL_GROUPS:
+        funnels[key] = encode_frame(None)
+        if col in df.columns:
+            grouped = funnel_ratios(df, PASS_RATES + COST_RATIOS, by=[col])
+            funnels[key] = encode_frame(grouped[[col] + PASS_RATES + COST_RATIOS])
+    
+    return {
+        'daily_stats': encode_frame(daily_stats),
+        'agent_stats': encode_frame(agent_stats),
+        'bidding_stats': encode_frame(bidding_stats),
+        'agent_bidding_mix': agent_bidding_mix,
+        'targeting_spend': targeting_spend,
+        'resource_spend': resource_spend,
+        'rate_trend': rate_trend,
+        **funnels,
+        'cost_metrics': cost_metrics,
+        'total_spend': float(total_cost),
+        'total_settlement': float(total_settlement),
+        'total_register': int(total_register),
+        'total_entry': int(total_entry),
+        'total_entry_success': int(total_entry_success),
+        'total_credit': int(total_credit_success),
+        'total_credit_submit': int(total_credit_submit),
+        'total_loan': int(total_loan_success),
+        'total_disburse_people': int(total_disburse_people),
+        'total_loan_orders': int(total_loan_orders),
+        'total_loan_amount': float(total_loan_amount),
+        'total_credit_amount': float(total_credit_amount),
+        'avg_credit_amount': float(overall['人均授信额度']),
+        'avg_loan_per_order': float(overall['笔均支用金额']),
+        'avg_exec_rate': float(overall['平均执行利率']),
+    }
+
+
+@app.route('/api/statistics', methods=['GET'])
+def get_statistics():
+    """获取统计数据（用于图表展示）"""
+    try:
+        cache_file = session_cache_file()
+        if cache_file is None:
+            return jsonify({'success': False, 'message': '数据不存在'}), 404
+
+        filters = parse_filters(request.args)
+        # format=columns 时明细表返回列式数据，体积更小
+        columnar = request.args.get('format') == 'columns'
+        cache_key = (cache_file, os.stat(cache_file).st_mtime_ns,
+                     'statistics_columns' if columnar else 'statistics', canonical_filters(filters))
+
+        def build_payload():
+            # 在预聚合立方体上筛选和汇总（各维度组合已按天求和），只加载日期范围涉及的分区
+            df = query_dataset(ensure_cube(cache_file), filters)
+            return build_statistics(df, columnar)
+
+        return cached_json_response(cache_key, build_payload)
+    
+    except FilterError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"获取统计数据时发生错误: {e}")
         import traceback
@@ -442,25 +1172,218 @@ def get_statistics():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/aggregate', methods=['GET', 'POST'])
+def get_aggregate():
+    """
+    通用聚合查询
+
+    GET：单个聚合。参数为筛选参数（同 /api/statistics）加 group_by、measures、ratios、sort、top
+         （见 aggregate.parse_spec），返回 {success, row_count, data}
+    POST：多个面板一次请求。JSON为 {"filters": {筛选参数}, "panels": {面板名: 聚合参数}, "format": ...}，
+          各面板共用筛选结果，返回 {success, panels: {面板名: 数据}}
+    format=columns 时数据为列式 {列名: [值, ...]}
+    """
+    try:
+        cache_file = session_cache_file()
+        if cache_file is None:
+            return jsonify({'success': False, 'message': '数据不存在'}), 404
+
+        if request.method == 'POST':
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict) or not isinstance(body.get('panels'), dict) or not body['panels']:
+                return jsonify({'success': False, 'message': '请求格式错误：需要 panels 对象'}), 400
+            if len(body['panels']) > MAX_PANELS:
+                return jsonify({'success': False, 'message': f'面板数不能超过 {MAX_PANELS} 个'}), 400
+            if not all(isinstance(raw, dict) for raw in body['panels'].values()):
+                return jsonify({'success': False, 'message': '请求格式错误：面板参数需为对象'}), 400
+            filters = parse_filters(body.get('filters') or {})
+            specs = {str(name): parse_spec(raw) for name, raw in body['panels'].items()}
+            columnar = body.get('format') == 'columns'
+        else:
+            filters = parse_filters(request.args)
+            specs = {None: parse_spec(request.args)}
+            columnar = request.args.get('format') == 'columns'
+
+        cache_key = (cache_file, os.stat(cache_file).st_mtime_ns,
+                     'aggregate_columns' if columnar else 'aggregate', canonical_filters(filters),
+                     tuple((name, canonical_spec(spec)) for name, spec in specs.items()))
+
+        def build_payload():
+            encode_frame = frame_to_columns if columnar else frame_to_records
+            # 每个数据源（立方体 / 明细）只筛选一次，各面板共用
+            sources = {}
+            results = {}
+            for name, spec in specs.items():
+                source = plan_source(spec)
+                if source not in sources:
+                    path = ensure_cube(cache_file) if source == 'cube' else cache_file
+                    sources[source] = query_dataset(path, filters)
+                results[name] = run_aggregate(sources[source], spec)
+            if None in results:
+                return {'row_count': len(results[None]), 'data': encode_frame(results[None])}
+            return {'panels': {name: encode_frame(result) for name, result in results.items()}}
+
+        return cached_json_response(cache_key, build_payload)
+
+    except (AggregateError, FilterError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"聚合查询时发生错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# 批量接口的面板类型
+BATCH_PANEL_TYPES = ['statistics', 'aggregate', 'options']
+
+
+def parse_batch_panels(body):
+    """
+    解析批量请求中的面板，面板筛选参数覆盖公共筛选参数
+
+    Returns:
+        {面板名: {'type', 'filters', 'spec'（aggregate）, 'fields'（statistics）}}
+    """
+    base = body.get('filters') or {}
+    if not isinstance(base, dict):
+        raise AggregateError('filters 需为对象')
+    panels = {}
+    for name, raw in body['panels'].items():
+        if not isinstance(raw, dict):
+            raise AggregateError('面板参数需为对象')
+        kind = raw.get('type') or 'statistics'
+        if kind not in BATCH_PANEL_TYPES:
+            raise AggregateError(f'未知的面板类型：{kind}')
+        overrides = raw.get('filters') or {}
+        if not isinstance(overrides, dict):
+            raise AggregateError('面板 filters 需为对象')
+        panel = {'type': kind, 'filters': parse_filters({**base, **overrides})}
+        if kind == 'aggregate':
+            panel['spec'] = parse_spec(raw)
+        elif kind == 'statistics':
+            panel['fields'] = parse_multi_value(raw.get('fields'))
+        panels[str(name)] = panel
+    return panels
+
+
+@app.route('/api/batch', methods=['POST'])
+def get_batch():
+    """
+    批量查询：一次请求返回多个面板（如本周与上周对比、首屏的筛选选项和统计数据）
+
+    JSON：
+        filters: 公共筛选参数（同 /api/statistics）
+        format: 'columns' 时明细表为列式数据
+        panels: {面板名: 面板参数}
+            type: statistics（默认，同 /api/statistics，fields 可只返回部分字段）/
+                  aggregate（参数同 /api/aggregate）/ options（筛选选项）
+            filters: 覆盖公共筛选参数，如 {"date_from": ..., "date_to": ...}
+
+    立方体 / 明细只按各面板的公共筛选条件筛选一次，各面板在该结果上再按自己的条件筛选。
+    返回 {success, panels: {面板名: 结果}}
+    """
+    try:
+        cache_file = session_cache_file()
+        if cache_file is None:
+            return jsonify({'success': False, 'message': '数据不存在'}), 404
+
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not isinstance(body.get('panels'), dict) or not body['panels']:
+            return jsonify({'success': False, 'message': '请求格式错误：需要 panels 对象'}), 400
+        if len(body['panels']) > MAX_PANELS:
+            return jsonify({'success': False, 'message': f'面板数不能超过 {MAX_PANELS} 个'}), 400
+        panels = parse_batch_panels(body)
+        columnar = body.get('format') == 'columns'
+
+        cache_key = (cache_file, os.stat(cache_file).st_mtime_ns,
+                     'batch_columns' if columnar else 'batch',
+                     tuple((name, panel['type'], canonical_filters(panel['filters']),
+                            canonical_spec(panel['spec']) if 'spec' in panel else tuple(panel.get('fields', ())))
+                           for name, panel in panels.items()))
+
+        def build_payload():
+            encode_frame = frame_to_columns if columnar else frame_to_records
+            # 按数据源（立方体 / 明细）分组，各数据源按面板的公共筛选条件只筛选一次
+            by_source = {}
+            for name, panel in panels.items():
+                if panel['type'] != 'options':
+                    source = plan_source(panel['spec']) if panel['type'] == 'aggregate' else 'cube'
+                    by_source.setdefault(source, []).append(name)
+            frames = {}
+            for source, names in by_source.items():
+                shared, varying = shared_filters([panels[name]['filters'] for name in names])
+                base = query_dataset(ensure_cube(cache_file) if source == 'cube' else cache_file, shared)
+                index = None
+                for name in names:
+                    residual = residual_filters(panels[name]['filters'], shared, varying)
+                    if residual is None:
+                        frames[name] = base
+                        continue
+                    if index is None:
+                        index = FilterIndex(base, varying)
+                    frames[name] = filter_dataset(base, residual, index)
+
+            results = {}
+            for name, panel in panels.items():
+                if panel['type'] == 'options':
+                    results[name] = filter_options(cache_file)
+                elif panel['type'] == 'aggregate':
+                    result = run_aggregate(frames[name], panel['spec'])
+                    results[name] = {'row_count': len(result), 'data': encode_frame(result)}
+                else:
+                    stats = build_statistics(frames[name], columnar)
+                    unknown = [field for field in panel['fields'] if field not in stats]
+                    if unknown:
+                        raise AggregateError(f'未知的统计字段：{", ".join(unknown)}')
+                    results[name] = {field: stats[field] for field in panel['fields']} if panel['fields'] else stats
+            return {'panels': results}
+
+        return cached_json_response(cache_key, build_payload)
+
+    except (AggregateError, FilterError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"批量查询时发生错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+def build_filter_options(cache_file):
+    """
+    各筛选维度的可选值
+    立方体的维度列与筛选维度相同且行数少得多，逐个分区（经内存缓存）取出各维度的取值再合并
+    """
+    cube_file = ensure_cube(cache_file)
+    values = {}
+    for entry in read_manifest(cube_file)['partitions']:
+        df = load_partition(cube_file, entry)
+        for _, col in OPTION_FIELDS:
+            if col in df.columns:
+                values.setdefault(col, set()).update(df[col].dropna().unique().tolist())
+    return {name: sorted(values.get(col, ())) for name, col in OPTION_FIELDS}
+
+
+def filter_options(cache_file):
+    """各筛选维度的可选值，按数据集版本缓存在结果缓存中"""
+    cache_key = (cache_file, os.stat(cache_file).st_mtime_ns, 'options')
+    options = result_cache.get(cache_key)
+    if options is None:
+        options = build_filter_options(cache_file)
+        result_cache.put(cache_key, options)
+    return options
+
+
 @app.route('/api/options', methods=['GET'])
 def get_filter_options():
     """获取筛选选项（用于下拉框）"""
     try:
-        cache_file = session.get('data_cache_file')
-        if not cache_file or not os.path.exists(cache_file):
+        cache_file = session_cache_file()
+        if cache_file is None:
             return jsonify({'success': False, 'message': '数据不存在'}), 404
-        
-        df = pd.read_excel(cache_file)
-        
-        options = {
-            'agents': sorted(df['代理商来源'].dropna().unique().tolist()) if '代理商来源' in df.columns else [],
-            'bidding_methods': sorted(df['出价方式'].dropna().unique().tolist()) if '出价方式' in df.columns else [],
-            'targetings': sorted(df['定向'].dropna().unique().tolist()) if '定向' in df.columns else [],
-            'resources': sorted(df['资源位'].dropna().unique().tolist()) if '资源位' in df.columns else [],
-            'materials': sorted(df['素材样式'].dropna().unique().tolist()) if '素材样式' in df.columns else [],
-            'benefits': sorted(df['利益点'].dropna().unique().tolist()) if '利益点' in df.columns else [],
-            'dates': sorted(df['时间'].dropna().unique().tolist()) if '时间' in df.columns else [],
-        }
+
+        options = filter_options(cache_file)
         
         return jsonify({
             'success': True,
@@ -472,16 +1395,37 @@ def get_filter_options():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """缓存命中情况（用于监控）"""
+    return jsonify({
+        'success': True,
+        'statistics_cache': result_cache.stats(),
+        'dataset_cache': {
+            'entries': len(dataset_store),
+            'total_bytes': dataset_store.total_bytes,
+            'max_bytes': dataset_store.max_bytes,
+        },
+    })
+
+
 @app.route('/api/export', methods=['GET'])
 def export_data():
     """导出数据"""
     try:
-        cache_file = session.get('data_cache_file')
-        if not cache_file or not os.path.exists(cache_file):
+        cache_file = session_cache_file()
+        if cache_file is None:
             return jsonify({'success': False, 'message': '数据不存在'}), 404
+
+        # 按需生成Excel文件
+        df = load_dataset(cache_file)
+        output = io.BytesIO()
+        df.to_excel(output, index=False)
+        output.seek(0)
         
-        return send_file(cache_file, as_attachment=True, 
-                        download_name=f'广告数据_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
+        return send_file(output, as_attachment=True, 
+                        download_name=f'广告数据_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+                        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     
     except Exception as e:
         print(f"导出数据时发生错误: {e}")
@@ -502,6 +1446,7 @@ def find_free_port(start_port=5000):
     return None
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     port = find_free_port(5000)
     if port != 5000:
         print(f"⚠️  警告: 端口5000被占用，使用端口 {port}")
@@ -513,6 +1458,9 @@ if __name__ == '__main__':
     print(f"访问地址: http://localhost:{port}")
     print(f"访问地址: http://127.0.0.1:{port}")
     print("=" * 50)
+    # 清理超出配额的旧数据集和之前运行遗留的文件
+    cleanup_storage()
+    # 开发服务器：调试模式由环境变量 FLASK_DEBUG=1 开启；生产环境使用 serve.py 多进程运行
     # 使用 use_reloader=False 避免 watchdog 版本兼容问题
-    app.run(debug=True, host='127.0.0.1', port=port, use_reloader=False)
+    app.run(host='127.0.0.1', port=port, use_reloader=False)
 
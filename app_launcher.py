@@ -5,6 +5,7 @@
 import os
 import sys
 import time
+import multiprocessing
 import webbrowser
 import threading
 import socket
@@ -28,6 +29,9 @@ def open_browser(url):
     webbrowser.open(url)
 
 if __name__ == '__main__':
+    # 打包后的程序需要支持数据读取子进程（必须最先调用）
+    multiprocessing.freeze_support()
+
     # 获取资源路径（打包后的路径）
     if getattr(sys, 'frozen', False):
         # 如果是打包后的可执行文件
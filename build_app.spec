@@ -13,6 +13,10 @@ a = Analysis(
     hiddenimports=[
         'pandas',
         'openpyxl',
+        'python_calamine',
+        'orjson',
+        'brotli',
+        'pyarrow',
         'flask',
         'werkzeug',
         'jinja2',
@@ -22,7 +22,7 @@ print()
 
 # 检查依赖包
 print("2. 检查依赖包...")
-required_packages = ['flask', 'pandas', 'openpyxl', 'werkzeug']
+required_packages = ['flask', 'pandas', 'openpyxl', 'pyarrow', 'werkzeug']
 missing_packages = []
 
 for package in required_packages:
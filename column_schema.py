@@ -0,0 +1,78 @@
+"""
+字段定义模块
+声明合并数据中各数值列的类型、单位和源数据中的别名，清洗时按声明转换，不再按列名关键字猜测
+"""
+
+# 数值类型：计数、金额、比率
+COUNT = 'count'
+MONEY = 'money'
+RATE = 'rate'
+
+# 单位：percent 表示源数据可能带 %，数值保持百分数（18.44% -> 18.44）
+PERCENT = 'percent'
+
+# 数值列：标准列名 -> (类型, 单位, 源数据中的别名)
+NUMERIC_COLUMNS = {
+    '花费': (MONEY, None, ['消耗']),
+    '下载成本': (MONEY, None, []),
+    '授信金额': (MONEY, None, []),
+    '支用金额': (MONEY, None, []),
+    '曝光量': (COUNT, None, ['展示量']),
+    '点击量': (COUNT, None, []),
+    '下载量': (COUNT, None, []),
+    '安装量': (COUNT, None, []),
+    '注册人数': (COUNT, None, []),
+    '进件人数': (COUNT, None, []),
+    '进件成功人数': (COUNT, None, []),
+    '授信提交人数': (COUNT, None, []),
+    '授信成功人数': (COUNT, None, []),
+    '授信人数': (COUNT, None, []),
+    '支用申请人数': (COUNT, None, []),
+    '支用通过人数': (COUNT, None, []),
+    '支用成功人数': (COUNT, None, []),
+    '支用人数': (COUNT, None, []),
+    '支用笔数': (COUNT, None, []),
+    '点击率': (RATE, PERCENT, []),
+    '点击下载率': (RATE, PERCENT, []),
+    '平均执行利率': (RATE, PERCENT, []),
+    '平均对客利率': (RATE, PERCENT, []),
+}
+
+# 合并前后端数据时后端重名列的后缀
+BACKEND_SUFFIX = '_后端'
+
+# 计数列取值范围（可空 Int32）；含小数或超出范围时保留 float64
+INT32_MIN = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+
+
+def column_spec(name):
+    """
+    列的字段定义，后端重名列（如 点击量_后端）按原列名查找
+
+    Returns:
+        (类型, 单位, 别名) 或 None（未声明的列）
+    """
+    name = str(name)
+    if name.endswith(BACKEND_SUFFIX):
+        name = name[:-len(BACKEND_SUFFIX)]
+    return NUMERIC_COLUMNS.get(name)
+
+
+def alias_renames(columns):
+    """
+    源数据中使用别名的列 -> 标准列名（已有标准列名时不改名）
+
+    Returns:
+        可直接传给 DataFrame.rename(columns=...) 的字典
+    """
+    present = set(columns)
+    renames = {}
+    for name, (_, _, aliases) in NUMERIC_COLUMNS.items():
+        if name in present:
+            continue
+        for alias in aliases:
+            if alias in present:
+                renames[alias] = name
+                break
+    return renames
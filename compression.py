@@ -0,0 +1,78 @@
+"""
+响应压缩模块
+按请求的 Accept-Encoding 协商 br / gzip，压缩JSON接口和静态资源；安装了 brotli 时支持 br
+"""
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+# 需要压缩的响应类型（Excel等已压缩的文件不再压缩）
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/javascript',
+    'text/css',
+    'text/html',
+    'text/plain',
+    'image/svg+xml',
+}
+
+
+def available_encodings():
+    """服务端支持的压缩格式，按优先级排列"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """
+    选择压缩格式
+
+    Args:
+        accept_encodings: request.accept_encodings
+
+    Returns:
+        客户端接受且权重最高的格式（权重相同时优先 br），都不接受时返回None
+    """
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_bytes(data, encoding, level):
+    """整体压缩响应内容"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def iter_compressed(chunks, encoding, level):
+    """
+    流式压缩：逐块压缩生成器输出的内容，不在内存中拼接完整响应
+
+    Args:
+        chunks: 字节串或字符串的可迭代对象
+        encoding: 'br' 或 'gzip'
+        level: 压缩级别
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
@@ -0,0 +1,83 @@
+"""
+数据立方体模块
+上传时按筛选维度预聚合合并数据，统计接口直接在立方体上汇总，无需扫描计划级明细
+"""
+import pandas as pd
+
+# 立方体维度：统计接口的所有筛选条件和分组都基于这些列
+CUBE_DIMENSIONS = ['时间', '代理商来源', '出价方式', '定向', '资源位', '素材样式', '利益点']
+
+# 平均执行利率按支用金额加权，预先计算加权值以便求和
+EXEC_RATE_WEIGHTED_COLUMN = '执行利率加权支用金额'
+EXEC_RATE_COLUMNS = ['平均执行利率', '平均执行利率_后端']
+LOAN_AMOUNT_COLUMNS = ['支用金额', '支用金额_后端']
+
+
+def _first_column(df, candidates):
+    for col in candidates:
+        if col in df.columns:
+            return col
+    return None
+
+
+def cube_measure_columns(df):
+    """
+    可求和的度量列：数值列中排除比率（率）和单位成本（成本）
+    """
+    return [
+        col for col in df.columns
+        if col not in CUBE_DIMENSIONS
+        and pd.api.types.is_numeric_dtype(df[col])
+        and not pd.api.types.is_bool_dtype(df[col])
+        and '率' not in str(col)
+        and '成本' not in str(col)
+    ]
+
+
+def build_cube(df):
+    """
+    构建预聚合立方体
+
+    Args:
+        df: 合并后的明细数据DataFrame
+
+    Returns:
+        按 CUBE_DIMENSIONS 分组求和后的DataFrame（维度为空的行单独成组，保证总量不变）
+    """
+    print("正在构建预聚合数据...")
+    dims = [col for col in CUBE_DIMENSIONS if col in df.columns]
+    measures = cube_measure_columns(df)
+    frame = df[dims + measures]
+
+    exec_rate_col = _first_column(df, EXEC_RATE_COLUMNS)
+    loan_amount_col = _first_column(df, LOAN_AMOUNT_COLUMNS)
+    if exec_rate_col and loan_amount_col:
+        frame = frame.assign(**{
+            EXEC_RATE_WEIGHTED_COLUMN: df[exec_rate_col].fillna(0) * df[loan_amount_col].fillna(0)
+        })
+        measures = measures + [EXEC_RATE_WEIGHTED_COLUMN]
+
+    if not dims:
+        cube = frame[measures].sum().to_frame().T
+    else:
+        cube = frame.groupby(dims, observed=True, dropna=False, sort=False)[measures].sum().reset_index()
+    print(f"预聚合完成：{len(df)} 行明细 -> {len(cube)} 行")
+    return cube
+
+
+def merge_cubes(cubes):
+    """
+    合并多个部分立方体（如分块构建的立方体）：度量都是可加的，按维度再次求和
+
+    Args:
+        cubes: build_cube 结果的列表
+
+    Returns:
+        合并后的立方体
+    """
+    cube = pd.concat(cubes, ignore_index=True) if len(cubes) > 1 else cubes[0]
+    dims = [col for col in CUBE_DIMENSIONS if col in cube.columns]
+    measures = [col for col in cube.columns if col not in dims]
+    if not dims:
+        return cube[measures].sum().to_frame().T
+    return cube.groupby(dims, observed=True, dropna=False, sort=False)[measures].sum().reset_index()
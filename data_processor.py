@@ -2,44 +2,313 @@
 数据处理模块
 基于merge_ads_data_v4逻辑实现数据清洗和合并
 """
+import numpy as np
 import pandas as pd
+import multiprocessing
 import warnings
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from excel_reader import read_sheet, iter_sheet_chunks
+from column_schema import COUNT, RATE, PERCENT, INT32_MIN, INT32_MAX, BACKEND_SUFFIX, column_spec, alias_renames
+from plan_name_parser import PLAN_NAME_FIELDS, PlanNameParser
 
 # 忽略警告
 warnings.filterwarnings('ignore')
 
+# 代理商结算费率：代理名称包含关键字即使用对应费率（按顺序匹配，先匹配先生效）
+# 结算花费 = 点击量 × 费率
+AGENT_SETTLEMENT_RATES = [
+    ('奇异果', 0.58),
+    ('哇棒', 0.5),
+]
+
+# 低基数维度列：以分类类型（category）存储，筛选和分组基于整数编码
+DIMENSION_COLUMNS = ['代理商来源', '代理', '资源位', '出价方式', '年龄', '定向', '素材样式', '利益点', '时间']
+
+# 成本指标：(指标列, 分子列, 分母列)
+COST_METRICS = [
+    ('注册成本', '花费', '注册人数'),
+    ('进件成本', '花费', '进件人数'),
+    ('授信成本', '花费', '授信成功人数'),
+    ('支用成本', '花费', '支用成功人数'),
+    ('下载成本', '花费', '下载量'),
+]
 
-def clean_id_column(series):
+
+def _map_unique_values(series, func, missing_value, as_category=False):
+    """
+    对去重后的非空值调用 func(Series) 完成转换，再按 factorize 编码映射回每一行
+    ID、日期、维度值在数据中大量重复，只需处理一次
+    as_category 为True时返回分类类型（直接沿用编码，不生成逐行的字符串数组）
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    values = np.empty(len(uniques) + 1, dtype=object)
+    values[:-1] = np.asarray(func(pd.Series(uniques)), dtype=object)
+    # 缺失值的编码为-1，对应末尾的缺失值
+    values[-1] = missing_value
+    if as_category:
+        # 转换后的取值可能重复（如 123.0 和 '123'），在去重后的取值上再编码一次
+        value_codes, categories = pd.factorize(values, use_na_sentinel=True)
+        return pd.Series(pd.Categorical.from_codes(value_codes[codes], categories), index=series.index)
+    return pd.Series(values[codes], index=series.index, dtype=object)
+
+
+def _float_ids_to_str(values):
+    """浮点ID截断取整后转字符串（等价于 str(int(x))），经可空整数类型转换"""
+    return pd.Series(np.trunc(values), index=values.index).astype('Int64').astype(str)
+
+
+def _clean_id_values(values):
+    if pd.api.types.is_float_dtype(values):
+        return _float_ids_to_str(values)
+    result = values.astype(str)
+    if pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return result
+    result = result.str.strip()
+    if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+        # 混合类型：浮点值取整后转字符串，其他值转字符串后去空格
+        is_float = values.map(type).isin([float, np.float64])
+        if is_float.any():
+            result[is_float] = _float_ids_to_str(values[is_float].astype(float))
+    return result
+
+
+def clean_id_column(series, as_category=False):
     """
     ID清洗：转字符串，去小数点，去空格
     
     Args:
         series: pandas Series，包含计划ID数据
+        as_category: 为True时返回分类类型
         
     Returns:
         清洗后的Series
     """
-    def _process(x):
-        if pd.isna(x):
-            return ""
-        if isinstance(x, float):
-            return str(int(x))
-        return str(x).strip()
-    return series.apply(_process)
+    return _map_unique_values(series, _clean_id_values, "", as_category)
 
 
-def normalize_date(series):
+def normalize_date(series, date_format=None, as_category=False):
     """
     日期清洗和标准化
     
     Args:
         series: pandas Series，包含日期数据
+        date_format: 日期格式（如 '%Y-%m-%d'），为None时按首个有效值自动推断
+        as_category: 为True时返回分类类型
         
     Returns:
         标准化后的日期Series（格式：YYYY-MM-DD）
     """
-    return pd.to_datetime(series, errors='coerce').dt.strftime('%Y-%m-%d')
+    def _format_days(values):
+        parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+        day_text = np.asarray(parsed.values.astype('datetime64[D]').astype(str), dtype=object)
+        day_text[parsed.isna().to_numpy()] = np.nan
+        return day_text
+
+    return _map_unique_values(series, _format_days, np.nan, as_category)
+
+
+def parse_numeric(series, unit=None):
+    """
+    数值列解析，返回 float64 数组
+    数值类型直接转换；文本按去重后的取值解析一次（单位为 percent 时去掉 %），无法解析的值（空串、nan、None等）为空值
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype='float64', na_value=np.nan)
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    text = pd.Series(uniques, dtype=object).astype(str)
+    if unit == PERCENT:
+        text = text.str.replace('%', '', regex=False)
+    # 缺失值的编码为-1，对应末尾的空值
+    values = np.append(pd.to_numeric(text, errors='coerce').to_numpy(dtype='float64'), np.nan)
+    return values[codes]
+
+
+def to_count_array(values, name):
+    """
+    计数列转为可空 Int32
+    含小数或超出 Int32 范围时保留 float64
+    """
+    missing = np.isnan(values)
+    present = values[~missing]
+    if present.size and (np.any(present != np.trunc(present))
+                         or present.min() < INT32_MIN or present.max() > INT32_MAX):
+        print(f"警告：{name} 含小数或超出整数范围，保留为浮点数")
+        return values
+    return pd.arrays.IntegerArray(np.where(missing, 0, values).astype(np.int32), missing)
+
+
+def coerce_numeric_columns(df):
+    """
+    按字段定义（column_schema.NUMERIC_COLUMNS）转换数值列：计数为可空 Int32，金额、比率为 float64
+    已是目标类型的列直接跳过，未声明的列保持原样
+
+    Args:
+        df: 数据DataFrame
+
+    Returns:
+        转换后的DataFrame
+    """
+    for col in df.columns:
+        spec = column_spec(col)
+        if spec is None:
+            continue
+        kind, unit, _ = spec
+        dtype = df[col].dtype
+        if (dtype == 'Int32') if kind == COUNT else (dtype == np.float64):
+            continue
+        values = parse_numeric(df[col], unit)
+        df[col] = to_count_array(values, col) if kind == COUNT else values
+    return df
+
+
+def undeclared_columns(columns):
+    """未在字段定义中声明、也不是文本列的列"""
+    return [col for col in columns if column_spec(col) is None and col not in TEXT_COLUMNS]
+
+
+# 代理商数据源：工作表名称和字段映射
+KIWI_COLUMN_MAP = {
+    '计划名称': '计划名称', '计划ID': '计划id', '计划id': '计划id',
+    '日期': '时间', '时间': '时间', '花费': '花费', '消耗': '花费',
+    '曝光量': '曝光量', '展示量': '曝光量', '点击量': '点击量', '点击率': '点击率',
+    '下载量': '下载量', '点击下载率': '点击下载率', '下载成本': '下载成本', '安装量': '安装量'
+}
+
+WABANG_COLUMN_MAP = {
+    '计划名称': '计划名称', '计划ID': '计划id', '时间': '时间', '花费': '花费',
+    '曝光量': '曝光量', '点击量': '点击量', '点击率': '点击率', '下载量': '下载量',
+    '点击下载率': '点击下载率', '下载成本': '下载成本', '安装量': '安装量'
+}
+
+AGENT_SOURCES = {
+    'kiwi': {'name': '奇异果', 'sheet_name': '计划数据', 'column_map': KIWI_COLUMN_MAP},
+    'wabang': {'name': '哇棒', 'sheet_name': '总数据源', 'column_map': WABANG_COLUMN_MAP},
+}
+
+AGENT_TARGET_COLUMNS = ['计划名称', '计划id', '时间', '花费', '曝光量', '点击量', '点击率',
+                        '下载量', '点击下载率', '下载成本', '安装量']
+
+# 后端数据源
+BACKEND_SHEET_NAME = '分计划明细表'
+BACKEND_RENAME = {'event_chnl_dtl': '计划id', 'event_dt': '时间'}
+
+# 文本列（ID、日期、维度），不做数值转换
+TEXT_COLUMNS = ['计划名称', '计划id', '时间', '代理商来源'] + PLAN_NAME_FIELDS
+
+# 数据集的行键：同一计划同一天只有一行数据，追加上传时按此键替换
+DATASET_KEY_COLUMNS = ['计划id', '时间']
+
+# 读取数据的并发进程数上限（三个文件各占一个进程）
+MAX_INGEST_WORKERS = 3
+
+# 分块处理时每块的默认行数
+DEFAULT_CHUNK_ROWS = 100000
+
+# 计划名称解析器（拆分规则和写法统一见 plan_name_parser），解析结果按计划名称缓存
+plan_name_parser = PlanNameParser()
+
+
+def read_agent_sheet(file_path, source):
+    """
+    读取代理商工作表并统一字段
+
+    Args:
+        file_path: 文件路径
+        source: AGENT_SOURCES 中的键（'kiwi' 或 'wabang'）
+
+    Returns:
+        只包含 AGENT_TARGET_COLUMNS 和 代理商来源 的DataFrame
+    """
+    spec = AGENT_SOURCES[source]
+    # 只读取字段映射中出现的列
+    df = read_sheet(file_path, spec['sheet_name'], usecols=list(spec['column_map']))
+    return _standardize_agent_frame(df, spec)
+
+
+def _standardize_agent_frame(df, spec):
+    """代理商数据统一字段：重命名、补齐目标列、添加代理商来源"""
+    df = df.rename(columns=spec['column_map'])
+    # 确保所有目标列都存在
+    for col in AGENT_TARGET_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    df = df[AGENT_TARGET_COLUMNS]
+    df['代理商来源'] = spec['name']
+    return df
+
+
+def normalize_agent_data(full_df, parser=None):
+    """
+    代理商数据清洗：ID、日期、数值列转换、拆分计划名称、统一维度写法
+
+    Args:
+        full_df: read_agent_sheet 读取的数据（可以是多个文件合并后的数据）
+        parser: 计划名称解析器，为None时使用 plan_name_parser
+
+    Returns:
+        清洗后的DataFrame
+    """
+    # 数据清洗（行键以分类类型保存，合并前后端数据时直接使用分类编码）
+    full_df['计划id'] = clean_id_column(full_df['计划id'], as_category=True)
+    full_df['时间'] = normalize_date(full_df['时间'], as_category=True)
+    full_df = coerce_numeric_columns(full_df)
+
+    # 拆分计划名称并统一出价方式、年龄、定向的写法（每个计划名称只解析一次）
+    split_data = (parser or plan_name_parser).parse(full_df['计划名称'])
+    return pd.concat([full_df, split_data], axis=1)
+
+
+def read_backend_sheet(file_path):
+    """读取后端（华为）分计划明细表（指标列都参与合并，读取全部列）"""
+    return read_sheet(file_path, BACKEND_SHEET_NAME)
+
+
+def normalize_backend_data(df_backend):
+    """
+    后端数据清洗：字段重命名（含字段定义中的别名）、ID和日期标准化、数值列转换
+
+    Args:
+        df_backend: read_backend_sheet 读取的数据
+
+    Returns:
+        清洗后的DataFrame
+    """
+    df_backend = df_backend.rename(columns={**BACKEND_RENAME, **alias_renames(df_backend.columns)})
+    df_backend['计划id'] = clean_id_column(df_backend['计划id'], as_category=True)
+    df_backend['时间'] = normalize_date(df_backend['时间'], as_category=True)
+    return coerce_numeric_columns(df_backend)
+
+
+def _no_progress(stage, status, seconds=None):
+    pass
+
+
+def ingest_file(source, file_path):
+    """
+    读取并清洗单个文件，可在子进程中执行
+
+    Args:
+        source: 'kiwi'、'wabang' 或 'backend'
+        file_path: 文件路径
+
+    Returns:
+        (清洗后的DataFrame, 读取耗时秒数, 清洗耗时秒数)
+    """
+    start = time.perf_counter()
+    if source == 'backend':
+        df = read_backend_sheet(file_path)
+        print(f"   后端文件包含列: {list(df.columns)}")
+        read_seconds = time.perf_counter() - start
+        df = normalize_backend_data(df)
+    else:
+        df = read_agent_sheet(file_path, source)
+        read_seconds = time.perf_counter() - start
+        df = normalize_agent_data(df)
+    return df, read_seconds, time.perf_counter() - start - read_seconds
 
 
 def process_agent_data(kiwi_file_path=None, wabang_file_path=None):
@@ -54,112 +323,27 @@ def process_agent_data(kiwi_file_path=None, wabang_file_path=None):
         处理后的代理商数据DataFrame，如果失败返回None
     """
     print("正在处理代理商数据...")
-    
-    # 字段映射字典
-    kiwi_map = {
-        '计划名称': '计划名称', '计划ID': '计划id', '计划id': '计划id',
-        '日期': '时间', '时间': '时间', '花费': '花费', '消耗': '花费',
-        '曝光量': '曝光量', '展示量': '曝光量', '点击量': '点击量', '点击率': '点击率',
-        '下载量': '下载量', '点击下载率': '点击下载率', '下载成本': '下载成本', '安装量': '安装量'
-    }
-
-    wabang_map = {
-        '计划名称': '计划名称', '计划ID': '计划id', '时间': '时间', '花费': '花费',
-        '曝光量': '曝光量', '点击量': '点击量', '点击率': '点击率', '下载量': '下载量',
-        '点击下载率': '点击下载率', '下载成本': '下载成本', '安装量': '安装量'
-    }
-
-    target_columns = ['计划名称', '计划id', '时间', '花费', '曝光量', '点击量', '点击率', 
-                     '下载量', '点击下载率', '下载成本', '安装量']
     dfs = []
-
-    # 处理奇异果数据
-    if kiwi_file_path and os.path.exists(kiwi_file_path):
-        try:
-            print(f"-> 正在读取奇异果文件: {os.path.basename(kiwi_file_path)}")
-            df = pd.read_excel(kiwi_file_path, sheet_name='计划数据')
-            df = df.rename(columns=kiwi_map)
-            # 确保所有目标列都存在
-            for col in target_columns:
-                if col not in df.columns:
-                    df[col] = None
-            df = df[target_columns]
-            df['代理商来源'] = '奇异果'
-            dfs.append(df)
-            print(f"   成功读取 {len(df)} 行数据")
-        except Exception as e:
-            print(f"读取奇异果文件失败: {e}")
-            return None
-
-    # 处理哇棒数据
-    if wabang_file_path and os.path.exists(wabang_file_path):
+    for source, file_path in [('kiwi', kiwi_file_path), ('wabang', wabang_file_path)]:
+        if not file_path or not os.path.exists(file_path):
+            continue
+        name = AGENT_SOURCES[source]['name']
         try:
-            print(f"-> 正在读取哇棒文件: {os.path.basename(wabang_file_path)}")
-            df = pd.read_excel(wabang_file_path, sheet_name='总数据源')
-            df = df.rename(columns=wabang_map)
-            # 确保所有目标列都存在
-            for col in target_columns:
-                if col not in df.columns:
-                    df[col] = None
-            df = df[target_columns]
-            df['代理商来源'] = '哇棒'
+            print(f"-> 正在读取{name}文件: {os.path.basename(file_path)}")
+            df = read_agent_sheet(file_path, source)
             dfs.append(df)
             print(f"   成功读取 {len(df)} 行数据")
         except Exception as e:
-            print(f"读取哇棒文件失败: {e}")
+            print(f"读取{name}文件失败: {e}")
             return None
 
     if not dfs:
         print("错误：未找到任何代理商数据文件")
         return None
 
-    # 合并数据
-    full_df = pd.concat(dfs, ignore_index=True)
-    
-    # 数据清洗
-    full_df['计划id'] = clean_id_column(full_df['计划id'])
-    full_df['时间'] = normalize_date(full_df['时间'])
-
-    # 拆分计划名称
+    # 合并数据后统一清洗
     print("正在拆分计划名称...")
-    split_cols = ['代理', '资源位', '出价方式', '年龄', '定向', '素材样式', '利益点', '时间_split']
-    split_data = full_df['计划名称'].astype(str).str.split('-', n=8, expand=True).iloc[:, :8]
-    if split_data.shape[1] < 8:
-        for i in range(split_data.shape[1], 8):
-            split_data[i] = None
-    split_data.columns = split_cols
-    full_df = pd.concat([full_df, split_data], axis=1)
-
-    # 规范出价方式大小写
-    if '出价方式' in full_df.columns:
-        def normalize_bidding(val):
-            if pd.isna(val):
-                return None
-            text = str(val).strip()
-            if not text or text.lower() in ['nan', 'none']:
-                return None
-            return text.upper()
-        full_df['出价方式'] = full_df['出价方式'].apply(normalize_bidding)
-
-    # 统一年龄写法
-    if '年龄' in full_df.columns:
-        age_mapping = {
-            '24～54岁': '24-54岁',
-            '24至54岁': '24-54岁',
-            '24~54岁': '24-54岁',
-        }
-        full_df['年龄'] = full_df['年龄'].replace(age_mapping)
-
-    # 统一定向写法（全部转为大写）
-    if '定向' in full_df.columns:
-        def normalize_targeting(val):
-            if pd.isna(val):
-                return None
-            text = str(val).strip()
-            if not text or text.lower() in ['nan', 'none']:
-                return None
-            return text.upper()
-        full_df['定向'] = full_df['定向'].apply(normalize_targeting)
+    full_df = normalize_agent_data(pd.concat(dfs, ignore_index=True))
 
     print(f"代理商数据处理完成，共 {len(full_df)} 行数据")
     return full_df
@@ -183,18 +367,7 @@ def process_backend_data(backend_file_path):
     
     try:
         print(f"-> 正在读取后端文件: {os.path.basename(backend_file_path)}")
-        df_backend = pd.read_excel(backend_file_path, sheet_name='分计划明细表')
-        
-        print(f"   后端文件包含列: {list(df_backend.columns)}")
-        
-        # 字段重命名
-        backend_rename = {'event_chnl_dtl': '计划id', 'event_dt': '时间'}
-        df_backend = df_backend.rename(columns=backend_rename)
-        
-        # 数据清洗
-        df_backend['计划id'] = clean_id_column(df_backend['计划id'])
-        df_backend['时间'] = normalize_date(df_backend['时间'])
-        
+        df_backend, _, _ = ingest_file('backend', backend_file_path)
         print(f"   成功读取 {len(df_backend)} 行后端数据")
         return df_backend
     except Exception as e:
@@ -204,45 +377,236 @@ def process_backend_data(backend_file_path):
         return None
 
 
-def merge_data(df_front, df_back):
+def ingest_all_files(kiwi_file_path=None, wabang_file_path=None, backend_file_path=None,
+                     max_workers=None, timings=None, progress=None):
+    """
+    并行读取并清洗所有上传文件
+
+    三个工作簿分别在独立进程中解析，每个文件读取完成后立即在该进程中清洗，
+    总耗时约等于最慢的单个文件。max_workers=1 或无法创建进程池时按顺序处理。
+
+    Args:
+        kiwi_file_path: 奇异果文件路径
+        wabang_file_path: 哇棒文件路径
+        backend_file_path: 后端文件路径
+        max_workers: 最大进程数，默认 MAX_INGEST_WORKERS
+        timings: 传入字典时写入每个文件的耗时 {source: {'read': 秒, 'normalize': 秒}}
+        progress: 进度回调 progress(source, status, seconds=None)，status 为 running / done / failed
+
+    Returns:
+        (代理商数据DataFrame或None, 后端数据DataFrame或None)
+    """
+    tasks = [
+        (source, file_path)
+        for source, file_path in [('kiwi', kiwi_file_path), ('wabang', wabang_file_path),
+                                  ('backend', backend_file_path)]
+        if file_path and os.path.exists(file_path)
+    ]
+    if max_workers is None:
+        max_workers = MAX_INGEST_WORKERS
+    max_workers = min(max_workers, len(tasks), os.cpu_count() or 1)
+    if progress is None:
+        progress = _no_progress
+
+    results = {}
+    errors = {}
+
+    def _collect(source, outcome):
+        df, read_seconds, normalize_seconds = outcome
+        results[source] = df
+        if timings is not None:
+            timings[source] = {'read': read_seconds, 'normalize': normalize_seconds}
+        progress(source, 'done', read_seconds + normalize_seconds)
+        name = AGENT_SOURCES[source]['name'] if source in AGENT_SOURCES else '后端'
+        print(f"   {name}文件处理完成：{len(df)} 行，读取 {read_seconds:.2f} 秒，清洗 {normalize_seconds:.2f} 秒")
+
+    pool = None
+    if max_workers > 1:
+        try:
+            # 使用 spawn 启动子进程，避免在多线程的Web服务中 fork
+            pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        except (OSError, ValueError, NotImplementedError) as e:
+            print(f"无法创建进程池，改为顺序读取: {e}")
+
+    pending = list(tasks)
+    if pool is not None:
+        with pool:
+            for source, _ in tasks:
+                progress(source, 'running')
+            futures = {pool.submit(ingest_file, source, file_path): (source, file_path)
+                       for source, file_path in tasks}
+            for future in as_completed(futures):
+                source, file_path = futures[future]
+                try:
+                    _collect(source, future.result())
+                except BrokenProcessPool as e:
+                    # 子进程异常退出（如无法启动），剩余文件改为在当前进程处理
+                    print(f"读取进程异常退出，改为顺序读取: {e}")
+                    continue
+                except Exception as e:
+                    errors[source] = e
+                pending.remove((source, file_path))
+
+    for source, file_path in pending:
+        progress(source, 'running')
+        try:
+            _collect(source, ingest_file(source, file_path))
+        except Exception as e:
+            errors[source] = e
+
+    for source, e in errors.items():
+        name = AGENT_SOURCES[source]['name'] if source in AGENT_SOURCES else '后端'
+        print(f"读取{name}文件失败: {e}")
+        progress(source, 'failed')
+
+    # 任一代理商文件失败则整体失败；后端文件失败时仅使用前端数据
+    if any(source in errors for source in AGENT_SOURCES):
+        return None, None
+    agent_frames = [results[source] for source in AGENT_SOURCES if source in results]
+    if not agent_frames:
+        print("错误：未找到任何代理商数据文件")
+        return None, None
+    df_front = concat_with_categories(agent_frames) if len(agent_frames) > 1 else agent_frames[0]
+    return df_front, results.get('backend')
+
+
+def _key_codes(values):
+    """键列的逐行编码和取值：分类列直接使用分类编码（缺失值编码为-1，对应末尾的空值），其他列 factorize"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), np.append(np.asarray(values.cat.categories, dtype=object), np.nan)
+    return pd.factorize(values, use_na_sentinel=False)
+
+
+# 重复键报告中的示例数
+DUPLICATE_KEY_EXAMPLES = 5
+
+
+def report_duplicate_keys(df, duplicated, key_columns, label):
+    """
+    打印重复键的行数和示例
+
+    Returns:
+        {'rows': 重复的行数, 'keys': 有重复的键数, 'examples': [[键值, ...], ...]}（可直接放入任务结果）
+    """
+    keys = df.loc[duplicated, key_columns].drop_duplicates()
+    examples = [[str(value) for value in row] for row in keys.head(DUPLICATE_KEY_EXAMPLES).itertuples(index=False)]
+    print(f"警告：{label}中有 {int(duplicated.sum())} 行的 ({', '.join(key_columns)}) 与前面的行重复，"
+          f"同一键的多行已合并（计数和金额求和），示例：{examples}")
+    return {'rows': int(duplicated.sum()), 'keys': len(keys), 'examples': examples}
+
+
+def _combine_duplicate_keys(values, key):
+    """
+    同一键的多行合并为一行：计数和金额列求和（全部为空时仍为空），比率列取平均，其他列取第一个非空值
+    只对有重复的键分组，其余行保持不变
+
+    Returns:
+        以键为索引的DataFrame
+    """
+    repeated = pd.Index(key).duplicated(keep=False)
+    groups = values[repeated].groupby(key[repeated], sort=False)
+    sum_cols, mean_cols, first_cols = [], [], []
+    for col in values.columns:
+        spec = column_spec(col)
+        if spec is not None and spec[0] == RATE:
+            mean_cols.append(col)
+        elif spec is not None or (pd.api.types.is_numeric_dtype(values[col])
+                                  and not pd.api.types.is_bool_dtype(values[col])):
+            sum_cols.append(col)
+        else:
+            first_cols.append(col)
+    combined = pd.concat([
+        groups[sum_cols].sum(min_count=1),
+        groups[mean_cols].mean(),
+        groups[first_cols].first(),
+    ], axis=1)[list(values.columns)]
+    unique = values[~repeated]
+    unique.index = key[~repeated]
+    return pd.concat([unique, combined])
+
+
+class KeyLookup:
+    """
+    按行键（计划id, 时间）查找后端数据的行
+
+    后端的各键列编码后按混合进制组合为单个 int64 键并建立索引；前端数据只需把去重后的键值
+    映射到后端的编码，不在字符串上逐行做哈希和比较。建立一次后可用于多个数据块（分块处理）。
+    后端同一键有多行时先合并为一行（左连接会把前端行复制多份，重复计算花费等指标），
+    duplicates 记录重复情况（见 report_duplicate_keys），没有重复时为None。
+    """
+
+    def __init__(self, df_back, key_columns=None, label='后端数据'):
+        self.key_columns = key_columns or DATASET_KEY_COLUMNS
+        self._key_values = []
+        key = np.zeros(len(df_back), dtype=np.int64)
+        for col in self.key_columns:
+            codes, values = _key_codes(df_back[col])
+            values = pd.Index(values)
+            key = key * len(values) + np.where(codes < 0, len(values) - 1, codes)
+            self._key_values.append(values)
+        self.duplicates = None
+        self.values = df_back.drop(columns=self.key_columns)
+        duplicated = pd.Index(key).duplicated()
+        if duplicated.any():
+            self.duplicates = report_duplicate_keys(df_back, duplicated, self.key_columns, label)
+            self.values = _combine_duplicate_keys(self.values, key)
+        else:
+            self.values.index = key
+
+    def lookup(self, df_front):
+        """
+        按前端数据的行键取出后端数据
+
+        Returns:
+            与 df_front 行对齐的后端数据（不含键列），没有匹配的行为空值
+        """
+        key = np.zeros(len(df_front), dtype=np.int64)
+        missing = np.zeros(len(df_front), dtype=bool)
+        for col, values in zip(self.key_columns, self._key_values):
+            codes, front_values = _key_codes(df_front[col])
+            codes = values.get_indexer(front_values)[codes]
+            missing |= codes < 0
+            key = key * len(values) + codes
+        key[missing] = -1
+        result = self.values.reindex(key)
+        result.index = df_front.index
+        return result
+
+
+def merge_data(df_front, df_back, backend_lookup=None):
     """
     合并前后端数据
     
     Args:
         df_front: 前端数据DataFrame
         df_back: 后端数据DataFrame
+        backend_lookup: 已建立的后端数据 KeyLookup（分块处理时各块共用），传入时忽略 df_back
         
     Returns:
         合并后的DataFrame
     """
     print("正在进行前后端数据匹配...")
     
-    if df_back is not None:
-        merged_df = pd.merge(df_front, df_back, on=['计划id', '时间'], 
-                           how='left', suffixes=('', '_后端'))
+    if backend_lookup is None and df_back is not None:
+        backend_lookup = KeyLookup(df_back)
+    if backend_lookup is not None:
+        back_values = backend_lookup.lookup(df_front)
+        back_values.columns = [f'{col}{BACKEND_SUFFIX}' if col in df_front.columns else col
+                               for col in back_values.columns]
+        merged_df = pd.concat([df_front, back_values], axis=1).reset_index(drop=True)
     else:
         merged_df = df_front
         print("警告：未提供后端数据，仅使用前端数据")
+    # 计划id在数据集中仍为字符串（时间在 encode_dimension_columns 中转为有序分类）
+    if isinstance(merged_df['计划id'].dtype, pd.CategoricalDtype):
+        merged_df['计划id'] = merged_df['计划id'].astype(object)
     
-    # 数据清洗
+    # 数据清洗：数值列按字段定义转换（读取时已转换的列直接跳过）
     print("正在清洗最终数据...")
-    
-    # 处理带 % 的利率列
-    rate_columns = ['平均执行利率', '平均对客利率', '点击率', '点击下载率']
-    
-    for col in merged_df.columns:
-        # 如果是利率相关的列
-        if col in rate_columns or '率' in str(col):
-            # 步骤A: 替换 %
-            merged_df[col] = merged_df[col].astype(str).str.replace('%', '', regex=False)
-            # 步骤B: 替换 'nan' 字符串为实际的 NaN
-            merged_df[col] = merged_df[col].replace({'nan': None, 'None': None, '': None})
-            # 步骤C: 强转数字
-            merged_df[col] = pd.to_numeric(merged_df[col], errors='coerce')
-
-        # 如果是其他数值列
-        elif any(x in str(col) for x in ['花费', '曝光', '点击', '下载', '安装', '金额', '人数', '成本']):
-            merged_df[col] = pd.to_numeric(merged_df[col], errors='coerce')
+    merged_df = coerce_numeric_columns(merged_df)
+    unknown = undeclared_columns(merged_df.columns)
+    if unknown:
+        print(f"警告：以下列未在字段定义（column_schema.py）中声明，保持原样：{unknown}")
     
     # 统一指标命名
     if '授信成功人数' in merged_df.columns:
@@ -254,6 +618,48 @@ def merge_data(df_front, df_back):
     return merged_df
 
 
+def safe_divide(numerator, denominator):
+    """
+    按列安全除法
+
+    Args:
+        numerator: 分子Series
+        denominator: 分母Series
+
+    Returns:
+        结果Series，分子或分母缺失、分母为0时为空值
+    """
+    numerator = pd.to_numeric(numerator, errors='coerce').astype('float64')
+    denominator = pd.to_numeric(denominator, errors='coerce').astype('float64')
+    return numerator / denominator.where(denominator != 0)
+
+
+def lookup_settlement_rate(agent_names, rate_table=None):
+    """
+    按代理名称查找结算费率
+
+    Args:
+        agent_names: 代理名称Series
+        rate_table: [(关键字, 费率)]，默认使用 AGENT_SETTLEMENT_RATES
+
+    Returns:
+        费率Series（float），未匹配的代理为空值
+    """
+    if rate_table is None:
+        rate_table = AGENT_SETTLEMENT_RATES
+    # 代理名称只有少数几种取值，对去重后的名称逐个匹配后再映射回每一行
+    codes, uniques = pd.factorize(agent_names, use_na_sentinel=True)
+    unique_rates = np.full(len(uniques) + 1, np.nan)
+    for i, name in enumerate(uniques):
+        text = str(name)
+        for keyword, rate in rate_table:
+            if keyword in text:
+                unique_rates[i] = rate
+                break
+    # 缺失值的编码为-1，对应末尾的空值
+    return pd.Series(unique_rates[codes], index=agent_names.index)
+
+
 def calculate_cost_metrics(df):
     """
     计算成本指标
@@ -265,63 +671,231 @@ def calculate_cost_metrics(df):
         添加了成本指标列的DataFrame
     """
     print("正在计算成本指标...")
-    
-    def safe_div(numerator, denominator):
-        if pd.isna(numerator) or pd.isna(denominator) or denominator == 0:
-            return None
-        return numerator / denominator
-
-    def calc_settlement(row):
-        clicks = row.get('点击量')
-        if pd.isna(clicks) or clicks == 0:
-            return None
-        agent_name = row.get('代理') or row.get('代理商来源')
-        if not agent_name or pd.isna(agent_name):
-            return None
-        agent_text = str(agent_name)
-        if '奇异果' in agent_text:
-            rate = 0.58
-        elif '哇棒' in agent_text:
-            rate = 0.5
-        else:
-            return None
-        return clicks * rate
 
     if '曝光量' in df.columns:
-        df['结算花费'] = df.apply(calc_settlement, axis=1)
+        # 优先使用计划名称中的代理，为None或空字符串时使用代理商来源
+        # （与原逐行实现的 `代理 or 代理商来源` 一致：代理为NaN时不回退，结算花费为空）
+        agent_names = pd.Series(None, index=df.index, dtype=object)
+        if '代理商来源' in df.columns:
+            agent_names = df['代理商来源'].astype(object)
+        if '代理' in df.columns:
+            split_agent = df['代理'].astype(object)
+            values = split_agent.to_numpy()
+            use_source = (values == None) | (values == '')  # noqa: E711  逐元素比较
+            agent_names = split_agent.where(~use_source, agent_names)
+        rates = lookup_settlement_rate(agent_names)
+
+        if '点击量' in df.columns:
+            clicks = pd.to_numeric(df['点击量'], errors='coerce').astype('float64')
+            df['结算花费'] = (clicks * rates).where(clicks != 0)
+        else:
+            df['结算花费'] = np.nan
 
     if '花费' in df.columns:
-        if '注册人数' in df.columns:
-            df['注册成本'] = df.apply(
-                lambda row: safe_div(row.get('花费'), row.get('注册人数')),
-                axis=1
-            )
-        if '进件人数' in df.columns:
-            df['进件成本'] = df.apply(
-                lambda row: safe_div(row.get('花费'), row.get('进件人数')),
-                axis=1
-            )
-        if '授信成功人数' in df.columns:
-            df['授信成本'] = df.apply(
-                lambda row: safe_div(row.get('花费'), row.get('授信成功人数')),
-                axis=1
-            )
-        if '支用成功人数' in df.columns:
-            df['支用成本'] = df.apply(
-                lambda row: safe_div(row.get('花费'), row.get('支用成功人数')),
-                axis=1
-            )
-        if '下载量' in df.columns:
-            df['下载成本'] = df.apply(
-                lambda row: safe_div(row.get('花费'), row.get('下载量')),
-                axis=1
-            )
+        for metric, numerator_col, denominator_col in COST_METRICS:
+            if denominator_col in df.columns:
+                df[metric] = safe_divide(df[numerator_col], df[denominator_col])
     
     print("成本指标计算完成")
     return df
 
 
-def process_all_data(kiwi_file_path=None, wabang_file_path=None, backend_file_path=None):
+def encode_dimension_columns(df):
+    """
+    将维度列转换为分类类型
+    时间转换为按日期排序的有序分类，便于范围筛选
+
+    Args:
+        df: 数据DataFrame
+
+    Returns:
+        转换后的DataFrame
+    """
+    for col in DIMENSION_COLUMNS:
+        if col not in df.columns:
+            continue
+        dtype = df[col].dtype
+        if col == '时间' and isinstance(dtype, pd.CategoricalDtype) and not dtype.ordered:
+            # 清洗时已编码为分类的日期：去掉未使用的取值后按日期排序
+            dates = df[col].cat.remove_unused_categories()
+            df[col] = dates.cat.reorder_categories(sorted(dates.cat.categories), ordered=True)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            continue
+        elif col == '时间':
+            dates = sorted(df[col].dropna().unique())
+            df[col] = pd.Categorical(df[col], categories=dates, ordered=True)
+        else:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def concat_with_categories(frames):
+    """
+    拼接多个DataFrame，分类列先统一类别再拼接，结果仍为分类类型
+    （pd.concat 遇到类别不同的分类列会退化为object）
+    合并后的类别排序，与 astype('category') 的结果一致；时间列为有序分类
+    """
+    frames = [frame for frame in frames if frame is not None]
+    categorical_cols = []
+    for frame in frames:
+        for col in frame.columns:
+            if isinstance(frame[col].dtype, pd.CategoricalDtype) and col not in categorical_cols:
+                categorical_cols.append(col)
+
+    aligned = [frame.copy(deep=False) for frame in frames]
+    for col in categorical_cols:
+        categories = pd.Index([])
+        for frame in frames:
+            if col in frame.columns:
+                values = frame[col]
+                values = values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else values.dropna().unique()
+                categories = categories.append(pd.Index(values)).unique()
+        try:
+            categories = categories.sort_values()
+        except TypeError:
+            pass  # 混合类型的取值无法排序时保持原有顺序
+        dtype = pd.CategoricalDtype(categories, ordered=col == '时间')
+        for frame in aligned:
+            if col not in frame.columns:
+                continue
+            current = frame[col].dtype
+            # 类别相同（含顺序）时无需重新编码
+            if not (isinstance(current, pd.CategoricalDtype) and current.ordered == dtype.ordered
+                    and current.categories.equals(categories)):
+                frame[col] = frame[col].astype(dtype)
+    return pd.concat(aligned, ignore_index=True)
+
+
+def upsert_dataset(existing_df, new_df, key_columns=None):
+    """
+    将新上传的数据更新到已有数据集
+
+    已有数据中与新数据键（计划id, 时间）相同的行被替换，其余新行追加到末尾。
+    只在新数据涉及的日期内查找重复键，已有数据不会被修改。
+
+    Args:
+        existing_df: 已有的合并数据
+        new_df: 新上传数据经 process_all_data 处理后的结果
+        key_columns: 行键，默认 DATASET_KEY_COLUMNS
+
+    Returns:
+        (更新后的DataFrame, 受影响的日期列表)
+    """
+    keys = key_columns or DATASET_KEY_COLUMNS
+    affected_dates = sorted(new_df['时间'].dropna().unique())
+
+    in_dates = existing_df['时间'].isin(affected_dates).to_numpy()
+    replaced = np.zeros(len(existing_df), dtype=bool)
+    if in_dates.any():
+        new_keys = pd.MultiIndex.from_frame(new_df[keys].astype(object))
+        candidate_keys = pd.MultiIndex.from_frame(existing_df.loc[in_dates, keys].astype(object))
+        replaced[in_dates] = candidate_keys.isin(new_keys)
+
+    print(f"追加数据：新数据 {len(new_df)} 行，覆盖 {len(affected_dates)} 天，替换已有数据 {int(replaced.sum())} 行")
+    kept = existing_df[~replaced] if replaced.any() else existing_df
+    return concat_with_categories([kept, new_df]), affected_dates
+
+
+def finish_merged_data(merged_df):
+    """合并后的处理：计算成本指标，计划名称中缺失的片段（空串、nan、None）统一为空值（与写入Excel再读回的结果一致）"""
+    merged_df = calculate_cost_metrics(merged_df)
+    for col in PLAN_NAME_FIELDS:
+        if col in merged_df.columns:
+            text = merged_df[col].astype(str).str.strip().str.lower()
+            merged_df[col] = merged_df[col].mask(text.isin(['', 'nan', 'none']))
+    return merged_df
+
+
+def iter_processed_chunks(kiwi_file_path=None, wabang_file_path=None, backend_file_path=None,
+                          chunk_rows=DEFAULT_CHUNK_ROWS, engine=None, timings=None, progress=None):
+    """
+    分块处理所有数据（代理商数据超出内存时使用）
+
+    后端数据整体读取一次并建立行键索引；代理商数据按 chunk_rows 行分块读取，
+    每块依次清洗、拆分计划名称、匹配后端数据、计算成本指标后产出，
+    内存占用只与块大小（及后端数据）有关，与代理商文件大小无关
+
+    Args:
+        kiwi_file_path: 奇异果文件路径
+        wabang_file_path: 哇棒文件路径
+        backend_file_path: 后端文件路径
+        chunk_rows: 每块的行数
+        engine: Excel解析引擎，见 excel_reader.iter_sheet_chunks
+        timings: 传入字典时写入各文件及各步骤的累计耗时（秒）
+        progress: 进度回调，同 process_all_data
+
+    Yields:
+        处理好的数据块（维度列未转为分类类型，由写入端按全部数据统一编码）
+    """
+    if timings is None:
+        timings = {}
+    if progress is None:
+        progress = _no_progress
+
+    backend_lookup = None
+    if backend_file_path and os.path.exists(backend_file_path):
+        progress('backend', 'running')
+        try:
+            df_back, read_seconds, normalize_seconds = ingest_file('backend', backend_file_path)
+            backend_lookup = KeyLookup(df_back)
+            del df_back
+            if backend_lookup.duplicates:
+                timings['backend_duplicates'] = backend_lookup.duplicates
+            timings['backend'] = {'read': read_seconds, 'normalize': normalize_seconds}
+            progress('backend', 'done', read_seconds + normalize_seconds)
+        except Exception as e:
+            # 与 process_all_data 一致：后端文件失败时仅使用前端数据
+            print(f"读取后端文件失败: {e}")
+            progress('backend', 'failed')
+
+    agent_files = [(source, file_path) for source, file_path in [('kiwi', kiwi_file_path), ('wabang', wabang_file_path)]
+                   if file_path and os.path.exists(file_path)]
+    if not agent_files:
+        print("错误：未找到任何代理商数据文件")
+        return
+
+    merge_seconds = cost_seconds = 0.0
+    total_rows = 0
+    for source, file_path in agent_files:
+        spec = AGENT_SOURCES[source]
+        progress(source, 'running')
+        read_seconds = normalize_seconds = 0.0
+        chunks = iter_sheet_chunks(file_path, spec['sheet_name'], chunk_rows,
+                                   usecols=list(spec['column_map']), engine=engine)
+        while True:
+            step_start = time.perf_counter()
+            chunk = next(chunks, None)
+            read_seconds += time.perf_counter() - step_start
+            if chunk is None:
+                break
+
+            step_start = time.perf_counter()
+            chunk = normalize_agent_data(_standardize_agent_frame(chunk, spec))
+            normalize_seconds += time.perf_counter() - step_start
+
+            progress('merge', 'running')
+            step_start = time.perf_counter()
+            merged_df = merge_data(chunk, None, backend_lookup)
+            merge_seconds += time.perf_counter() - step_start
+
+            step_start = time.perf_counter()
+            merged_df = finish_merged_data(merged_df)
+            cost_seconds += time.perf_counter() - step_start
+
+            total_rows += len(merged_df)
+            print(f"   已处理 {total_rows} 行（当前：{spec['name']}文件）")
+            yield merged_df
+        timings[source] = {'read': read_seconds, 'normalize': normalize_seconds}
+        progress(source, 'done', read_seconds + normalize_seconds)
+
+    timings['merge'] = merge_seconds
+    timings['cost_metrics'] = cost_seconds
+    progress('merge', 'done', merge_seconds)
+    progress('cost_metrics', 'done', cost_seconds)
+
+
+def process_all_data(kiwi_file_path=None, wabang_file_path=None, backend_file_path=None,
+                     max_workers=None, timings=None, progress=None):
     """
     处理所有数据的入口函数
     
@@ -329,30 +903,55 @@ def process_all_data(kiwi_file_path=None, wabang_file_path=None, backend_file_pa
         kiwi_file_path: 奇异果文件路径
         wabang_file_path: 哇棒文件路径
         backend_file_path: 后端文件路径
+        max_workers: 并行读取文件的最大进程数，1表示顺序读取
+        timings: 传入字典时写入各文件及各步骤的耗时（秒）；后端数据有重复键时另写入
+                 backend_duplicates（见 report_duplicate_keys）
+        progress: 进度回调 progress(阶段, status, seconds=None)，
+                  阶段为 kiwi / wabang / backend / merge / cost_metrics
         
     Returns:
         处理后的完整数据DataFrame，如果失败返回None
     """
     try:
-        # 处理前端数据
-        df_front = process_agent_data(kiwi_file_path, wabang_file_path)
+        if timings is None:
+            timings = {}
+        if progress is None:
+            progress = _no_progress
+        start = time.perf_counter()
+
+        # 并行读取并清洗前端、后端数据
+        print("正在读取数据文件...")
+        df_front, df_back = ingest_all_files(kiwi_file_path, wabang_file_path, backend_file_path,
+                                             max_workers=max_workers, timings=timings,
+                                             progress=progress)
         if df_front is None:
             return None
-        
-        # 处理后端数据
-        df_back = process_backend_data(backend_file_path)
+        timings['ingest'] = time.perf_counter() - start
         
         # 合并数据
-        merged_df = merge_data(df_front, df_back)
+        progress('merge', 'running')
+        step_start = time.perf_counter()
+        backend_lookup = KeyLookup(df_back) if df_back is not None else None
+        if backend_lookup is not None and backend_lookup.duplicates:
+            timings['backend_duplicates'] = backend_lookup.duplicates
+        merged_df = merge_data(df_front, None, backend_lookup)
+        timings['merge'] = time.perf_counter() - step_start
+        progress('merge', 'done', timings['merge'])
         
         # 计算成本指标
-        merged_df = calculate_cost_metrics(merged_df)
-        
+        progress('cost_metrics', 'running')
+        step_start = time.perf_counter()
+        merged_df = finish_merged_data(merged_df)
+
+        # 维度列转为分类类型
+        merged_df = encode_dimension_columns(merged_df)
+        timings['cost_metrics'] = time.perf_counter() - step_start
+        progress('cost_metrics', 'done', timings['cost_metrics'])
+
+        print(f"数据处理总耗时 {time.perf_counter() - start:.2f} 秒（读取 {timings['ingest']:.2f} 秒）")
         return merged_df
     except Exception as e:
         print(f"数据处理过程中发生错误: {e}")
         import traceback
         traceback.print_exc()
         return None
-
-
@@ -0,0 +1,511 @@
+"""
+数据集缓存模块
+在进程内缓存已解析的合并数据，避免每次接口请求都重新解析缓存文件；
+数据集按日期分区存储，按日期范围查询时只读取涉及的分区
+"""
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from data_processor import concat_with_categories, TEXT_COLUMNS
+
+# 缓存文件扩展名（Arrow IPC / Feather V2 列式格式）
+CACHE_FILE_EXT = '.feather'
+
+# 分区数据集目录中的清单文件
+MANIFEST_FILE = 'manifest.json'
+
+# 分区粒度：日期字符串（YYYY-MM-DD）取前几位作为分区键
+PARTITION_GRANULARITY = {'day': 10, 'month': 7}
+
+# 日期为空的行单独放在这个分区中
+NULL_PARTITION = 'null'
+
+# 分块写入时暂存数据块的子目录
+SPILL_DIR = '.chunks'
+
+
+def _prepare_for_arrow(df):
+    """
+    Arrow 要求每列类型一致：混合类型的object列（如同时含数字和文本）统一转为字符串，空值保持不变
+    """
+    df = df.reset_index(drop=True)
+    mixed_cols = []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            mixed_cols.append(col)
+    if mixed_cols:
+        df = df.copy()
+        for col in mixed_cols:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def write_dataset(df, path):
+    """
+    将数据集写入列式缓存文件
+    不压缩，读取时可以直接内存映射
+    """
+    feather.write_feather(_prepare_for_arrow(df), path, compression='uncompressed')
+
+
+def read_dataset_columns(path):
+    """读取缓存文件中的列名（只读文件头）"""
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def read_dataset(path, columns=None, shared=False):
+    """
+    以内存映射方式读取列式缓存文件
+
+    Args:
+        path: 缓存文件路径
+        columns: 只读取这些列（不存在的列自动忽略），为None时读取全部列
+        shared: 为True时尽量零拷贝：无空值的数值列不合并成块，直接引用内存映射的文件，
+            多个进程读取同一文件时共用操作系统页缓存（文件在映射期间不能在 Windows 下删除）；
+            各列类型与默认读取方式相同（字符串列仍为object，字典编码列为分类类型）
+
+    Returns:
+        DataFrame
+    """
+    if columns is not None:
+        available = set(read_dataset_columns(path))
+        columns = [col for col in columns if col in available]
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    if shared:
+        return table.to_pandas(split_blocks=True)
+    return table.to_pandas()
+
+
+def estimate_nbytes(obj):
+    """
+    估算缓存对象占用的内存字节数
+    DataFrame包含object列中的字符串；其他对象（如筛选索引）使用其 nbytes 属性
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    return int(getattr(obj, 'nbytes', 0))
+
+
+class DatasetStore:
+    """
+    进程级数据集缓存
+
+    以缓存文件路径为键保存DataFrame（以及由其派生的对象，如筛选索引），
+    总内存超过上限时按最近最少使用（LRU）淘汰。
+    缓存中的对象由所有请求共享，调用方不得原地修改。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (obj, nbytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+
+    def put(self, key, obj):
+        """放入数据集，已存在时替换"""
+        nbytes = estimate_nbytes(obj)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (obj, nbytes)
+            self._total_bytes += nbytes
+            self._evict(keep=key)
+        return obj
+
+    def get(self, key, loader=None):
+        """
+        获取数据集
+
+        Args:
+            key: 数据集键（缓存文件路径）
+            loader: 未命中时调用 loader(key) 加载数据，为None时直接返回None
+
+        Returns:
+            缓存的对象，未命中且无法加载时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+            if loader is None:
+                return None
+            loading_lock = self._loading_locks.setdefault(key, threading.Lock())
+
+        # 同一数据集只加载一次，其他请求等待加载结果
+        with loading_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+            obj = loader(key)
+            if obj is not None:
+                self.put(key, obj)
+        with self._lock:
+            self._loading_locks.pop(key, None)
+        return obj
+
+    def invalidate(self, key):
+        """移除指定数据集"""
+        if not key:
+            return
+        with self._lock:
+            self._pop(key)
+
+    def invalidate_prefix(self, prefix):
+        """移除键以 prefix 开头的全部对象（如数据集的所有分区及其筛选索引）"""
+        if not prefix:
+            return
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, str) and k.startswith(prefix)]:
+                self._pop(key)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def _evict(self, keep=None):
+        # 至少保留刚放入的数据集，即使它本身超过上限
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                self._entries.move_to_end(oldest)
+                oldest = next(iter(self._entries))
+            print(f"数据集缓存超出上限，淘汰: {oldest}")
+            self._pop(oldest)
+
+
+def split_partitions(df, column='时间', granularity='month'):
+    """
+    按日期列把数据集拆分为分区
+
+    Args:
+        df: 数据DataFrame，日期列为 YYYY-MM-DD 字符串（可以是分类类型）
+        column: 分区日期列
+        granularity: 'day' 或 'month'
+
+    Returns:
+        OrderedDict {分区键: DataFrame}，按分区键排序，日期为空的分区排在最后
+    """
+    width = PARTITION_GRANULARITY[granularity]
+    dates = df[column]
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        # 在类别上计算分区键，再按编码映射到每一行
+        category_keys = np.append(np.asarray(dates.cat.categories.astype(str).str[:width], dtype=object),
+                                  NULL_PARTITION)
+        keys = category_keys[dates.cat.codes.to_numpy()]
+    else:
+        keys = np.asarray(dates.astype(str).str[:width].where(dates.notna(), NULL_PARTITION), dtype=object)
+
+    partitions = OrderedDict()
+    unique_keys = sorted(set(keys) - {NULL_PARTITION}) + ([NULL_PARTITION] if NULL_PARTITION in keys else [])
+    for key in unique_keys:
+        partitions[key] = df.iloc[np.flatnonzero(keys == key)].reset_index(drop=True)
+    return partitions
+
+
+def _partition_entry(key, file_name, df, column):
+    dates = df[column].dropna()
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        dates = dates.astype(str)
+    return {
+        'key': key,
+        'file': file_name,
+        'rows': len(df),
+        'min': None if key == NULL_PARTITION or dates.empty else str(dates.min()),
+        'max': None if key == NULL_PARTITION or dates.empty else str(dates.max()),
+    }
+
+
+def write_partitioned_dataset(partitions, path, column='时间', granularity='month', linked=None, linked_from=None):
+    """
+    写入分区数据集：每个分区一个列式文件，另写一份清单（manifest.json）
+
+    Args:
+        partitions: split_partitions 的结果，需要写入的分区
+        path: 数据集目录
+        column: 分区日期列
+        granularity: 分区粒度
+        linked: 直接沿用的分区 {分区键: 清单条目}（追加上传时未变化的分区）
+        linked_from: linked 分区所在的原数据集目录，文件以硬链接方式复用
+
+    Returns:
+        清单字典
+    """
+    os.makedirs(path, exist_ok=True)
+    entries = {}
+    columns = None
+    for key, df in partitions.items():
+        file_name = f'part-{key}{CACHE_FILE_EXT}'
+        write_dataset(df, os.path.join(path, file_name))
+        entries[key] = _partition_entry(key, file_name, df, column)
+        columns = columns or [str(col) for col in df.columns]
+
+    for key, entry in (linked or {}).items():
+        src = os.path.join(linked_from, entry['file'])
+        dst = os.path.join(path, entry['file'])
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+        entries[key] = dict(entry)
+
+    if columns is None and linked:
+        columns = read_dataset_columns(os.path.join(path, next(iter(entries.values()))['file']))
+    return _write_manifest(path, entries, column, granularity, columns or [])
+
+
+def _write_manifest(path, entries, column, granularity, columns):
+    """按分区键排序写入清单（日期为空的分区排在最后）"""
+    keys = sorted(k for k in entries if k != NULL_PARTITION) + ([NULL_PARTITION] if NULL_PARTITION in entries else [])
+    manifest = {
+        'column': column,
+        'granularity': granularity,
+        'columns': columns,
+        'rows': sum(entries[key]['rows'] for key in keys),
+        'partitions': [entries[key] for key in keys],
+    }
+    # 清单最后写入，并通过重命名保证完整
+    tmp_file = os.path.join(path, MANIFEST_FILE + '.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_file, os.path.join(path, MANIFEST_FILE))
+    return manifest
+
+
+class ChunkedDatasetWriter:
+    """
+    分块写入分区数据集，内存占用与单个数据块相当，与数据集大小无关
+
+    write() 把每个数据块按分区拆分后暂存为小文件，并记录分类列的取值；
+    close() 按全部数据的取值统一各分区的分类编码（与整体处理时一致），
+    再逐个暂存文件追加写入各分区文件，最后写清单并删除暂存文件
+    """
+
+    def __init__(self, path, column='时间', granularity='month', categorical_columns=(), ordered_columns=()):
+        self.path = path
+        self.column = column
+        self.granularity = granularity
+        self.categorical_columns = list(categorical_columns)
+        self.ordered_columns = set(ordered_columns)
+        self.rows = 0
+        self._spill_dir = os.path.join(path, SPILL_DIR)
+        self._pieces = {}  # 分区键 -> [暂存文件路径, ...]
+        self._columns = None
+        self._dtypes = {}  # 列名 -> 各块中出现过的类型
+        self._categories = {col: set() for col in self.categorical_columns}
+        os.makedirs(self._spill_dir, exist_ok=True)
+
+    def write(self, df):
+        """
+        暂存一个数据块
+
+        Returns:
+            split_partitions 的结果（调用方可据此构建各分区的预聚合数据）
+        """
+        if self._columns is None:
+            self._columns = list(df.columns)
+        for col in df.columns:
+            if col in self._categories:
+                self._categories[col].update(df[col].dropna().unique())
+            else:
+                self._dtypes.setdefault(col, set()).add(df[col].dtype)
+
+        partitions = split_partitions(df, column=self.column, granularity=self.granularity)
+        for key, part in partitions.items():
+            pieces = self._pieces.setdefault(key, [])
+            piece = os.path.join(self._spill_dir, f'{key}-{len(pieces):05d}{CACHE_FILE_EXT}')
+            write_dataset(part, piece)
+            pieces.append(piece)
+        self.rows += len(df)
+        return partitions
+
+    def dtypes(self):
+        """
+        各列的最终类型：分类列按全部取值排序编码；各块类型不一致的数值列为 float64，其他为 object
+        """
+        dtypes = {}
+        for col in self._columns or []:
+            if col in self._categories:
+                categories = list(self._categories[col])
+                try:
+                    categories.sort()
+                except TypeError:
+                    pass  # 混合类型的取值无法排序时保持原有顺序
+                dtypes[col] = pd.CategoricalDtype(categories, ordered=col in self.ordered_columns)
+                continue
+            seen = list(self._dtypes[col])
+            if len(seen) == 1:
+                dtypes[col] = seen[0]
+            elif all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) for dtype in seen):
+                dtypes[col] = np.dtype('float64')
+            else:
+                dtypes[col] = np.dtype(object)
+        return dtypes
+
+    def _to_table(self, df, dtypes, schema=None):
+        df = df.reindex(columns=self._columns).astype(dtypes)
+        for col, dtype in dtypes.items():
+            # 各块推断的类型可能不同（如整块为空），文本列统一为字符串
+            if dtype == object:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        if schema is None:
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            for i, field in enumerate(schema):
+                if pa.types.is_null(field.type):
+                    schema = schema.set(i, pa.field(field.name, pa.string()))
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+    def close(self):
+        """
+        写入各分区文件和清单
+
+        Returns:
+            清单字典，同 write_partitioned_dataset
+        """
+        dtypes = self.dtypes()
+        schema = None
+        entries = {}
+        for key, pieces in self._pieces.items():
+            file_name = f'part-{key}{CACHE_FILE_EXT}'
+            entry = {'key': key, 'file': file_name, 'rows': 0, 'min': None, 'max': None}
+            writer = None
+            try:
+                for piece in pieces:
+                    df = read_dataset(piece)
+                    table = self._to_table(df, dtypes, schema)
+                    if writer is None:
+                        schema = table.schema
+                        writer = pa.ipc.new_file(os.path.join(self.path, file_name), schema)
+                    writer.write_table(table)
+                    piece_entry = _partition_entry(key, file_name, df, self.column)
+                    entry['rows'] += piece_entry['rows']
+                    if piece_entry['min'] is not None:
+                        entry['min'] = min(filter(None, [entry['min'], piece_entry['min']]))
+                        entry['max'] = max(filter(None, [entry['max'], piece_entry['max']]))
+                    os.remove(piece)
+            finally:
+                if writer is not None:
+                    writer.close()
+            entries[key] = entry
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+        return _write_manifest(self.path, entries, self.column, self.granularity,
+                               [str(col) for col in self._columns or []])
+
+    def abort(self):
+        """放弃写入，删除已写的文件"""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def read_dataset_head(path, rows):
+    """只读取缓存文件的前几行（内存映射后切片，不加载整个文件）"""
+    table = feather.read_table(path, memory_map=True)
+    return table.slice(0, rows).to_pandas()
+
+
+def is_partitioned(path):
+    return os.path.isdir(path)
+
+
+def read_manifest(path):
+    """
+    读取数据集清单
+    单个缓存文件（未分区的旧数据集）视为只有一个分区，任何日期范围都需要读取
+    """
+    if not is_partitioned(path):
+        return {
+            'column': None,
+            'granularity': None,
+            'columns': read_dataset_columns(path),
+            'partitions': [{'key': 'all', 'file': os.path.basename(path), 'min': None, 'max': None}],
+        }
+    with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def select_partitions(manifest, date_from=None, date_to=None):
+    """
+    分区裁剪：返回与日期范围 [date_from, date_to] 有交集的分区清单条目
+    有日期条件时日期为空的分区不会命中
+    """
+    if manifest['column'] is None or not (date_from or date_to):
+        return list(manifest['partitions'])
+    selected = []
+    for entry in manifest['partitions']:
+        if entry['min'] is None:
+            continue
+        if date_from and entry['max'] < date_from:
+            continue
+        if date_to and entry['min'] > date_to:
+            continue
+        selected.append(entry)
+    return selected
+
+
+def empty_dataset_frame(columns):
+    """
+    没有任何分区的空数据集（合并结果为空时旧版本写入的清单）对应的空表：
+    文本列为object，其余列为float64，统计接口可以照常汇总
+    """
+    return pd.DataFrame({
+        col: pd.Series(dtype=object if col in TEXT_COLUMNS else 'float64') for col in columns
+    })
+
+
+def partition_file(path, entry):
+    """分区文件路径"""
+    return os.path.join(path, entry['file']) if is_partitioned(path) else path
+
+
+def read_partitioned_dataset(path, columns=None, date_from=None, date_to=None):
+    """
+    读取数据集（分区目录或单个缓存文件），只读取与日期范围有交集的分区
+
+    Returns:
+        DataFrame，分区按日期顺序拼接
+    """
+    manifest = read_manifest(path)
+    entries = select_partitions(manifest, date_from, date_to)
+    if not entries:
+        if not manifest['partitions']:
+            columns = manifest['columns'] if columns is None else [col for col in columns if col in manifest['columns']]
+            return empty_dataset_frame(columns)
+        # 没有命中的分区：返回列与类型都和数据集一致的空表
+        return read_dataset(partition_file(path, manifest['partitions'][0]), columns=columns).head(0)
+    frames = [read_dataset(partition_file(path, entry), columns=columns) for entry in entries]
+    return frames[0] if len(frames) == 1 else concat_with_categories(frames)
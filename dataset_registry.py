@@ -0,0 +1,333 @@
+"""
+数据集登记模块
+按上传文件内容哈希登记处理好的数据集：相同文件不重复处理，多个会话共用同一数据集，
+可以列出和重新打开历史数据集；缓存目录和上传目录超出磁盘配额时按最近使用时间清理
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只以单进程运行，不需要跨进程文件锁
+    fcntl = None
+
+REGISTRY_FILE = 'datasets.json'
+
+# 多个工作进程修改登记文件时使用的锁文件
+LOCK_FILE = 'datasets.json.lock'
+
+# 缓存目录中数据集文件的前缀，未登记且超过宽限时间的视为遗留文件
+CACHE_PREFIX = 'merged_data_'
+
+# 未登记文件的宽限时间（秒），避免清理正在写入的数据集
+ORPHAN_GRACE_SECONDS = 3600
+
+# 访问时间的写盘间隔（秒），避免每个请求都写登记文件
+TOUCH_INTERVAL = 60
+
+
+def content_hash(files, base_hash=None):
+    """
+    上传文件的内容哈希
+
+    Args:
+        files: [(文件角色, 文件路径或None), ...]，如 [('kiwi', path), ('wabang', None), ('backend', path)]
+        base_hash: 追加模式下原数据集的哈希（相同文件追加到不同数据集结果不同）
+
+    Returns:
+        sha256 十六进制字符串
+    """
+    digest = hashlib.sha256()
+    if base_hash:
+        digest.update(b'append:' + base_hash.encode('ascii') + b'\0')
+    for role, path in files:
+        if not path:
+            continue
+        digest.update(role.encode('utf-8') + b'\0')
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def disk_usage(path):
+    """
+    文件或目录占用的磁盘空间
+    硬链接文件（追加模式沿用的分区）按链接数平摊，避免重复计算
+    """
+    if not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return stat.st_size // max(stat.st_nlink, 1)
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            total += stat.st_size // max(stat.st_nlink, 1)
+    return total
+
+
+def remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def clean_upload_folder(folder, max_bytes, max_age, keep=()):
+    """
+    清理上传目录：删除超过 max_age 秒的文件，仍超出 max_bytes 时从最旧的文件开始删除
+
+    Args:
+        keep: 不能删除的文件（正在处理的上传）
+
+    Returns:
+        删除的文件数
+    """
+    keep = {os.path.abspath(path) for path in keep if path}
+    files = []
+    for name in os.listdir(folder):
+        path = os.path.abspath(os.path.join(folder, name))
+        if os.path.isfile(path) and path not in keep:
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    now = time.time()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+class DatasetRegistry:
+    """
+    数据集登记表，保存在缓存目录的 datasets.json 中，服务重启后仍然有效
+
+    每个数据集：id（内容哈希前16位）、hash、paths（数据集及立方体文件名）、
+    files（上传文件名）、mode（full / append）、base_id、row_count、created_at、last_access
+
+    多个工作进程共用同一登记文件：每次访问前检查文件是否被其他进程修改过，修改登记时加文件锁，
+    重新读取后再写入。正在处理的上传只记录在本进程中。
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, REGISTRY_FILE)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._datasets = {}
+        self._refresh()
+        self._pending = {}  # 内容哈希 -> {'job_id', 'files'}，正在处理的上传
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                datasets = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # 缓存文件已不存在的登记直接丢弃
+        return {
+            dataset_id: entry for dataset_id, entry in datasets.items()
+            if os.path.exists(os.path.join(self.folder, entry['paths'][0]))
+        }
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        """登记文件被其他进程替换过时重新读取（调用方持有 _lock）"""
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            self._datasets = self._load()
+            self._stamp = stamp
+
+    @contextmanager
+    def _modify(self):
+        """修改登记：持有线程锁和文件锁，先读取其他进程的修改"""
+        with self._lock:
+            if fcntl is None:
+                self._refresh()
+                yield
+                return
+            with open(os.path.join(self.folder, LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._datasets, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._stamp = self._file_stamp()
+
+    def _public(self, entry):
+        info = {k: v for k, v in entry.items() if k != 'paths'}
+        info['cache_file'] = os.path.join(self.folder, entry['paths'][0])
+        return info
+
+    def get(self, dataset_id):
+        """按ID获取数据集信息（含 cache_file 绝对路径），不存在时返回None"""
+        with self._lock:
+            self._refresh()
+            entry = self._datasets.get(dataset_id) if dataset_id else None
+            if entry is None or not os.path.exists(os.path.join(self.folder, entry['paths'][0])):
+                return None
+            return self._public(entry)
+
+    def find(self, digest):
+        """按内容哈希查找已处理的数据集"""
+        return self.get(digest[:16])
+
+    def touch(self, dataset_id):
+        """记录访问时间（用于按最近使用清理）"""
+        with self._lock:
+            self._refresh()
+            entry = self._datasets.get(dataset_id)
+            if entry is None or time.time() - entry['last_access'] < TOUCH_INTERVAL:
+                return
+        with self._modify():
+            entry = self._datasets.get(dataset_id)
+            if entry is not None:
+                entry['last_access'] = time.time()
+                self._save()
+
+    def register(self, digest, paths, **info):
+        """
+        登记处理好的数据集
+
+        Args:
+            digest: 内容哈希
+            paths: 数据集相关的文件或目录（第一个为数据集本身），均位于缓存目录中
+
+        Returns:
+            数据集信息；同一内容已登记过时（并发处理了相同文件）删除新文件，返回已有的数据集
+        """
+        dataset_id = digest[:16]
+        names = [os.path.relpath(path, self.folder) for path in paths]
+        with self._modify():
+            existing = self._datasets.get(dataset_id)
+            if existing is not None and os.path.exists(os.path.join(self.folder, existing['paths'][0])):
+                for path in paths:
+                    remove_path(path)
+                return self._public(existing)
+            now = time.time()
+            self._datasets[dataset_id] = {
+                'id': dataset_id,
+                'hash': digest,
+                'paths': names,
+                'created_at': now,
+                'last_access': now,
+                **info,
+            }
+            self._save()
+            return self._public(self._datasets[dataset_id])
+
+    def list(self):
+        """全部数据集，最近使用的在前"""
+        with self._lock:
+            self._refresh()
+            entries = sorted(self._datasets.values(), key=lambda e: e['last_access'], reverse=True)
+            result = []
+            for entry in entries:
+                info = self._public(entry)
+                info['size_bytes'] = sum(disk_usage(os.path.join(self.folder, name)) for name in entry['paths'])
+                del info['cache_file']
+                result.append(info)
+            return result
+
+    def begin(self, digest, job_id, files):
+        """记录正在处理的上传，相同文件再次上传时可直接等待该任务"""
+        with self._lock:
+            self._pending[digest] = {'job_id': job_id, 'files': [path for path in files if path]}
+
+    def end(self, digest):
+        with self._lock:
+            self._pending.pop(digest, None)
+
+    def pending_job(self, digest):
+        """正在处理相同文件的任务ID"""
+        with self._lock:
+            pending = self._pending.get(digest)
+            return pending['job_id'] if pending else None
+
+    def pending_files(self):
+        """正在处理的上传文件（清理上传目录时保留）"""
+        with self._lock:
+            return [path for pending in self._pending.values() for path in pending['files']]
+
+    def enforce_quota(self, max_bytes, keep=()):
+        """
+        缓存目录超出配额时，按最近使用时间从旧到新删除数据集
+
+        Args:
+            keep: 不删除的数据集ID（如刚处理完的数据集）
+
+        Returns:
+            被删除数据集的 cache_file 列表（调用方据此清除内存缓存）
+        """
+        removed = []
+        with self._modify():
+            sizes = {
+                dataset_id: sum(disk_usage(os.path.join(self.folder, name)) for name in entry['paths'])
+                for dataset_id, entry in self._datasets.items()
+            }
+            total = sum(sizes.values())
+            for entry in sorted(self._datasets.values(), key=lambda e: e['last_access']):
+                if total <= max_bytes:
+                    break
+                if entry['id'] in keep:
+                    continue
+                for name in entry['paths']:
+                    remove_path(os.path.join(self.folder, name))
+                total -= sizes[entry['id']]
+                removed.append(os.path.join(self.folder, entry['paths'][0]))
+                del self._datasets[entry['id']]
+            if removed:
+                self._save()
+        return removed
+
+    def remove_orphans(self):
+        """
+        删除缓存目录中未登记的数据集文件（登记之前的旧版本或处理失败遗留的文件）
+
+        Returns:
+            删除的文件/目录数
+        """
+        with self._lock:
+            self._refresh()
+            known = {name for entry in self._datasets.values() for name in entry['paths']}
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.folder):
+            if not name.startswith(CACHE_PREFIX) or name in known:
+                continue
+            path = os.path.join(self.folder, name)
+            if now - os.path.getmtime(path) < ORPHAN_GRACE_SECONDS:
+                continue
+            remove_path(path)
+            removed += 1
+        return removed
@@ -0,0 +1,202 @@
+"""
+Excel读取模块
+逐行读取工作表，只保留需要的列，再交给pandas做与 pd.read_excel 相同的类型推断。
+优先使用 python-calamine（Rust实现）解析，未安装时退回 openpyxl 只读流式模式。
+"""
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+try:
+    import python_calamine
+except ImportError:  # 可选依赖
+    python_calamine = None
+
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR
+
+# 可用的解析引擎，按优先级排列
+ENGINES = ('calamine', 'openpyxl')
+
+# 通过环境变量指定解析引擎（calamine / openpyxl），未设置时自动选择
+ENGINE_ENV = 'EXCEL_READER_ENGINE'
+
+
+def available_engines():
+    """返回当前环境可用的解析引擎"""
+    return [engine for engine in ENGINES if engine != 'calamine' or python_calamine is not None]
+
+
+def default_engine():
+    """默认解析引擎：环境变量指定的引擎，否则取第一个可用引擎"""
+    engine = os.environ.get(ENGINE_ENV)
+    if engine:
+        if engine not in available_engines():
+            raise ValueError(f"Excel解析引擎不可用: {engine}（可用: {', '.join(available_engines())}）")
+        return engine
+    return available_engines()[0]
+
+
+def _convert_number(value):
+    # 与 pandas 一致：整数值的浮点数转为int，便于推断为整数列
+    if isinstance(value, float):
+        as_int = int(value) if np.isfinite(value) else None
+        if as_int is not None and as_int == value:
+            return as_int
+    return value
+
+
+def _convert_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        return _convert_number(value)
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+def _calamine_rows(file_path, sheet_name):
+    workbook = python_calamine.CalamineWorkbook.from_path(file_path)
+    try:
+        sheet = workbook.get_sheet_by_name(sheet_name)
+        # iter_rows 从数据区域左上角开始，补齐前面的空行空列，保证表头位置与Excel一致
+        first_row, first_col = sheet.start or (0, 0)
+        for _ in range(first_row):
+            yield []
+        padding = [''] * first_col
+        for row in sheet.iter_rows():
+            yield padding + row
+    finally:
+        workbook.close()
+
+
+def _openpyxl_rows(file_path, sheet_name):
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook[sheet_name]
+        sheet.reset_dimensions()
+        # 与 pandas 一致：只有错误类型的单元格（如公式结果 #DIV/0!）转为空值，
+        # 内容恰好是 "#REF!" 等的文本单元格保持原样（calamine 读取时错误单元格已是空串）
+        for row in sheet.iter_rows():
+            yield [np.nan if cell.data_type == TYPE_ERROR else cell.value for cell in row]
+    finally:
+        workbook.close()
+
+
+_ROW_READERS = {
+    'calamine': _calamine_rows,
+    'openpyxl': _openpyxl_rows,
+}
+
+
+def _is_empty(row):
+    return all(value is None or value == '' for value in row)
+
+
+def iter_sheet_rows(file_path, sheet_name, usecols=None, engine=None):
+    """
+    逐行读取工作表（第一行为表头），不在内存中保存整个工作表
+
+    Args:
+        file_path: 文件路径
+        sheet_name: 工作表名称
+        usecols: 只保留表头在其中的列，为None时保留全部列
+        engine: 解析引擎，为None时使用 default_engine()
+
+    Yields:
+        行列表，单元格已按 pd.read_excel 的规则转换（空单元格为 ''）
+    """
+    engine = engine or default_engine()
+    rows = _ROW_READERS[engine](file_path, sheet_name)
+
+    header = next(rows, None)
+    if header is None:
+        return
+    header = list(header)
+    while header and (header[-1] is None or header[-1] == ''):
+        header.pop()
+    if usecols is None:
+        positions = list(range(len(header)))
+    else:
+        wanted = set(usecols)
+        positions = [i for i, name in enumerate(header) if name in wanted]
+
+    yield [_convert_cell(header[i]) for i in positions]
+    pending_empty = []
+    for row in rows:
+        width = len(row)
+        values = [_convert_cell(row[i]) if i < width else '' for i in positions]
+        # 与 pd.read_excel 一致：丢弃末尾的空行，中间的空行保留
+        if _is_empty(row):
+            pending_empty.append(values)
+            continue
+        if pending_empty:
+            yield from pending_empty
+            pending_empty = []
+        yield values
+
+
+def read_sheet_rows(file_path, sheet_name, usecols=None, engine=None):
+    """
+    读取工作表为行列表（第一行为表头），参数见 iter_sheet_rows
+
+    Returns:
+        行列表，单元格已按 pd.read_excel 的规则转换（空单元格为 ''）
+    """
+    return list(iter_sheet_rows(file_path, sheet_name, usecols=usecols, engine=engine))
+
+
+def _rows_to_frame(data):
+    if not data or not data[0]:
+        return pd.DataFrame()
+    parser = TextParser(data, header=0, skip_blank_lines=False)
+    return parser.read()
+
+
+def read_sheet(file_path, sheet_name, usecols=None, engine=None):
+    """
+    读取工作表为DataFrame，结果与 pd.read_excel(file_path, sheet_name=sheet_name) 一致
+    （表头为空的列不读取）
+
+    Args:
+        file_path: 文件路径
+        sheet_name: 工作表名称
+        usecols: 只读取表头在其中的列（不存在的列自动忽略），为None时读取全部列
+        engine: 解析引擎（'calamine' 或 'openpyxl'），为None时自动选择
+
+    Returns:
+        DataFrame
+    """
+    return _rows_to_frame(read_sheet_rows(file_path, sheet_name, usecols=usecols, engine=engine))
+
+
+def iter_sheet_chunks(file_path, sheet_name, chunk_rows, usecols=None, engine=None):
+    """
+    分块读取工作表，每块最多 chunk_rows 行，各块分别做类型推断
+    使用 openpyxl 时逐行解析，内存占用只与块大小有关；calamine 会先把整个工作表的单元格读入内存
+
+    Args:
+        chunk_rows: 每块的行数
+        其余参数同 read_sheet
+
+    Yields:
+        DataFrame
+    """
+    rows = iter_sheet_rows(file_path, sheet_name, usecols=usecols, engine=engine)
+    header = next(rows, None)
+    if not header:
+        return
+    data = [header]
+    for row in rows:
+        data.append(row)
+        if len(data) > chunk_rows:
+            yield _rows_to_frame(data)
+            data = [header]
+    if len(data) > 1:
+        yield _rows_to_frame(data)
@@ -0,0 +1,125 @@
+"""
+筛选索引模块
+为维度列的每个取值预先计算位图，筛选时只需做位图与运算，再一次性取出命中的行
+"""
+import numpy as np
+import pandas as pd
+
+
+def _codes_and_categories(series):
+    """
+    返回 (编码数组, 取值列表)，缺失值编码为-1
+    分类类型直接使用其编码；其他类型按排序后的取值编码
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, uniques = pd.factorize(series, sort=True, use_na_sentinel=True)
+    return codes, uniques
+
+
+class FilterIndex:
+    """
+    数据集的筛选索引
+
+    - 维度列：每个取值一个位图（按位压缩，8行占1字节）
+    - 日期列：行号按日期排序，日期范围对应排序数组中的一段连续区间
+
+    索引基于构建时的行位置，数据集变化后需要重建。
+    """
+
+    def __init__(self, df, dimension_columns, date_column='时间'):
+        self.row_count = len(df)
+        self._bitsets = {}  # 列名 -> {取值: 位图}
+        for col in dimension_columns:
+            if col not in df.columns or col == date_column:
+                continue
+            codes, values = _codes_and_categories(df[col])
+            bitsets = {}
+            for i, value in enumerate(values):
+                matched = codes == i
+                if matched.any():
+                    bitsets[value] = np.packbits(matched)
+            self._bitsets[col] = bitsets
+
+        self._date_values = None
+        if date_column in df.columns:
+            codes, values = _codes_and_categories(df[date_column])
+            if not pd.Index(values).is_monotonic_increasing:
+                # 类别未按日期排序时重新编码
+                order = np.argsort(np.asarray(values, dtype=object))
+                rank = np.empty(len(order), dtype=np.int64)
+                rank[order] = np.arange(len(order))
+                codes = np.where(codes >= 0, rank[np.maximum(codes, 0)], -1)
+                values = np.asarray(values, dtype=object)[order]
+            self._date_values = np.asarray(values, dtype=object)
+            self._date_row_order = np.argsort(codes, kind='stable')
+            self._date_codes_sorted = codes[self._date_row_order]
+
+    @property
+    def nbytes(self):
+        total = sum(bits.nbytes for values in self._bitsets.values() for bits in values.values())
+        if self._date_values is not None:
+            total += self._date_row_order.nbytes + self._date_codes_sorted.nbytes
+        return total
+
+    def has_column(self, col):
+        return col in self._bitsets
+
+    def _empty_bits(self):
+        return np.zeros((self.row_count + 7) // 8, dtype=np.uint8)
+
+    def _date_bits(self, date_from, date_to):
+        bits = np.zeros(self.row_count, dtype=bool)
+        lo_code = np.searchsorted(self._date_values, date_from, side='left') if date_from else 0
+        hi_code = np.searchsorted(self._date_values, date_to, side='right') if date_to else len(self._date_values)
+        # 缺失日期编码为-1，排在最前面，不会落在 [lo_code, hi_code) 区间内
+        lo = np.searchsorted(self._date_codes_sorted, lo_code, side='left')
+        hi = np.searchsorted(self._date_codes_sorted, hi_code, side='left')
+        bits[self._date_row_order[lo:hi]] = True
+        return np.packbits(bits)
+
+    def _value_bits(self, col, values):
+        bitsets = self._bitsets[col]
+        bits = self._empty_bits()
+        for value in values:
+            value_bits = bitsets.get(value)
+            if value_bits is not None:
+                bits |= value_bits
+        return bits
+
+    def select_bits(self, date_from=None, date_to=None, dimensions=None):
+        """
+        计算筛选结果位图
+
+        Args:
+            date_from: 开始日期（含）
+            date_to: 结束日期（含）
+            dimensions: {列名: [取值, ...]}，同一列多个取值为“或”，不同列之间为“与”；
+                        取值为空或列不存在时不筛选该列
+
+        Returns:
+            压缩位图（numpy uint8数组），未设置任何条件时返回None
+        """
+        bits = None
+        if (date_from or date_to) and self._date_values is not None:
+            bits = self._date_bits(date_from, date_to)
+        for col, values in (dimensions or {}).items():
+            if not values or col not in self._bitsets:
+                continue
+            col_bits = self._value_bits(col, values)
+            bits = col_bits if bits is None else bits & col_bits
+        return bits
+
+    def positions(self, bits):
+        """位图转行位置数组（升序）"""
+        return np.flatnonzero(np.unpackbits(bits, count=self.row_count))
+
+    def select(self, date_from=None, date_to=None, dimensions=None):
+        """
+        计算命中的行位置
+
+        Returns:
+            行位置数组（升序），未设置任何条件时返回None（表示全部行）
+        """
+        bits = self.select_bits(date_from, date_to, dimensions)
+        return None if bits is None else self.positions(bits)
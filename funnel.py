@@ -0,0 +1,103 @@
+"""
+漏斗比率模块
+通过率、单位成本、人均/笔均等“分子合计 / 分母合计”类指标，按任意分组层级一次性向量化计算
+"""
+import numpy as np
+import pandas as pd
+
+from data_cube import EXEC_RATE_WEIGHTED_COLUMN
+
+# 比率指标：指标名 -> (分子列候选, 分母列候选, 分母为0或缺失时的取值)
+# 列候选取第一个存在的列；通过率无分母时为空（图表断开），成本和均值无分母时为0（与指标卡片一致）
+RATIO_DEFINITIONS = {
+    '准入通过率': (['进件成功人数'], ['进件人数'], None),
+    '授信通过率': (['授信成功人数'], ['授信提交人数', '授信提交人数_后端'], None),
+    '支用通过率': (['支用成功人数'], ['支用申请人数', '支用申请人数_后端'], None),
+    '注册成本': (['花费'], ['注册人数'], 0),
+    '进件成本': (['花费'], ['进件人数'], 0),
+    '授信成本': (['花费'], ['授信成功人数', '授信人数'], 0),
+    '支用成本': (['花费'], ['支用成功人数', '支用人数'], 0),
+    '下载成本': (['花费'], ['下载量'], 0),
+    '人均授信额度': (['授信金额', '授信金额_后端'], ['授信成功人数', '授信人数'], 0),
+    '笔均支用金额': (['支用金额', '支用金额_后端'], ['支用笔数'], 0),
+    '平均执行利率': ([EXEC_RATE_WEIGHTED_COLUMN], ['支用金额', '支用金额_后端'], 0),
+}
+
+PASS_RATES = ['准入通过率', '授信通过率', '支用通过率']
+COST_RATIOS = ['注册成本', '进件成本', '授信成本', '支用成本', '下载成本']
+AVERAGE_RATIOS = ['人均授信额度', '笔均支用金额', '平均执行利率']
+
+
+def _first_column(columns, candidates):
+    for col in candidates:
+        if col in columns:
+            return col
+    return None
+
+
+def resolve_ratios(columns, names):
+    """
+    确定各比率实际使用的分子、分母列
+
+    Returns:
+        [(指标名, 分子列或None, 分母列或None, 空值取值), ...]，缺列的比率全部取空值
+    """
+    resolved = []
+    for name in names:
+        numerators, denominators, fill = RATIO_DEFINITIONS[name]
+        resolved.append((name, _first_column(columns, numerators), _first_column(columns, denominators), fill))
+    return resolved
+
+
+def ratio_source_columns(columns, names):
+    """计算这些比率需要求和的列（去重、保持顺序）"""
+    needed = []
+    for _, numerator, denominator, _ in resolve_ratios(columns, names):
+        for col in (numerator, denominator):
+            if col is not None and col not in needed:
+                needed.append(col)
+    return needed
+
+
+def add_ratios(sums, names):
+    """
+    在已求和的结果上追加比率列
+
+    Args:
+        sums: 每行为一个分组的合计值
+        names: 比率指标名列表
+
+    Returns:
+        追加了比率列的DataFrame（分母为0或缺失时为定义中的取值，None 表示NaN）
+    """
+    sums = sums.copy()
+    for name, numerator, denominator, fill in resolve_ratios(sums.columns, names):
+        fill = np.nan if fill is None else fill
+        if numerator is None or denominator is None:
+            sums[name] = fill
+            continue
+        num = sums[numerator].astype(float)
+        den = sums[denominator].astype(float)
+        valid = den.ne(0) & den.notna() & num.notna()
+        sums[name] = np.where(valid, num / den.where(valid, 1), fill)
+    return sums
+
+
+def funnel_ratios(df, names, by=None):
+    """
+    按分组计算比率：先对分子、分母列分组求和，再整列相除
+
+    Args:
+        df: 明细或立方体
+        names: 比率指标名列表，见 RATIO_DEFINITIONS
+        by: 分组列列表；为空时计算总体（返回单行）
+
+    Returns:
+        DataFrame：分组列 + 分子分母合计列 + 比率列
+    """
+    columns = ratio_source_columns(df.columns, names)
+    if by:
+        sums = df.groupby(by, observed=True)[columns].sum().reset_index()
+    else:
+        sums = df[columns].sum().to_frame().T if columns else pd.DataFrame(index=[0])
+    return add_ratios(sums, names)
@@ -0,0 +1,90 @@
+"""
+JSON序列化模块
+DataFrame直接转换为记录或列式数组，响应一次序列化完成；安装了 orjson 时使用 orjson
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+def _native_values(series):
+    """Series转为Python原生值列表，NaN/NaT/None 统一为 None"""
+    values = series.astype(object)
+    return values.where(series.notna(), None).tolist()
+
+
+def frame_to_records(df):
+    """
+    DataFrame转为记录列表 [{列名: 值}, ...]
+    值为Python原生类型，空值为None，可直接序列化
+    """
+    if df is None or df.empty:
+        return []
+    columns = {str(col): _native_values(df[col]) for col in df.columns}
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def frame_to_columns(df):
+    """
+    DataFrame转为列式数据 {列名: [值, ...]}
+    比记录列表少重复列名，前端图表可直接使用
+    """
+    if df is None or df.empty:
+        return {}
+    return {str(col): _native_values(df[col]) for col in df.columns}
+
+
+def _default(obj):
+    """标准库json不支持的类型"""
+    if isinstance(obj, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return None if pd.isna(obj) else obj.isoformat()
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return None if np.isnan(obj) else float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.Series):
+        return _native_values(obj)
+    if isinstance(obj, pd.DataFrame):
+        return frame_to_records(obj)
+    return DefaultJSONProvider.default(obj)
+
+
+class DataJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON序列化：
+    - 支持numpy标量/数组、pandas时间和空值
+    - 中文不转义、不排序键，减小响应体积
+    - 安装了 orjson 时由 orjson 序列化（NaN输出为null）
+    """
+    ensure_ascii = False
+    sort_keys = False
+    default = staticmethod(_default)
+
+    def dumps_bytes(self, obj):
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self.dumps_bytes(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
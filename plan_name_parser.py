@@ -0,0 +1,136 @@
+"""
+计划名称解析模块
+计划名称按 '-' 拆分出投放维度（代理、资源位、出价方式等），并统一各维度的写法。
+同一计划每天都有一行数据，解析只对去重后的计划名称进行，再按 factorize 编码映射回每一行
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+# 计划名称按 '-' 拆分后的字段（按顺序对应各片段，多余的片段丢弃）
+PLAN_NAME_FIELDS = ['代理', '资源位', '出价方式', '年龄', '定向', '素材样式', '利益点', '时间_split']
+
+# 计划名称的分隔符
+PLAN_NAME_SEPARATOR = '-'
+
+# 统一写法：字段 -> {源写法: 标准写法}
+PLAN_NAME_VALUE_MAPPINGS = {
+    '年龄': {
+        '24～54岁': '24-54岁',
+        '24至54岁': '24-54岁',
+        '24~54岁': '24-54岁',
+    },
+}
+
+# 去空格并转大写的字段（出价方式、定向的大小写写法不统一）
+PLAN_NAME_UPPER_FIELDS = ['出价方式', '定向']
+
+# 解析结果缓存的计划名称数上限，超出时清空重新缓存
+MAX_CACHE_SIZE = 200000
+
+
+def upper_text(values):
+    """
+    去空格并转大写，空串、nan、None 视为空值
+
+    Args:
+        values: pandas Series
+
+    Returns:
+        转换后的Series，空值为None
+    """
+    text = values.astype(str).str.strip()
+    invalid = (text == '') | text.str.lower().isin(['nan', 'none'])
+    return text.str.upper().where(~invalid, None)
+
+
+class PlanNameParser:
+    """
+    计划名称解析器：拆分片段、统一写法，按计划名称缓存解析结果
+
+    Args:
+        fields: 拆分后各片段对应的字段名
+        separator: 分隔符
+        value_mappings: 统一写法，{字段: {源写法: 标准写法}}
+        upper_fields: 去空格并转大写的字段
+        max_cache_size: 缓存的计划名称数上限
+    """
+
+    def __init__(self, fields=None, separator=PLAN_NAME_SEPARATOR, value_mappings=None,
+                 upper_fields=None, max_cache_size=MAX_CACHE_SIZE):
+        self.fields = list(fields if fields is not None else PLAN_NAME_FIELDS)
+        self.separator = separator
+        self.value_mappings = value_mappings if value_mappings is not None else PLAN_NAME_VALUE_MAPPINGS
+        self.upper_fields = list(upper_fields if upper_fields is not None else PLAN_NAME_UPPER_FIELDS)
+        self.max_cache_size = max_cache_size
+        self._cache = {}  # 计划名称 -> 各字段取值的元组
+        self._lock = threading.Lock()  # 多个上传任务在不同线程中共用解析器
+
+    def parse_names(self, names):
+        """
+        解析计划名称（不使用缓存）
+
+        Args:
+            names: 计划名称字符串的Series
+
+        Returns:
+            与 names 同索引、列为 fields 的DataFrame；片段不足的字段为None
+        """
+        count = len(self.fields)
+        parts = names.str.split(self.separator, n=count, expand=True)
+        parts = parts.iloc[:, :count]
+        for i in range(parts.shape[1], count):
+            parts[i] = None
+        parts.columns = self.fields
+
+        for field in self.fields:
+            if field in self.upper_fields:
+                parts[field] = upper_text(parts[field])
+            if field in self.value_mappings:
+                parts[field] = parts[field].replace(self.value_mappings[field])
+        return parts
+
+    def parse(self, series):
+        """
+        解析计划名称列：每个不同的计划名称只解析一次
+
+        Args:
+            series: 计划名称列（非字符串值和空值按 str() 的结果解析）
+
+        Returns:
+            与 series 同索引、列为 fields 的DataFrame
+        """
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        names = pd.Series(uniques, dtype=object).astype(str).tolist()
+        missing_rows = codes < 0
+        if missing_rows.any():
+            # 空值（None 和 nan 转成的字符串不同）单独编码，排在去重值之后
+            missing_codes, missing_names = pd.factorize(series[missing_rows].astype(str))
+            codes[missing_rows] = len(names) + missing_codes
+            names += list(missing_names)
+
+        # 本次用到的解析结果先放在局部字典中，缓存清空（其他线程或超出上限）不影响本次取值
+        unique_names = list(dict.fromkeys(names))
+        with self._lock:
+            parsed = {name: self._cache[name] for name in unique_names if name in self._cache}
+        missing = [name for name in unique_names if name not in parsed]
+        if missing:
+            rows = self.parse_names(pd.Series(missing, dtype=object)).itertuples(index=False, name=None)
+            new = dict(zip(missing, rows))
+            parsed.update(new)
+            with self._lock:
+                if len(self._cache) + len(new) > self.max_cache_size:
+                    self._cache.clear()
+                if len(new) <= self.max_cache_size:
+                    self._cache.update(new)
+
+        table = np.empty((len(names), len(self.fields)), dtype=object)
+        for i, name in enumerate(names):
+            table[i] = parsed[name]
+        # 按行取出整块对象数组，指定 dtype 避免逐列推断类型
+        return pd.DataFrame(table.take(codes, axis=0), index=series.index, columns=self.fields, dtype=object)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
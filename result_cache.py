@@ -0,0 +1,99 @@
+"""
+接口结果缓存模块
+按“数据集 + 规范化后的筛选条件”缓存统计接口的响应内容
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def canonical_filters(filters):
+    """
+    规范化筛选条件，作为缓存键的一部分
+    多选取值去重排序；未选择（含 'all'）的维度不出现在结果中
+
+    Args:
+        filters: {'date_from', 'date_to', 'dimensions': {维度列: [取值, ...]}}
+
+    Returns:
+        可哈希的元组
+    """
+    dimensions = tuple(
+        (col, tuple(sorted(set(values))))
+        for col, values in sorted(filters.get('dimensions', {}).items())
+        if values
+    )
+    return (filters.get('date_from') or '', filters.get('date_to') or '', dimensions)
+
+
+def make_etag(*parts):
+    """根据缓存键（数据集标识、版本、筛选条件等）生成ETag"""
+    raw = json.dumps(parts, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    有上限的LRU结果缓存
+
+    缓存键为 (数据集标识, 其他键...)，换数据集时按数据集标识批量清除。
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    def get(self, key):
+        """获取缓存结果，未命中返回None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """放入缓存结果"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_not_modified(self):
+        """记录一次ETag协商命中（返回304，无需计算和传输结果）"""
+        with self._lock:
+            self.not_modified += 1
+
+    def invalidate_dataset(self, dataset_key):
+        """清除指定数据集的全部缓存结果"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == dataset_key]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """命中统计（用于监控）"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'not_modified': self.not_modified,
+                'hit_rate': self.hits / total if total else 0,
+            }
@@ -0,0 +1,71 @@
+"""
+生产环境启动入口
+使用 gunicorn 启动多个工作进程（每个进程多个线程）处理请求，统计接口的 pandas 计算分散到多个进程，
+不再受单个进程 GIL 的限制；各进程以内存映射方式读取同一份列式缓存文件，数据在页缓存中只保存一份。
+上传任务状态和数据集登记保存在文件中，任意工作进程都能查询
+
+用法：python serve.py [--host 127.0.0.1] [--port 5000] [--workers 4] [--threads 4]
+gunicorn 不支持 Windows，Windows 下使用 app_launcher.py 或 app.py 单进程运行
+"""
+import argparse
+import sys
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+from app import app, cleanup_storage
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='广告数据分析和看板系统（多进程部署）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=5000, help='监听端口')
+    parser.add_argument('--workers', type=int, default=app.config['SERVE_WORKERS'], help='工作进程数')
+    parser.add_argument('--threads', type=int, default=app.config['SERVE_THREADS'], help='每个工作进程的线程数')
+    return parser.parse_args(argv)
+
+
+def server_options(args):
+    """gunicorn 配置"""
+    return {
+        'bind': f'{args.host}:{args.port}',
+        'workers': args.workers,
+        # 多线程工作进程：上传任务在后台线程中处理，不阻塞心跳
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'timeout': app.config['SERVE_TIMEOUT'],
+        # 在主进程中导入应用后再创建工作进程，已导入的模块由各进程共用
+        'preload_app': True,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if BaseApplication is None:
+        print("未安装 gunicorn，无法以多进程方式运行：pip install gunicorn（Windows 请使用 app_launcher.py）")
+        return 1
+
+    class DashboardServer(BaseApplication):
+        def load_config(self):
+            for key, value in server_options(args).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    print("=" * 50)
+    print("广告数据分析和看板系统")
+    print("=" * 50)
+    print(f"访问地址: http://{args.host}:{args.port}")
+    print(f"工作进程: {args.workers} 个，每个进程 {args.threads} 个线程")
+    print("=" * 50)
+    # 清理超出配额的旧数据集和之前运行遗留的文件
+    cleanup_storage()
+    DashboardServer().run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
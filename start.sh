@@ -14,7 +14,7 @@ fi
 
 # 检查依赖是否安装
 echo "检查依赖包..."
-python3 -c "import flask, pandas, openpyxl" 2>/dev/null
+python3 -c "import flask, pandas, openpyxl, pyarrow" 2>/dev/null
 if [ $? -ne 0 ]; then
     echo "正在安装依赖包..."
     pip3 install -r requirements.txt
@@ -22,27 +22,46 @@ document.addEventListener('DOMContentLoaded', function() {
             if (!checkChartJS()) {
                 return;
             }
-            loadFilterOptions();
-            loadStatistics();
+            loadDashboard();
         }, 500);
     } else {
-        loadFilterOptions();
-        loadStatistics();
+        loadDashboard();
     }
 });
 
-// 加载筛选选项
-async function loadFilterOptions() {
+// 首次加载：筛选选项和统计数据通过批量接口一次请求取回
+async function loadDashboard() {
+    const loadingEl = document.getElementById('loading');
+    loadingEl.classList.remove('hidden');
+    
     try {
-        const response = await fetch('/api/options');
+        const response = await fetch('/api/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                filters: getFilterParams(),
+                format: 'columns',
+                panels: {
+                    options: { type: 'options' },
+                    statistics: { type: 'statistics' }
+                }
+            })
+        });
         const result = await response.json();
         
         if (result.success) {
-            filterOptions = result.options;
+            filterOptions = result.panels.options;
             populateFilters();
+            updateMetrics(result.panels.statistics);
+            updateCharts(result.panels.statistics);
+        } else {
+            alert('加载数据失败：' + result.message);
         }
     } catch (error) {
-        console.error('加载筛选选项失败:', error);
+        console.error('加载数据失败:', error);
+        alert('加载数据失败，请重试');
+    } finally {
+        loadingEl.classList.add('hidden');
     }
 }
 
@@ -146,6 +165,8 @@ async function loadStatistics() {
     
     try {
         const params = getFilterParams();
+        // 图表数据以列式格式返回 {列名: [值, ...]}
+        params.format = 'columns';
         const queryString = new URLSearchParams(params).toString();
         const response = await fetch(`/api/statistics?${queryString}`);
         const result = await response.json();
@@ -202,11 +223,9 @@ function updateMetrics(data) {
     let totalDownloads = 0;
     
     if (data.daily_stats) {
-        data.daily_stats.forEach(day => {
-            totalImpressions += day.曝光量 || 0;
-            totalClicks += day.点击量 || 0;
-            totalDownloads += day.下载量 || 0;
-        });
+        totalImpressions = sumColumn(data.daily_stats, '曝光量');
+        totalClicks = sumColumn(data.daily_stats, '点击量');
+        totalDownloads = sumColumn(data.daily_stats, '下载量');
     }
     
     document.getElementById('total_impressions').innerHTML = formatNumber(totalImpressions);
@@ -239,27 +258,31 @@ function updateCharts(data) {
     if (!checkChartJS()) {
         return;
     }
-    updateDailySpendChart(data.daily_stats || []);
-    updateDailyTrafficChart(data.daily_stats || []);
-    updateAgentSpendChart(data.agent_stats || [], data.agent_bidding_mix || []);
-    updateBiddingMethodChart(data.bidding_stats || []);
-    updateTargetingSpendChart(data.targeting_spend || []);
-    updateResourceSpendChart(data.resource_spend || []);
-    updateRateTrendChart(data.rate_trend || []);
+    updateDailySpendChart(data.daily_stats || {});
+    updateDailyTrafficChart(data.daily_stats || {});
+    updateAgentSpendChart(data.agent_stats || {}, data.agent_bidding_mix || {});
+    updateBiddingMethodChart(data.bidding_stats || {});
+    updateTargetingSpendChart(data.targeting_spend || {});
+    updateResourceSpendChart(data.resource_spend || {});
+    updateRateTrendChart(data.rate_trend || {});
+}
+
+// 取列式数据中的一列，缺失时返回空数组
+function column(table, name) {
+    return (table && table[name]) || [];
+}
+
+function sumColumn(table, name) {
+    return column(table, name).reduce((sum, value) => sum + (value || 0), 0);
 }
 
 // 每日花费趋势图
 function updateDailySpendChart(dailyStats) {
     const ctx = document.getElementById('dailySpendChart').getContext('2d');
-    const labels = dailyStats.map(d => d.时间).sort();
-    const spendData = labels.map(date => {
-        const day = dailyStats.find(d => d.时间 === date);
-        return day ? (day.花费 || 0) : 0;
-    });
-    const settlementData = labels.map(date => {
-        const day = dailyStats.find(d => d.时间 === date);
-        return day ? (day.结算花费 || 0) : 0;
-    });
+    // 每日数据已按日期排序
+    const labels = column(dailyStats, '时间');
+    const spendData = column(dailyStats, '花费').map(value => value || 0);
+    const settlementData = column(dailyStats, '结算花费').map(value => value || 0);
     
     if (charts.dailySpend) {
         charts.dailySpend.destroy();
@@ -311,15 +334,9 @@ function updateDailySpendChart(dailyStats) {
 // 每日曝光/点击趋势图
 function updateDailyTrafficChart(dailyStats) {
     const ctx = document.getElementById('dailyTrafficChart').getContext('2d');
-    const labels = dailyStats.map(d => d.时间).sort();
-    const impressionsData = labels.map(date => {
-        const day = dailyStats.find(d => d.时间 === date);
-        return day ? (day.曝光量 || 0) : 0;
-    });
-    const clicksData = labels.map(date => {
-        const day = dailyStats.find(d => d.时间 === date);
-        return day ? (day.点击量 || 0) : 0;
-    });
+    const labels = column(dailyStats, '时间');
+    const impressionsData = column(dailyStats, '曝光量').map(value => value || 0);
+    const clicksData = column(dailyStats, '点击量').map(value => value || 0);
     
     if (charts.dailyTraffic) {
         charts.dailyTraffic.destroy();
@@ -376,9 +393,17 @@ function updateDailyTrafficChart(dailyStats) {
 // 代理商花费对比图（堆叠显示出价方式）
 function updateAgentSpendChart(agentStats, agentMix) {
     const ctx = document.getElementById('agentSpendChart').getContext('2d');
-    const labels = agentStats.length > 0
-        ? agentStats.map(a => a.代理商来源)
-        : Array.from(new Set(agentMix.map(item => item.代理商来源)));
+    const mixAgents = column(agentMix, '代理商来源');
+    const labels = column(agentStats, '代理商来源').length > 0
+        ? column(agentStats, '代理商来源')
+        : Array.from(new Set(mixAgents));
+    
+    // 代理商 + 出价类别 -> 花费
+    const mixSpend = new Map();
+    const mixCategories = column(agentMix, '出价类别');
+    column(agentMix, '花费').forEach((spend, i) => {
+        mixSpend.set(`${mixAgents[i]}|${mixCategories[i]}`, spend || 0);
+    });
     
     const categories = ['OCPC', 'CPC', 'OTHER'];
     const datasets = categories.map((category, index) => {
@@ -389,10 +414,7 @@ function updateAgentSpendChart(agentStats, agentMix) {
         ];
         return {
             label: category === 'OTHER' ? '其他' : category,
-            data: labels.map(agent => {
-                const record = agentMix.find(item => item.代理商来源 === agent && item.出价类别 === category);
-                return record ? (record.花费 || 0) : 0;
-            }),
+            data: labels.map(agent => mixSpend.get(`${agent}|${category}`) || 0),
             backgroundColor: colors[index],
             stack: 'bidding'
         };
@@ -464,8 +486,8 @@ function updateAgentSpendChart(agentStats, agentMix) {
 // 出价方式花费分布图
 function updateBiddingMethodChart(biddingStats) {
     const ctx = document.getElementById('biddingMethodChart').getContext('2d');
-    const labels = biddingStats.map(b => b.出价方式);
-    const spendData = biddingStats.map(b => b.花费 || 0);
+    const labels = column(biddingStats, '出价方式');
+    const spendData = column(biddingStats, '花费').map(value => value || 0);
     
     if (charts.biddingMethod) {
         charts.biddingMethod.destroy();
@@ -518,8 +540,8 @@ function updateBiddingMethodChart(biddingStats) {
 // 定向花费分布
 function updateTargetingSpendChart(targetingStats) {
     const ctx = document.getElementById('targetingSpendChart').getContext('2d');
-    const labels = targetingStats.map(item => item.定向);
-    const spendData = targetingStats.map(item => item.花费 || 0);
+    const labels = column(targetingStats, '定向');
+    const spendData = column(targetingStats, '花费').map(value => value || 0);
 
     if (charts.targetingSpend) {
         charts.targetingSpend.destroy();
@@ -571,8 +593,8 @@ function updateTargetingSpendChart(targetingStats) {
 // 资源位花费分布
 function updateResourceSpendChart(resourceStats) {
     const ctx = document.getElementById('resourceSpendChart').getContext('2d');
-    const labels = resourceStats.map(item => item.资源位);
-    const spendData = resourceStats.map(item => item.花费 || 0);
+    const labels = column(resourceStats, '资源位');
+    const spendData = column(resourceStats, '花费').map(value => value || 0);
 
     if (charts.resourceSpend) {
         charts.resourceSpend.destroy();
@@ -628,20 +650,12 @@ function updateResourceSpendChart(resourceStats) {
 // 通过率趋势
 function updateRateTrendChart(rateStats) {
     const ctx = document.getElementById('rateTrendChart').getContext('2d');
-    const labels = Array.from(new Set(rateStats.map(item => item.时间))).sort();
+    const labels = column(rateStats, '时间');
+    const toPercent = value => value != null ? Number((value * 100).toFixed(2)) : null;
 
-    const entryRate = labels.map(date => {
-        const day = rateStats.find(item => item.时间 === date);
-        return day && day.准入通过率 != null ? Number((day.准入通过率 * 100).toFixed(2)) : null;
-    });
-    const creditRate = labels.map(date => {
-        const day = rateStats.find(item => item.时间 === date);
-        return day && day.授信通过率 != null ? Number((day.授信通过率 * 100).toFixed(2)) : null;
-    });
-    const loanRate = labels.map(date => {
-        const day = rateStats.find(item => item.时间 === date);
-        return day && day.支用通过率 != null ? Number((day.支用通过率 * 100).toFixed(2)) : null;
-    });
+    const entryRate = column(rateStats, '准入通过率').map(toPercent);
+    const creditRate = column(rateStats, '授信通过率').map(toPercent);
+    const loanRate = column(rateStats, '支用通过率').map(toPercent);
 
     if (charts.rateTrend) {
         charts.rateTrend.destroy();
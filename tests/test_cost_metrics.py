@@ -0,0 +1,98 @@
+"""
+成本指标计算测试：向量化实现与原逐行实现结果一致
+"""
+import numpy as np
+import pandas as pd
+
+from data_processor import calculate_cost_metrics
+
+
+def safe_div(numerator, denominator):
+    if pd.isna(numerator) or pd.isna(denominator) or denominator == 0:
+        return None
+    return numerator / denominator
+
+
+def calc_settlement(row):
+    clicks = row.get('点击量')
+    if pd.isna(clicks) or clicks == 0:
+        return None
+    agent_name = row.get('代理') or row.get('代理商来源')
+    if not agent_name or pd.isna(agent_name):
+        return None
+    agent_text = str(agent_name)
+    if '奇异果' in agent_text:
+        rate = 0.58
+    elif '哇棒' in agent_text:
+        rate = 0.5
+    else:
+        return None
+    return clicks * rate
+
+
+def row_wise_cost_metrics(df):
+    """原逐行实现（df.apply(axis=1)）"""
+    df['结算花费'] = df.apply(calc_settlement, axis=1)
+    for metric, denominator_col in [('注册成本', '注册人数'), ('进件成本', '进件人数'), ('授信成本', '授信成功人数'),
+                                    ('支用成本', '支用成功人数'), ('下载成本', '下载量')]:
+        df[metric] = df.apply(lambda row: safe_div(row.get('花费'), row.get(denominator_col)), axis=1)
+    return df
+
+
+def make_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # 代理：已知代理（含前后缀）、空字符串、缺失、未知代理；代理商来源同样包含空值和未知值
+    agents = np.array(['奇异果', '哇棒', 'xx奇异果', '哇棒yy', '', None, np.nan, '未知代理'], dtype=object)
+    sources = np.array(['奇异果', '哇棒', None, '其他'], dtype=object)
+
+    def counts():
+        # 含0（分母为0）和缺失值
+        values = pd.array(rng.integers(0, 4, n), dtype='Int32')
+        values[rng.random(n) < 0.2] = pd.NA
+        return values
+
+    spend = rng.random(n) * 1000
+    spend[rng.random(n) < 0.1] = np.nan
+    spend[rng.random(n) < 0.05] = 0
+    return pd.DataFrame({
+        '代理': agents[rng.integers(0, len(agents), n)],
+        '代理商来源': sources[rng.integers(0, len(sources), n)],
+        '曝光量': rng.integers(0, 1000, n),
+        '点击量': counts(),
+        '花费': spend,
+        '注册人数': counts(),
+        '进件人数': counts(),
+        '授信成功人数': counts(),
+        '支用成功人数': counts(),
+        '下载量': rng.integers(0, 3, n).astype('float64'),
+    })
+
+
+def test_matches_row_wise_implementation():
+    df = make_frame(50000)
+    expected = row_wise_cost_metrics(df.copy())
+    result = calculate_cost_metrics(df.copy())
+
+    for col in ['结算花费', '注册成本', '进件成本', '授信成本', '支用成本', '下载成本']:
+        # 原实现的空结果为 None（object列），向量化实现为 NaN
+        pd.testing.assert_series_equal(result[col], expected[col].astype('float64'), check_exact=True)
+
+
+def test_agent_fallback_unknown_agent_and_zero_denominator():
+    df = pd.DataFrame({
+        '代理': ['未知代理', None, '', '奇异果', np.nan],
+        '代理商来源': ['哇棒', '哇棒', '其他', '哇棒', '哇棒'],
+        '曝光量': [1, 1, 1, 1, 1],
+        '点击量': [10, 10, 10, 0, 10],
+        '花费': [100.0, np.nan, 100.0, 100.0, 100.0],
+        '注册人数': [0, 5, np.nan, 4, 2],
+    })
+    result = calculate_cost_metrics(df)
+
+    # 计划名称中的代理优先，为None或空字符串时使用代理商来源；不匹配费率表、点击为0、代理为NaN时为空
+    settlement = result['结算花费']
+    assert settlement[1] == 5.0
+    assert settlement.drop(index=1).isna().all()
+    # 分母为0或缺失、分子缺失时为空
+    assert result['注册成本'].tolist()[3:] == [25.0, 50.0]
+    assert result['注册成本'][:3].isna().all()
@@ -0,0 +1,46 @@
+"""
+数据集缓存文件读写测试
+"""
+import numpy as np
+import pandas as pd
+
+from data_store import read_dataset, write_dataset
+from json_provider import frame_to_records
+
+
+def make_dataset():
+    return pd.DataFrame({
+        '计划id': ['100001', '100002', None, '100004'],
+        '计划名称': ['奇异果-首页', None, '哇棒-信息流', '短名'],
+        '代理商来源': pd.Categorical(['奇异果', '哇棒', None, '奇异果']),
+        '时间': pd.Categorical(['2025-01-01', '2025-01-02', '2025-01-01', None],
+                             categories=['2025-01-01', '2025-01-02'], ordered=True),
+        '注册人数': pd.array([1, None, 3, 4], dtype='Int32'),
+        '曝光量': np.array([10, 20, 30, 40], dtype='int64'),
+        '花费': [1.5, np.nan, 3.0, 0.0],
+        '备注': ['a', 1, None, 'b'],
+    })
+
+
+def test_shared_read_matches_default_read(tmp_path):
+    path = str(tmp_path / 'part.feather')
+    write_dataset(make_dataset(), path)
+
+    default = read_dataset(path)
+    shared = read_dataset(path, shared=True)
+
+    assert shared.dtypes.to_dict() == default.dtypes.to_dict()
+    pd.testing.assert_frame_equal(shared, default)
+    assert frame_to_records(shared) == frame_to_records(default)
+
+
+def test_shared_read_selected_columns(tmp_path):
+    path = str(tmp_path / 'part.feather')
+    write_dataset(make_dataset(), path)
+
+    # 列按文件中的顺序返回，不存在的列忽略
+    shared = read_dataset(path, columns=['代理商来源', '计划名称', '不存在'], shared=True)
+
+    assert list(shared.columns) == ['计划名称', '代理商来源']
+    assert shared['计划名称'].dtype == object
+    assert isinstance(shared['代理商来源'].dtype, pd.CategoricalDtype)
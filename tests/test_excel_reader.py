@@ -0,0 +1,40 @@
+"""
+Excel读取测试：结果与 pd.read_excel 一致
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import excel_reader
+
+
+def write_workbook(path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = '计划数据'
+    sheet.append(['计划名称', '花费', '备注'])
+    # 错误单元格（openpyxl 写入 ERROR_CODES 中的字符串时记为错误类型）
+    sheet.append(['a', '#DIV/0!', '#N/A'])
+    # 内容与错误代码相同的文本单元格
+    for column, value in enumerate(['#REF!', '#DIV/0!', '#N/A'], start=1):
+        cell = sheet.cell(row=3, column=column, value=value)
+        cell.data_type = 's'
+    sheet.append(['b', 1.5, '正常'])
+    sheet.append(['c', 2, None])
+    workbook.save(path)
+
+
+@pytest.mark.parametrize('engine', excel_reader.available_engines())
+def test_error_cells_and_literal_text(tmp_path, engine):
+    path = str(tmp_path / 'errors.xlsx')
+    write_workbook(path)
+
+    result = excel_reader.read_sheet(path, '计划数据', engine=engine)
+
+    pd.testing.assert_frame_equal(result, pd.read_excel(path, sheet_name='计划数据'))
+    # 错误单元格为空值，文本 "#REF!"、"#DIV/0!" 保持原样（"#N/A" 按 pandas 的默认空值处理）
+    assert np.isnan(result.loc[0, '花费'])
+    assert result.loc[1, '计划名称'] == '#REF!'
+    assert result.loc[1, '花费'] == '#DIV/0!'
+    assert result['备注'].isna().tolist() == [True, True, False, True]
@@ -0,0 +1,49 @@
+"""
+筛选参数解析测试
+"""
+import pytest
+
+import app as app_module
+from app import FilterError, parse_filters, shared_filters
+
+
+def test_dates_normalized():
+    filters = parse_filters({'date_from': 20250101, 'date_to': ' 2025/1/31 ', 'agent': ['奇异果', 1, 'all']})
+
+    assert filters['date_from'] == '2025-01-01'
+    assert filters['date_to'] == '2025-01-31'
+    assert filters['dimensions']['代理商来源'] == ['奇异果', '1']
+    assert parse_filters({'date_from': '', 'date_to': None})['date_from'] is None
+
+
+@pytest.mark.parametrize('args', [
+    {'date_from': 'abc'},
+    {'date_to': '2025-13-01'},
+    {'date_from': True},
+    {'date_to': ['2025-01-01']},
+    {'agent': [{'name': '奇异果'}]},
+])
+def test_invalid_filters(args):
+    with pytest.raises(FilterError):
+        parse_filters(args)
+
+
+def test_shared_filters_with_mixed_date_input():
+    panels = [parse_filters({'date_from': 20250101, 'date_to': '2025-01-07'}),
+              parse_filters({'date_from': '2025-01-08', 'date_to': 20250114})]
+    shared, varying = shared_filters(panels)
+
+    assert (shared['date_from'], shared['date_to']) == ('2025-01-01', '2025-01-14')
+    assert varying == []
+
+
+def test_batch_rejects_malformed_panel_dates(monkeypatch):
+    monkeypatch.setattr(app_module, 'session_cache_file', lambda: 'unused')
+    with app_module.app.test_client() as client:
+        response = client.post('/api/batch', json={'panels': {
+            'this_week': {'filters': {'date_from': '2025-01-08'}},
+            'last_week': {'filters': {'date_from': {'day': 1}}},
+        }})
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
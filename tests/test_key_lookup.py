@@ -0,0 +1,55 @@
+"""
+后端数据按行键查找（KeyLookup）测试
+"""
+import numpy as np
+import pandas as pd
+
+from data_processor import KeyLookup, merge_data
+
+
+def make_backend():
+    return pd.DataFrame({
+        '计划id': pd.Categorical(['1', '1', '2', '3', '1']),
+        '时间': pd.Categorical(['2025-01-01', '2025-01-01', '2025-01-01', '2025-01-02', '2025-01-02']),
+        '注册人数': pd.array([3, 4, 5, None, 7], dtype='Int32'),
+        '支用金额': [100.0, np.nan, 50.0, 10.0, 1.0],
+        '平均执行利率': [10.0, 20.0, 30.0, 40.0, 50.0],
+        '备注': ['a', 'b', 'c', 'd', 'e'],
+    })
+
+
+def make_front():
+    return pd.DataFrame({
+        '计划id': pd.Categorical(['1', '2', '3', '4', '1']),
+        '时间': pd.Categorical(['2025-01-01', '2025-01-01', '2025-01-02', '2025-01-01', '2025-01-02']),
+        '花费': [10.0, 20.0, 30.0, 40.0, 50.0],
+    })
+
+
+def test_duplicate_backend_keys_are_combined():
+    lookup = KeyLookup(make_backend())
+
+    assert lookup.duplicates == {'rows': 1, 'keys': 1, 'examples': [['1', '2025-01-01']]}
+    result = lookup.lookup(make_front())
+    assert result['注册人数'].tolist() == [7, 5, pd.NA, pd.NA, 7]
+    assert str(result['注册人数'].dtype) == 'Int32'
+    assert result['支用金额'].tolist()[:3] == [100.0, 50.0, 10.0]
+    assert result['平均执行利率'].tolist()[0] == 15.0
+    assert result['备注'].tolist()[0] == 'a'
+
+
+def test_merge_keeps_front_rows_and_backend_totals():
+    merged = merge_data(make_front(), make_backend())
+
+    assert len(merged) == 5
+    assert merged['花费'].sum() == 150.0
+    # 前端匹配到的后端计数没有丢失也没有重复
+    assert merged['注册人数'].sum() == 3 + 4 + 5 + 7
+
+
+def test_no_duplicates():
+    backend = make_backend().iloc[[0, 2, 3]]
+    lookup = KeyLookup(backend)
+
+    assert lookup.duplicates is None
+    assert lookup.lookup(make_front())['注册人数'].tolist() == [3, 5, pd.NA, pd.NA, pd.NA]
@@ -0,0 +1,60 @@
+"""
+计划名称解析器测试
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from plan_name_parser import PLAN_NAME_FIELDS, PlanNameParser
+
+
+def test_parse_splits_and_normalizes():
+    parser = PlanNameParser()
+    result = parser.parse(pd.Series(['奇异果-首页-ocpc -24～54岁-xdx-大图-免息-20250101-多余', '短名', None, np.nan]))
+
+    assert list(result.columns) == PLAN_NAME_FIELDS
+    assert result.iloc[0].tolist() == ['奇异果', '首页', 'OCPC', '24-54岁', 'XDX', '大图', '免息', '20250101']
+    assert result.iloc[1].tolist() == ['短名'] + [None] * 7
+    # 空值按 str() 的结果解析
+    assert result.loc[2, '代理'] == 'None'
+    assert result.loc[3, '代理'] == 'nan'
+
+
+def test_cache_overflow_keeps_names_cached_by_earlier_calls():
+    parser = PlanNameParser(max_cache_size=3)
+    parser.parse(pd.Series(['a-b', 'c-d']))
+    result = parser.parse(pd.Series(['a-b', 'e-f', 'g-h']))
+
+    assert result['代理'].tolist() == ['a', 'e', 'g']
+    assert result['资源位'].tolist() == ['b', 'f', 'h']
+
+
+def test_more_names_than_cache_size():
+    parser = PlanNameParser(max_cache_size=2)
+    names = pd.Series([f'p{i}-r{i}' for i in range(5)] * 2)
+
+    for _ in range(2):
+        result = parser.parse(names)
+        assert result['代理'].tolist() == [f'p{i}' for i in range(5)] * 2
+
+
+def test_concurrent_parse_with_small_cache():
+    parser = PlanNameParser(max_cache_size=50)
+    errors = []
+
+    def work(offset):
+        try:
+            for start in range(0, 200, 20):
+                names = pd.Series([f'p{i}-r{i}' for i in range(start + offset, start + offset + 40)])
+                result = parser.parse(names)
+                assert result['资源位'].tolist() == [f'r{i}' for i in range(start + offset, start + offset + 40)]
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(offset,)) for offset in (0, 7, 13, 29)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
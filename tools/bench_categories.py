@@ -0,0 +1,74 @@
+"""
+维度列分类类型（category）与字符串（object）存储的对比
+处理合成的上传文件，比较维度列和整表的内存占用，以及筛选 + 分组汇总的耗时
+
+用法：python tools/bench_categories.py [--data-dir DIR] [--plans 500] [--days 90]
+（默认生成约8万行合并数据；DIR 中已有 kiwi/wabang/backend.xlsx 时直接使用）
+"""
+import argparse
+import os
+import tempfile
+
+from bench_utils import best_of, quiet
+from synthetic_data import ensure_workbooks
+
+from werkzeug.datastructures import MultiDict
+
+from data_processor import DIMENSION_COLUMNS, process_all_data
+
+# 看板常用的筛选条件和分组维度
+QUERIES = [
+    {},
+    {'date_from': '2025-02-01', 'date_to': '2025-02-14'},
+    {'bidding_method': 'OCPC', 'targeting': '高净值,通投'},
+    {'agent': '奇异果', 'resource': '信息流'},
+]
+GROUP_COLUMNS = ['时间', '代理商来源', '出价方式', '定向', '资源位']
+
+
+def as_object(df):
+    """维度列转回字符串（分类类型之前的存储方式）"""
+    df = df.copy()
+    for col in DIMENSION_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
+
+
+def megabytes(df, columns=None):
+    df = df if columns is None else df[columns]
+    return df.memory_usage(index=True, deep=True).sum() / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'bench_workbooks'))
+    parser.add_argument('--plans', type=int, default=500)
+    parser.add_argument('--days', type=int, default=90)
+    args = parser.parse_args()
+
+    paths = ensure_workbooks(args.data_dir, args.plans, args.days)
+    with quiet():
+        import app
+        category = process_all_data(*paths)
+    obj = as_object(category)
+    filters = [app.parse_filters(MultiDict(query)) for query in QUERIES]
+
+    def run(df):
+        for query in filters:
+            selected = app.filter_dataset(df, query)
+            for col in GROUP_COLUMNS:
+                selected.groupby(col, observed=True)['花费'].sum()
+
+    dims = [col for col in DIMENSION_COLUMNS if col in category.columns]
+    print(f'{len(category)} 行合并数据')
+    print(f'  memory, dimension columns   object {megabytes(obj, dims):6.1f} MB -> category {megabytes(category, dims):6.1f} MB')
+    print(f'  memory, whole frame         object {megabytes(obj):6.1f} MB -> category {megabytes(category):6.1f} MB')
+    object_time, _ = best_of(lambda: run(obj), 10)
+    category_time, _ = best_of(lambda: run(category), 10)
+    print(f'  {len(QUERIES)} filter sets x {len(GROUP_COLUMNS)} groupbys  '
+          f'object {object_time * 1000:6.1f} ms -> category {category_time * 1000:6.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Excel读取方式的性能测试
+在接近上传大小上限的奇异果文件上比较 pd.read_excel 与 excel_reader 各引擎（读取全部列 / 只读映射列）
+的解析耗时和峰值内存；每种方式在单独的进程中运行，峰值内存互不影响
+
+用法：python tools/bench_excel_reader.py [--file PATH] [--rows 230000]
+（文件不存在时按 --rows 生成）
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import peak_rss_mb
+from synthetic_data import KIWI_SHEET, write_wide_kiwi_workbook
+
+import excel_reader
+
+MODES = ['pandas', 'openpyxl:all', 'openpyxl:mapped', 'calamine:all', 'calamine:mapped']
+
+
+def measure(path, mode):
+    """在当前进程中按 mode 读取一次，返回耗时和峰值内存"""
+    import pandas as pd
+    from data_processor import KIWI_COLUMN_MAP
+
+    start = time.perf_counter()
+    if mode == 'pandas':
+        df = pd.read_excel(path, sheet_name=KIWI_SHEET)
+    else:
+        engine, projection = mode.split(':')
+        usecols = list(KIWI_COLUMN_MAP) if projection == 'mapped' else None
+        df = excel_reader.read_sheet(path, KIWI_SHEET, usecols=usecols, engine=engine)
+    return {'mode': mode, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb(), 'shape': df.shape}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--file', default=os.path.join(tempfile.gettempdir(), 'bench_wide_kiwi.xlsx'))
+    parser.add_argument('--rows', type=int, default=230000)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.file, args.mode)))
+        return
+
+    if not os.path.exists(args.file):
+        print(f'正在生成 {args.rows} 行的奇异果文件: {args.file}')
+        write_wide_kiwi_workbook(args.file, args.rows)
+    print(f'{args.file}（{os.path.getsize(args.file) / 2 ** 20:.1f} MB）')
+    print(f'  {"reader":20s} {"parse":>8s} {"peak RSS":>9s}  shape')
+    for mode in MODES:
+        engine = mode.split(':')[0]
+        if engine != 'pandas' and engine not in excel_reader.available_engines():
+            print(f'  {mode:20s} 未安装 {engine}，跳过')
+            continue
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--file', args.file, '--mode', mode],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f'  {mode:20s} {result["seconds"]:7.1f}s {result["peak_rss_mb"]:6.0f} MB  {tuple(result["shape"])}')
+
+
+if __name__ == '__main__':
+    main()
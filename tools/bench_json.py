@@ -0,0 +1,114 @@
+"""
+接口响应序列化的性能测试
+比较原方式（DataFrame.to_json -> json.loads -> jsonify）与 frame_to_records / frame_to_columns 一次序列化
+（标准库json、orjson），输出 /api/statistics 的计算 + 序列化耗时、明细表的序列化耗时和响应体积
+
+数据：合成上传文件处理后的明细按日期平移复制 --copies 份（默认 500 计划 × 90 天 × 16 份，约129万行）
+
+用法：python tools/bench_json.py [--data-dir DIR] [--plans 500] [--days 90] [--copies 16]
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from bench_utils import best_of, quiet
+from synthetic_data import ensure_workbooks
+
+from flask.json.provider import DefaultJSONProvider
+
+from data_cube import build_cube
+from data_processor import encode_dimension_columns, process_all_data
+import json_provider
+
+
+def to_json_round_trip(df):
+    """原实现：序列化为JSON字符串后再解析"""
+    if df is None:
+        return []
+    return json.loads(df.to_json(orient='records', force_ascii=False, date_format='iso'))
+
+
+def repeat_days(df, copies):
+    """按日期平移复制明细，得到更长时间范围的数据集"""
+    dates = pd.to_datetime(df['时间'].astype(object))
+    span = pd.Timedelta(days=dates.nunique())
+    parts = []
+    for k in range(copies):
+        part = df.copy()
+        part['时间'] = (dates + span * k).dt.strftime('%Y-%m-%d')
+        parts.append(part)
+    return encode_dimension_columns(pd.concat(parts, ignore_index=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'bench_workbooks'))
+    parser.add_argument('--plans', type=int, default=500)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--copies', type=int, default=16)
+    args = parser.parse_args()
+
+    paths = ensure_workbooks(args.data_dir, args.plans, args.days)
+    with quiet():
+        import app
+        dataset = repeat_days(process_all_data(*paths), args.copies)
+        cube = build_cube(dataset)
+    # 明细：最后30天
+    last_days = dataset['时间'].cat.categories[-30:]
+    detail = dataset[dataset['时间'].isin(last_days)]
+    print(f'{len(dataset)} 行明细，立方体 {len(cube)} 行')
+
+    old_provider = DefaultJSONProvider(app.app)
+    orjson = json_provider.orjson
+
+    def encode(mode, build):
+        """按 mode 生成结果并序列化为响应内容"""
+        with app.app.test_request_context():
+            if mode == 'old':
+                app.frame_to_records = to_json_round_trip
+                try:
+                    return old_provider.response(build(False)).get_data()
+                finally:
+                    app.frame_to_records = json_provider.frame_to_records
+            if mode == 'stdlib':
+                json_provider.orjson = None
+            try:
+                return app.app.json.dumps_bytes(build(mode == 'columns'))
+            finally:
+                json_provider.orjson = orjson
+
+    modes = ['old', 'stdlib'] + (['records', 'columns'] if orjson is not None else ['columns'])
+    print('  /api/statistics build + encode（全部日期）')
+    for mode in modes:
+        seconds, body = best_of(lambda: encode(mode, lambda columnar: {
+            'success': True, **app.build_statistics(cube, columnar)}), 5)
+        print(f'    {mode:8s} {seconds * 1000:8.1f} ms {len(body) / 2 ** 10:8.0f} KB')
+
+    print('  /api/statistics encode only（结果已计算）')
+    with app.app.test_request_context():
+        app.frame_to_records = to_json_round_trip
+        try:
+            old_payload = {'success': True, **app.build_statistics(cube)}
+        finally:
+            app.frame_to_records = json_provider.frame_to_records
+        seconds, _ = best_of(lambda: old_provider.response(old_payload).get_data(), 5)
+        print(f'    {"old":8s} {seconds * 1000:8.1f} ms')
+        for name, columnar in [('records', False), ('columns', True)]:
+            payload = {'success': True, **app.build_statistics(cube, columnar)}
+            seconds, _ = best_of(lambda: app.app.json.dumps_bytes(payload), 5)
+            print(f'    {name:8s} {seconds * 1000:8.1f} ms')
+
+    print(f'  明细表序列化，{len(detail)} 行 x {detail.shape[1]} 列')
+    for mode in modes:
+        seconds, body = best_of(lambda: encode(mode, lambda columnar: (
+            json_provider.frame_to_columns if columnar else app.frame_to_records)(detail)), 3)
+        print(f'    {mode:8s} {seconds * 1000:8.1f} ms {len(body) / 2 ** 20:8.1f} MB')
+    if orjson is None:
+        print('  未安装 orjson：stdlib 与 columns 均使用标准库json')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+前后端数据匹配的性能测试
+比较原方式（计划id、时间为字符串，pd.merge 左连接）与按整数编码组合键匹配（merge_data）的耗时，
+检查两者结果一致；--duplicates 在后端数据中追加重复键的行，比较行数和花费合计
+
+用法：python tools/bench_merge.py [--rows 1000000] [--plans 50000] [--duplicates 0]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_utils import quiet
+
+from column_schema import BACKEND_SUFFIX
+from data_processor import clean_id_column, encode_dimension_columns, merge_data, normalize_date
+
+
+def make_frames(n_rows, n_plans, n_duplicates, seed=0):
+    """
+    前端：n_plans 个计划每天一行；后端：80%的键与前端相同（顺序打乱），20%为前端没有的键
+    计划id为整数、时间为 datetime，与读取的Excel一致
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=n_rows // n_plans + 1).to_numpy()
+
+    def frame(ids, days, columns):
+        df = pd.DataFrame({'计划id': ids, '时间': dates[days]})
+        for col in columns:
+            df[col] = pd.array(rng.integers(0, 100, len(df)), dtype='Int32')
+        return df
+
+    i = np.arange(n_rows)
+    front_ids, front_days = 100000 + i % n_plans, i // n_plans
+    front = frame(front_ids, front_days, ['曝光量', '点击量'])
+    front['花费'] = rng.random(n_rows) * 1000
+    matched = rng.permutation(n_rows)[:n_rows * 8 // 10]
+    j = np.arange(n_rows - len(matched))
+    back = frame(np.concatenate([front_ids[matched], 900000 + j % n_plans]),
+                 np.concatenate([front_days[matched], j // n_plans]),
+                 ['注册人数', '进件人数', '授信成功人数', '支用金额', '点击量'])
+    if n_duplicates:
+        back = pd.concat([back, back.iloc[:n_duplicates]], ignore_index=True)
+    return front, back
+
+
+def string_key_merge(front, back):
+    """原实现：键清洗为字符串后 pd.merge 左连接，再做与 merge_data 相同的清洗"""
+    for df in (front, back):
+        df['计划id'] = clean_id_column(df['计划id'])
+        df['时间'] = normalize_date(df['时间'])
+    merged = pd.merge(front, back, on=['计划id', '时间'], how='left', suffixes=('', BACKEND_SUFFIX))
+    return merge_data(merged, None)
+
+
+def coded_key_merge(front, back):
+    for df in (front, back):
+        df['计划id'] = clean_id_column(df['计划id'], as_category=True)
+        df['时间'] = normalize_date(df['时间'], as_category=True)
+    return merge_data(front, back)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--plans', type=int, default=50000)
+    parser.add_argument('--duplicates', type=int, default=0, help='后端数据中重复键的行数')
+    args = parser.parse_args()
+
+    front, back = make_frames(args.rows, args.plans, args.duplicates)
+    print(f'前端 {len(front)} 行 x 后端 {len(back)} 行（后端重复键 {args.duplicates} 行）')
+    results = {}
+    for name, merge in [('string keys', string_key_merge), ('coded keys', coded_key_merge)]:
+        start = time.perf_counter()
+        with quiet():
+            merged = merge(front.copy(), back.copy())
+            merged = encode_dimension_columns(merged)
+        elapsed = time.perf_counter() - start
+        results[name] = merged
+        print(f'  {name:12s} {elapsed:6.2f} s  {len(merged)} 行  '
+              f'花费合计 {merged["花费"].sum():.2f}  注册人数合计 {merged["注册人数"].sum()}')
+    if not args.duplicates:
+        try:
+            pd.testing.assert_frame_equal(results['string keys'], results['coded keys'])
+            print('  结果一致')
+        except AssertionError as e:
+            print(f'  结果不一致：{e}')
+
+
+if __name__ == '__main__':
+    main()
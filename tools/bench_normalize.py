@@ -0,0 +1,92 @@
+"""
+ID、日期、文本维度清洗的性能测试
+对比逐行实现（Series.apply / 逐行解析日期）与按唯一值向量化的实现，并检查结果完全一致
+
+用法：python tools/bench_normalize.py [--rows 200000]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from bench_utils import best_of, same_values
+
+from data_processor import _map_unique_values, clean_id_column, normalize_date
+from plan_name_parser import upper_text
+
+
+def row_wise_clean_id(series):
+    """原实现：逐行转字符串"""
+    def _process(x):
+        if pd.isna(x):
+            return ""
+        if isinstance(x, float):
+            return str(int(x))
+        return str(x).strip()
+    return series.apply(_process)
+
+
+def row_wise_normalize_date(series):
+    """原实现：逐行解析日期"""
+    return pd.to_datetime(series, errors='coerce').dt.strftime('%Y-%m-%d')
+
+
+def row_wise_upper_text(series):
+    """原实现：出价方式/定向的逐行清洗"""
+    def _process(val):
+        if pd.isna(val):
+            return None
+        text = str(val).strip()
+        if not text or text.lower() in ['nan', 'none']:
+            return None
+        return text.upper()
+    return series.apply(_process)
+
+
+def unique_upper_text(series):
+    """出价方式/定向：与计划名称解析一样只处理去重后的取值"""
+    return _map_unique_values(series, upper_text, None)
+
+
+def make_cases(n, seed=2):
+    """与上传数据相似的取值：少量计划ID、几个月的日期，按行重复出现"""
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(10 ** 11, 10 ** 11 + 5000, n)
+    days = pd.date_range('2024-01-01', periods=120)
+    missing = rng.random(n) < 0.02
+    mixed = np.array([str(x) if i % 3 == 0 else (float(x) if i % 3 == 1 else int(x)) for i, x in enumerate(ids)],
+                     dtype=object)
+    texts = np.array(['ocpc', ' OCPC ', 'Cpc', '', None, 'nan', 'None', 'oCPD'], dtype=object)
+    return [
+        ('ids float+NaN', 'id', pd.Series(np.where(missing, np.nan, ids.astype(float)))),
+        ('ids int', 'id', pd.Series(ids)),
+        ('ids mixed obj', 'id', pd.Series(mixed).where(~missing, None)),
+        ('ids padded str', 'id', pd.Series([f' {x} ' for x in ids], dtype=object)),
+        ('dates Timestamp', 'date', pd.Series(rng.choice(days, n)).where(~missing)),
+        ("dates 'YYYY-MM-DD'", 'date', pd.Series(rng.choice(days.strftime('%Y-%m-%d'), n).astype(object)).where(~missing, None)),
+        ("dates 'YYYYMMDD'", 'date', pd.Series(rng.choice(days.strftime('%Y%m%d'), n).astype(object))),
+        ('bidding text', 'text', pd.Series(rng.choice(texts, n))),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    functions = {
+        'id': (row_wise_clean_id, clean_id_column),
+        'date': (row_wise_normalize_date, normalize_date),
+        'text': (row_wise_upper_text, unique_upper_text),
+    }
+    print(f'{args.rows} 行')
+    print(f'  {"case":20s} {"row-wise":>9s} {"vectorized":>10s}  identical')
+    for name, kind, series in make_cases(args.rows):
+        old_func, new_func = functions[kind]
+        old_time, expected = best_of(lambda: old_func(series.copy()))
+        new_time, result = best_of(lambda: new_func(series.copy()))
+        print(f'  {name:20s} {old_time:8.3f}s {new_time:9.3f}s  {same_values(expected, result)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+性能测试脚本的公共函数
+导入时把项目根目录加入 sys.path，脚本可以直接 import 项目模块（用法：python tools/bench_xxx.py）
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def best_of(func, repeat=3):
+    """
+    多次运行取最短耗时
+
+    Returns:
+        (耗时秒数, 最后一次的返回值)
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB，仅 Linux/macOS）"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以KB为单位
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测函数的进度输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def same_values(a, b):
+    """两个Series的取值（空值统一为None）和类型是否完全一致"""
+    return (a.dtype == b.dtype
+            and a.astype(object).where(a.notna(), None).tolist() == b.astype(object).where(b.notna(), None).tolist())
@@ -0,0 +1,146 @@
+"""
+生成合成的上传文件（奇异果、哇棒、后端Excel），用于性能测试
+数据格式与真实导出一致：计划名称按“代理-资源位-出价方式-年龄-定向-素材样式-利益点-日期”拼接，
+计划ID混有整数和浮点，后端日期混有 YYYY-MM-DD 与 YYYYMMDD 两种写法
+
+用法：python tools/synthetic_data.py OUTPUT_DIR [--plans 60] [--days 20]
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+RESOURCES = ['信息流', '应用市场', '开屏', '搜索']
+BIDDINGS = ['OCPC', 'ocpc ', 'CPC', 'cpd']
+AGES = ['24～54岁', '24至54岁', '24~54岁', '18-30岁']
+TARGETINGS = ['高净值', ' 通投', 'lookalike', 'None']
+MATERIALS = ['大图', '视频', '小图']
+BENEFITS = ['免息', '高额度', '']
+
+# 各文件的工作表名称
+KIWI_SHEET = '计划数据'
+WABANG_SHEET = '总数据源'
+BACKEND_SHEET = '分计划明细表'
+
+
+def plan_names(agent, n_plans):
+    names = []
+    for p in range(n_plans):
+        name = '-'.join([agent, RESOURCES[p % 4], BIDDINGS[p % 4], AGES[p % 4], TARGETINGS[(p // 2) % 4],
+                         MATERIALS[p % 3], BENEFITS[p % 3], '1201'])
+        # 少量计划名称不符合命名规则
+        names.append(f'{agent}-短名' if p % 17 == 0 else name)
+    return names
+
+
+def agent_frame(agent, id_base, date_column, n_plans, days, rng):
+    """代理商前端数据：每个计划每天一行，约10%的计划-天没有投放"""
+    records = []
+    for p, name in enumerate(plan_names(agent, n_plans)):
+        plan_id = id_base + p
+        for day in days:
+            if rng.random() < 0.1:
+                continue
+            clicks = int(rng.integers(0, 500))
+            records.append({
+                '计划名称': name, '计划ID': float(plan_id) if plan_id % 5 == 0 else plan_id, date_column: day,
+                '花费': round(float(rng.random() * 1000), 2), '曝光量': int(rng.integers(0, 10000)),
+                '点击量': clicks, '点击率': f'{rng.random() * 5:.2f}%',
+                '下载量': int(rng.integers(0, 50)), '点击下载率': f'{rng.random() * 10:.2f}%',
+                '下载成本': round(float(rng.random() * 20), 2), '安装量': int(rng.integers(0, 40)),
+            })
+    return pd.DataFrame(records)
+
+
+def backend_frame(id_bases, n_plans, days, rng):
+    """后端转化数据：约30%的计划-天没有数据"""
+    records = []
+    for id_base in id_bases:
+        for p in range(n_plans):
+            for day in days:
+                if rng.random() < 0.3:
+                    continue
+                entries = int(rng.integers(0, 30))
+                records.append({
+                    'event_chnl_dtl': str(id_base + p) if p % 3 == 0 else id_base + p,
+                    'event_dt': day.strftime('%Y-%m-%d') if p % 2 else day.strftime('%Y%m%d'),
+                    '注册人数': int(rng.integers(0, 40)), '进件人数': entries, '进件成功人数': int(entries * 0.6),
+                    '授信提交人数': int(entries * 0.5), '授信成功人数': int(entries * 0.3),
+                    '授信金额': float(entries * 1000), '支用申请人数': int(entries * 0.3),
+                    '支用通过人数': int(entries * 0.2), '支用人数': int(entries * 0.2),
+                    '支用笔数': int(entries * 0.25), '支用金额': float(entries * 800),
+                    '平均执行利率': f'{rng.random() * 20:.2f}%' if entries else None,
+                    '点击量': int(rng.integers(0, 100)),
+                })
+    return pd.DataFrame(records)
+
+
+def write_workbooks(out_dir, n_plans=60, n_days=20, seed=0, start='2025-01-01'):
+    """
+    生成三个上传文件
+
+    Args:
+        out_dir: 输出目录
+        n_plans: 每个代理商的计划数
+        n_days: 天数
+
+    Returns:
+        (奇异果文件, 哇棒文件, 后端文件) 路径，合并后约 n_plans × n_days × 1.8 行
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    days = pd.date_range(start, periods=n_days)
+    paths = tuple(os.path.join(out_dir, name) for name in ['kiwi.xlsx', 'wabang.xlsx', 'backend.xlsx'])
+    agent_frame('奇异果', 100000, '日期', n_plans, days, rng).to_excel(paths[0], sheet_name=KIWI_SHEET, index=False)
+    agent_frame('哇棒', 200000, '时间', n_plans, days, rng).to_excel(paths[1], sheet_name=WABANG_SHEET, index=False)
+    backend_frame([100000, 200000], n_plans, days, rng).to_excel(paths[2], sheet_name=BACKEND_SHEET, index=False)
+    return paths
+
+
+def write_wide_kiwi_workbook(path, n_rows, extra_columns=19, seed=1):
+    """
+    生成接近上传大小上限的奇异果文件：11个映射列之外还有 extra_columns 个不使用的列
+    （230000 行约50MB），用于比较Excel读取方式和只读需要的列的效果
+    """
+    from openpyxl import Workbook
+
+    rng = np.random.default_rng(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(KIWI_SHEET)
+    sheet.append(['计划名称', '计划ID', '日期', '花费', '曝光量', '点击量', '点击率', '下载量', '点击下载率', '下载成本',
+                  '安装量'] + [f'附加字段{i}' for i in range(extra_columns)])
+    names = plan_names('奇异果', 3)[1:]
+    start = pd.Timestamp('2025-01-01').to_pydatetime()
+    for i in range(n_rows):
+        row = [names[i % 2], 100000 + i % 5000, start + pd.Timedelta(days=i % 90).to_pytimedelta(),
+               round(float(rng.random() * 1000), 2), int(rng.integers(0, 10000)), int(rng.integers(0, 500)),
+               '1.23%', int(rng.integers(0, 50)), '4.56%', 12.34, 7]
+        row += [float(rng.random()) if j % 2 else f'说明{i % 100}' for j in range(extra_columns)]
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def ensure_workbooks(data_dir, n_plans, n_days):
+    """data_dir 中已有上传文件时直接使用，否则生成"""
+    paths = tuple(os.path.join(data_dir, name) for name in ['kiwi.xlsx', 'wabang.xlsx', 'backend.xlsx'])
+    if all(os.path.exists(path) for path in paths):
+        return paths
+    print(f'正在生成合成数据（{n_plans} 个计划 × {n_days} 天）: {data_dir}')
+    return write_workbooks(data_dir, n_plans, n_days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('out_dir')
+    parser.add_argument('--plans', type=int, default=60)
+    parser.add_argument('--days', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for path in write_workbooks(args.out_dir, args.plans, args.days, args.seed):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+上传任务模块
+上传文件后在后台线程池中处理数据，前端按任务ID轮询处理进度；
+指定状态目录时任务状态同时写入文件，多进程部署时任意工作进程都能查询
+"""
+import json
+import os
+import string
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 上传处理的各个阶段：(阶段键, 显示名称)
+UPLOAD_STAGES = [
+    ('kiwi', '读取奇异果数据'),
+    ('wabang', '读取哇棒数据'),
+    ('backend', '读取后端数据'),
+    ('merge', '前后端数据合并'),
+    ('cost_metrics', '计算成本指标'),
+    ('upsert', '更新到已有数据'),
+    ('cache_write', '写入缓存'),
+]
+
+
+class UploadJob:
+    """
+    单个上传任务的状态
+
+    status: queued（排队中）/ running（处理中）/ done（完成）/ failed（失败）
+    每个阶段的 status: pending / running / done / skipped / failed
+    """
+
+    def __init__(self, stages=None, state_folder=None):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.message = '等待处理'
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = OrderedDict(
+            (key, {'key': key, 'label': label, 'status': 'pending', 'seconds': None})
+            for key, label in (stages or UPLOAD_STAGES)
+        )
+        self._lock = threading.Lock()
+        self._state_file = job_state_file(state_folder, self.id) if state_folder else None
+        self._save_lock = threading.Lock()
+
+    def update_stage(self, key, status, seconds=None):
+        """更新阶段状态，可作为 process_all_data 的 progress 回调"""
+        with self._lock:
+            stage = self.stages.get(key)
+            if stage is None:
+                return
+            stage['status'] = status
+            if seconds is not None:
+                stage['seconds'] = round(seconds, 3)
+        self._save()
+
+    def to_dict(self):
+        with self._lock:
+            stages = [dict(stage) for stage in self.stages.values()]
+            finished = [s for s in stages if s['status'] in ('done', 'skipped')]
+            end = self.finished_at or time.time()
+            return {
+                'id': self.id,
+                'status': self.status,
+                'message': self.message,
+                'stages': stages,
+                'progress': len(finished) / len(stages) if stages else 1,
+                'elapsed': round(end - self.started_at, 3) if self.started_at else 0,
+                'result': self.result,
+            }
+
+    def _save(self):
+        """写入状态文件（先写临时文件再替换，读取方不会读到写了一半的文件）"""
+        if self._state_file is None:
+            return
+        with self._save_lock:
+            tmp_path = f'{self._state_file}.{os.getpid()}.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.to_dict(), f, ensure_ascii=False, default=str)
+                os.replace(tmp_path, self._state_file)
+            except OSError as e:
+                print(f"写入任务状态失败: {e}")
+
+    def _start(self):
+        with self._lock:
+            self.status = 'running'
+            self.message = '正在处理数据'
+            self.started_at = time.time()
+        self._save()
+
+    def _finish(self, status, message, result=None):
+        with self._lock:
+            self.status = status
+            self.message = message
+            self.result = result
+            self.finished_at = time.time()
+            # 失败时把正在执行的阶段标记为失败，未执行的阶段标记为跳过
+            for stage in self.stages.values():
+                if stage['status'] == 'running':
+                    stage['status'] = 'done' if status == 'done' else 'failed'
+                elif stage['status'] == 'pending':
+                    stage['status'] = 'skipped'
+        self._save()
+
+
+class StoredJob:
+    """
+    其他工作进程中任务的状态（从状态文件读取的快照，只读）
+    """
+
+    def __init__(self, state):
+        self.id = state['id']
+        self.status = state['status']
+        self._state = state
+
+    def to_dict(self):
+        return self._state
+
+
+def job_state_file(folder, job_id):
+    return os.path.join(folder, f'{job_id}.json')
+
+
+def read_job_state(folder, job_id):
+    """读取任务状态文件，任务ID不合法或文件不存在时返回None"""
+    if not job_id or len(job_id) != 32 or any(c not in string.hexdigits for c in job_id):
+        return None
+    try:
+        with open(job_state_file(folder, job_id), 'r', encoding='utf-8') as f:
+            return StoredJob(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+
+class JobManager:
+    """
+    后台任务管理
+
+    任务在线程池中执行，只保留最近 max_history 个任务的状态。
+    任务函数签名为 fn(job, *args)，返回 (成功与否, 提示信息, 结果字典)。
+    指定 state_folder 时任务状态写入该目录，本进程中找不到的任务从状态文件读取。
+    """
+
+    def __init__(self, max_workers=2, max_history=50, state_folder=None):
+        self.max_history = max_history
+        self.state_folder = state_folder
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        if state_folder:
+            os.makedirs(state_folder, exist_ok=True)
+
+    def submit(self, fn, *args, stages=None):
+        """创建任务并提交到线程池，立即返回任务对象"""
+        job = UploadJob(stages, self.state_folder)
+        job._save()
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        """按ID获取任务；其他工作进程的任务返回 StoredJob，不存在时返回None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_folder:
+            job = read_job_state(self.state_folder, job_id)
+        return job
+
+    def remove_expired(self, max_age):
+        """
+        删除超过 max_age 秒未更新的任务状态文件（已退出的工作进程遗留的任务）
+
+        Returns:
+            删除的文件数
+        """
+        if not self.state_folder:
+            return 0
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.state_folder):
+            path = os.path.join(self.state_folder, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def _run(self, job, fn, args):
+        job._start()
+        try:
+            success, message, result = fn(job, *args)
+            job._finish('done' if success else 'failed', message, result)
+        except Exception as e:
+            print(f"上传任务 {job.id} 执行失败: {e}")
+            traceback.print_exc()
+            job._finish('failed', f'处理失败：{str(e)}')
+
+    def _prune(self):
+        # 超出上限时丢弃最早的已结束任务
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ('done', 'failed')]
+        while len(self._jobs) > self.max_history and finished:
+            job = self._jobs.pop(finished.pop(0), None)
+            if job is not None and job._state_file:
+                try:
+                    os.remove(job._state_file)
+                except OSError:
+                    pass